@@ -1,24 +1,74 @@
 import streamlit as st
-import pandas as pd
 import calculations as calc
-import visualization as viz
-import reporting
+import instrumentation as instr
+import kernels
+from shared_cache import CACHE
 import os
+import time
+
+# pandas, plotly (visualization), fpdf (reporting) and the NumPy tools are
+# imported inside the tab that needs them, so the first paint only pays for
+# streamlit itself. Tabs rerun on selection and only the open one computes.
 
 st.set_page_config(layout="wide", page_title="Counterfort Retaining Wall (BS 8110)")
 
+show_diagnostics = st.sidebar.checkbox("Diagnostics (phase timings)", value=False)
+rerun_stats = instr.begin_run(profile=show_diagnostics)
+rerun_start = time.perf_counter()
+
 st.title("Counterfort Retaining Wall Design")
 st.markdown("BS 8110 Standards | Sri Lanka Defaults")
 
+# Widgets in a hidden tab are not rendered, which would reset them;
+# keeping their values in session state preserves them across tab switches.
+for _key, _default in (("q_allow", 300.0), ("n_mc", 1_000_000), ("bays", 2),
+                       ("bar_criterion", "weight"), ("two_layers", True), ("stem_strips", 200),
+                       ("solve_dim", "B"), ("solve_criteria", ["fs_slide"]),
+                       ("show_sens", False), ("sens_output", "fs_slide"), ("sens_case", "Governing"),
+                       ("query_H", (5.0, 7.0)), ("query_pass", False),
+                       ("sweep_H", (3.0, 8.0)), ("sweep_heel", (1.0, 5.0)), ("sweep_n", 100),
+                       ("ds_x", "B"), ("ds_y", "heel"), ("ds_x_range", (2.5, 8.0)), ("ds_y_range", (1.0, 6.0)),
+                       ("ds_n", 400)):
+    st.session_state[_key] = st.session_state.get(_key, _default)
+if "load_case" in st.session_state:
+    st.session_state["load_case"] = st.session_state["load_case"]
+
+def bar_layers():
+    return 2 if st.session_state["two_layers"] else 1
+
+@st.cache_resource
+def result_store():
+    # Shared by every session of this server (its memo is the shared cache);
+    # falls back to an in-memory store if the database file cannot be opened.
+    import sqlite3
+    import store
+
+    try:
+        return store.ResultStore(memo=CACHE)
+    except sqlite3.Error:
+        return store.ResultStore(":memory:", memo=CACHE)
+
+def design(inp):
+    # (stability per case, reinforcement): memory, then the SQLite store, then computed.
+    with instr.timer("app.design"):
+        return result_store().design(inp, st.session_state["bar_criterion"], bar_layers())
+
+def reset_ds_range(axis):
+    # A new field on an axis starts from its default range.
+    import design_space
+
+    st.session_state[f"ds_{axis}_range"] = design_space.AXES[st.session_state[f"ds_{axis}"]][2]
+
 # --- Tabs ---
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
     "Inputs", 
     "Loads & Stability", 
     "Batch Results", 
     "Reinforcement", 
     "3D Sketch", 
-    "Report"
-])
+    "Report",
+    "Design Space"
+], key="tab", on_change="rerun")
 
 # --- Tab 1: Inputs ---
 with tab1:
@@ -53,6 +103,10 @@ with tab1:
         st.markdown("**Load Settings**")
         crane_load = st.number_input("Crane Load (kN)", value=0.0)
         crane_dist = st.number_input("Crane Dist (m)", value=2.0)
+
+        st.markdown("**Seismic (Pseudo-static, LC-E)**")
+        kh = st.number_input("kh (horizontal)", value=0.0, step=0.01, min_value=0.0)
+        kv = st.number_input("kv (vertical, +up)", value=0.0, step=0.01, min_value=-0.5, max_value=0.5)
         
     st.divider()
     with st.expander("Advanced / Defaults (Sri Lanka)"):
@@ -69,7 +123,7 @@ with tab1:
             cover = st.number_input("Cover (mm)", value=50.0)
 
 # --- Tab 2: Single Analysis ---
-with tab2:
+with tab2, instr.timer("app.tab.stability"):
     st.subheader("Analysis Configuration")
     
     col_opt1, col_opt2 = st.columns(2)
@@ -87,91 +141,329 @@ with tab2:
         gamma_w=gamma_w, gamma_c=gamma_c, phi_soil=phi_soil,
         gamma_soil=gamma_soil, gamma_sat=gamma_sat, mu_rock=mu_rock,
         anchor_cap=anchor_cap, anchor_inclination=anchor_inc,
-        fy=fy, fcu=fcu, cover=cover,
+        fy=fy, fcu=fcu, cover=cover, kh=kh, kv=kv,
         uplift_full_base=uplift_full, stem_continuous=stem_cont
     )
 
-    st.markdown("### Select Load Case")
-    lc_sel = st.radio("Load Case", [
-        "LC-A: Canal Full / Backfill Empty (Water Level 0)", 
-        "LC-B: Both Full (Canal H / Backfill H)", 
-        "LC-C: Canal Empty / Backfill Full (Canal 0 / Backfill H)"
-    ])
-    
-    case_map = {
-        "LC-A: Canal Full / Backfill Empty (Water Level 0)": "LC-A",
-        "LC-B: Both Full (Canal H / Backfill H)": "LC-B",
-        "LC-C: Canal Empty / Backfill Full (Canal 0 / Backfill H)": "LC-C"
-    }
-    
-    run_case = case_map[lc_sel]
-    res = calc.calculate_stability(inputs, run_case)
-    
-    # Display Results
-    st.markdown(f"**Status: {res.status}**")
-    
-    col_r1, col_r2, col_r3, col_r4 = st.columns(4)
-    col_r1.metric("FS Sliding", f"{res.fs_slide:.2f}", delta="> 1.5")
-    col_r2.metric("FS Ot", f"{res.fs_ot:.2f}", delta="> 2.0")
-    col_r3.metric("Max Bearing", f"{res.q_max:.1f} kPa")
-    col_r4.metric("Eccentricity", f"{res.eccentricity:.3f} m")
-    
-    with st.expander("Detailed Forces"):
-        st.write(f"Driving H: {res.sum_H:.2f} kN")
-        st.write(f"Resisting H (Fric+Key+Anch): {res.fs_slide * res.sum_H:.2f} kN") # approximate back-calc approx logic
-        st.write(f"Effective V: {res.sum_V:.2f} kN")
-        st.write(f"Uplift: {res.uplift:.2f} kN")
-        st.text(res.debug_info)
+    if tab2.open:
+        st.markdown("### Select Load Case")
+        lc_sel = st.radio("Load Case", key="load_case", options=[
+            "LC-A: Canal Full / Backfill Empty (Water Level 0)", 
+            "LC-B: Both Full (Canal H / Backfill H)", 
+            "LC-C: Canal Empty / Backfill Full (Canal 0 / Backfill H)",
+            "LC-E: Seismic, Both Full + kh / kv (Mononobe-Okabe)",
+        ])
+
+        case_map = {
+            "LC-A: Canal Full / Backfill Empty (Water Level 0)": "LC-A",
+            "LC-B: Both Full (Canal H / Backfill H)": "LC-B",
+            "LC-C: Canal Empty / Backfill Full (Canal 0 / Backfill H)": "LC-C",
+            "LC-E: Seismic, Both Full + kh / kv (Mononobe-Okabe)": calc.SEISMIC_CASE,
+        }
+
+        run_case = case_map[lc_sel]
+        if run_case == calc.SEISMIC_CASE:
+            res = calc.cached_stability(inputs, run_case)
+        else:
+            res = design(inputs)[0][run_case]
+        fs_slide_min, fs_ot_min = calc.fs_limits(run_case)
+
+        # Display Results
+        st.markdown(f"**Status: {res.status}**")
+
+        col_r1, col_r2, col_r3, col_r4 = st.columns(4)
+        col_r1.metric("FS Sliding", f"{res.fs_slide:.2f}", delta=f"> {fs_slide_min}")
+        col_r2.metric("FS Ot", f"{res.fs_ot:.2f}", delta=f"> {fs_ot_min}")
+        col_r3.metric("Max Bearing", f"{res.q_max:.1f} kPa")
+        col_r4.metric("Eccentricity", f"{res.eccentricity:.3f} m")
+
+        with st.expander("Detailed Forces"):
+            st.write(f"Driving H: {res.sum_H:.2f} kN")
+            st.write(f"Resisting H (Fric+Key+Anch): {res.fs_slide * res.sum_H:.2f} kN") # approximate back-calc approx logic
+            st.write(f"Effective V: {res.sum_V:.2f} kN")
+            st.write(f"Uplift: {res.uplift:.2f} kN")
+            st.text(res.debug_info)
+
+        with st.expander("Seismic Yield Acceleration"):
+            import batch
+            import seismic
+
+            kv_ratio = kv / kh if kh > 0 else 0.0
+            ky = seismic.yield_acceleration(batch.WallInputsBatch.from_inputs([inputs]), kv_ratio=kv_ratio)
+            st.caption(f"kh at which LC-E reaches FS sliding {calc.SEISMIC_FS_LIMITS[0]} / overturning "
+                       f"{calc.SEISMIC_FS_LIMITS[1]}, with kv = {kv_ratio:.2f} kh.")
+            col_y1, col_y2 = st.columns(2)
+            for col, label, value in ((col_y1, "Sliding", ky.kh_slide[0]), (col_y2, "Overturning", ky.kh_ot[0])):
+                col.metric(f"Yield kh ({label})", f"> {seismic.KH_MAX:.2f}" if value == float("inf") else f"{value:.3f}")
+
+        with st.expander("Geometry Optimiser (Minimum Concrete)"):
+            q_allow = st.number_input("Allowable Bearing (kPa)", key="q_allow")
+            if st.button("Size Wall"):
+                import pandas as pd
+                import optimizer
+
+                opt = optimizer.optimize_geometry(inputs, q_allow=q_allow)
+                if opt is None:
+                    st.warning("No section in the search ranges satisfies every load case.")
+                else:
+                    st.success(f"Concrete: {opt.volume:.2f} m3/m ({opt.n_evaluated} checks over {opt.n_candidates} candidates)")
+                    st.table(pd.DataFrame([{
+                        "B (m)": f"{opt.inputs.B:.2f}",
+                        "Toe (m)": f"{opt.inputs.toe:.2f}",
+                        "Heel (m)": f"{opt.inputs.heel:.2f}",
+                        "t_base (m)": f"{opt.inputs.t_base:.2f}",
+                        "Key (m)": f"{opt.inputs.d_key:.2f}",
+                        "CF Spacing (m)": f"{opt.inputs.s_cf:.2f}",
+                    }]))
+
+        with st.expander("Sizing Solver (One Dimension)"):
+            st.caption("Smallest value of one dimension meeting the selected checks in every load case "
+                       "(uses the allowable bearing above).")
+            col_s1, col_s2 = st.columns(2)
+            solve_dim = col_s1.selectbox("Dimension", ["B", "heel", "toe", "t_base", "d_key"], key="solve_dim")
+            solve_criteria = col_s2.multiselect(
+                "Checks", ["fs_slide", "fs_ot", "eccentricity", "bearing"], key="solve_criteria",
+                format_func={"fs_slide": "FS Sliding", "fs_ot": "FS Overturning",
+                             "eccentricity": "Eccentricity <= B/6", "bearing": "Bearing"}.get)
+            if st.button("Solve", disabled=not solve_criteria):
+                import optimizer
+
+                sol = optimizer.solve_dimension(inputs, solve_dim, solve_criteria, q_allow=q_allow)
+                if sol is None:
+                    st.warning(f"No {solve_dim} in {optimizer.default_bounds(inputs, solve_dim)} satisfies the checks.")
+                else:
+                    st.success(f"{solve_dim} = {sol.value:.3f} m (B = {sol.inputs.B:.3f} m, heel = {sol.inputs.heel:.3f} m), "
+                               f"margin {sol.margin:.1e}, {sol.evaluations} design checks after {sol.grid_points} bracketing points")
+
+        with st.expander("Sensitivity (Tornado)"):
+            output_labels = {"fs_slide": "FS Sliding", "fs_ot": "FS Overturning",
+                             "q_max": "Max Bearing", "eccentricity": "Eccentricity"}
+            col_t1, col_t2 = st.columns(2)
+            sens_output = col_t1.selectbox("Result", list(output_labels), key="sens_output", format_func=output_labels.get)
+            sens_case = col_t2.selectbox("Load Case", ["Governing", *calc.LOAD_CASES], key="sens_case")
+            if st.checkbox("Show sensitivity (+/-10% per input)", key="show_sens"):
+                import sensitivity
+                import visualization as viz
+
+                case_arg = None if sens_case == "Governing" else sens_case
+                tor_case, tor_base, tor_bars = sensitivity.tornado(inputs, sens_output, case_arg)
+                st.plotly_chart(viz.draw_tornado(tor_bars, tor_base, f"{output_labels[sens_output]} ({tor_case})"),
+                                use_container_width=True)
+                sens = sensitivity.sensitivities(inputs, outputs=(sens_output,))
+                grads = sens.of(sens_output, tor_case)
+                st.dataframe([
+                    {"Input": name, "Value": float(getattr(inputs, name)), f"d {sens_output} / d input": grads[name]}
+                    for name in sorted(grads, key=lambda n: -abs(grads[n]))
+                ], hide_index=True)
+
+        with st.expander("Reliability (Monte Carlo, Pf for FS < 1.0)"):
+            st.caption("Correlated lognormal phi, gamma, gamma_sat, mu and surcharge (mean = input value).")
+            n_mc = st.number_input("Max Samples", step=100_000, key="n_mc")
+            if st.button("Run Monte Carlo"):
+                import reliability
+
+                mc_status = st.empty()
+                for p in reliability.run_monte_carlo(inputs, max_samples=int(n_mc), workers=0, seed=0):
+                    mc_status.write(f"Pf = {p.pf:.2e} (95% CI {p.ci_low:.2e} - {p.ci_high:.2e}), {p.n_samples:,} samples, {p.n_failures:,} failures")
+                if p.converged:
+                    st.success("Converged.")
 
 # --- Tab 3: Batch Results ---
-with tab3:
-    st.subheader("All Load Cases Summary")
-    results_map = {}
-    for c in ["LC-A", "LC-B", "LC-C"]:
-        results_map[c] = calc.calculate_stability(inputs, c)
-        
-    # Table
-    data = []
-    for c, r in results_map.items():
-        data.append({
-            "Case": c,
-            "FS Slide": f"{r.fs_slide:.2f}",
-            "FS OT": f"{r.fs_ot:.2f}",
-            "Qmax (kPa)": f"{r.q_max:.1f}",
-            "Ecc (m)": f"{r.eccentricity:.3f}",
-            "Status": r.status
-        })
-    st.table(pd.DataFrame(data))
+with tab3, instr.timer("app.tab.batch"):
+    if tab3.open:
+        import pandas as pd
+        import batch
+
+        st.subheader("All Load Cases Summary")
+        results_map = design(inputs)[0]
+
+        # Table
+        data = []
+        for c, r in results_map.items():
+            data.append({
+                "Case": c,
+                "FS Slide": f"{r.fs_slide:.2f}",
+                "FS OT": f"{r.fs_ot:.2f}",
+                "Qmax (kPa)": f"{r.q_max:.1f}",
+                "Ecc (m)": f"{r.eccentricity:.3f}",
+                "Status": r.status
+            })
+        st.table(pd.DataFrame(data))
+
+        with st.expander("Stored Designs (All Sessions)"):
+            col_q1, col_q2 = st.columns(2)
+            q_H = col_q1.slider("H range (m)", 0.0, 20.0, step=0.5, key="query_H")
+            q_pass = col_q2.checkbox("Passing only", key="query_pass")
+            found = result_store().query(H=q_H, passing=True if q_pass else None, limit=200)
+            st.caption(f"{len(found)} designs (first 200)")
+            if found:
+                st.dataframe([
+                    {"H": r["H"], "B": r["B"], "phi": r["phi_soil"], "Status": r["status"], "Min FS": r["min_fs"],
+                     "Toe": r["inputs"].toe, "Heel": r["inputs"].heel, "Key": r["inputs"].d_key}
+                    for r in found
+                ], hide_index=True)
+
+        with st.expander("Water-Level Envelope (Canal x Backfill, 0 to H)"):
+            env = batch.water_level_envelope(inputs)
+            st.table(pd.DataFrame([
+                {
+                    "Check": name.title(),
+                    "Governing Value": f"{g['value']:.3f}",
+                    "Canal (m)": f"{g['h_canal']:.2f}",
+                    "Backfill (m)": f"{g['h_backfill']:.2f}",
+                }
+                for name, g in env.governing.items()
+            ]))
+
+        with st.expander("Parametric Sweep (Parquet Export)"):
+            col_w1, col_w2, col_w3 = st.columns(3)
+            sweep_H = col_w1.slider("H range (m)", 1.0, 20.0, step=0.5, key="sweep_H")
+            sweep_heel = col_w2.slider("Heel range (m)", 0.5, 10.0, step=0.25, key="sweep_heel")
+            sweep_n = col_w3.number_input("Steps per parameter", min_value=2, max_value=500, step=10, key="sweep_n")
+            if st.button("Run Sweep"):
+                import tempfile
+                import numpy as np
+                import columnar
+
+                fd, path = tempfile.mkstemp(suffix=".parquet")
+                os.close(fd)
+                try:
+                    n = columnar.write_sweep(path, columnar.grid_batches(
+                        inputs, H=np.linspace(*sweep_H, int(sweep_n)), heel=np.linspace(*sweep_heel, int(sweep_n))))
+                    passing = columnar.read_sweep(path, ["all_pass"])["all_pass"].to_numpy().mean()
+                    st.caption(f"{n:,} designs (B follows the heel), {passing:.1%} pass every load case")
+                    with open(path, "rb") as f:
+                        st.download_button("Download Parquet", f.read(), file_name="wall_sweep.parquet")
+                finally:
+                    os.remove(path)
 
 # --- Tab 4: Reinforcement ---
-with tab4:
-    reinf = calc.calculate_reinforcement(inputs)
-    st.subheader("Reinforcement Recommendations (BS 8110)")
-    
-    col_re1, col_re2 = st.columns(2)
-    with col_re1:
-        st.info("Stem Design (One-Way Slab)")
-        st.write(f"Model: {'Continuous' if stem_cont else 'Simply Supported'}")
-        st.write(f"Ult. Moment: {reinf['Stem']['M_uls']:.1f} kNm/m")
-        st.write(f"Area Req: {reinf['Stem']['As_req']:.0f} mm2/m")
-        st.success(f"Use: {reinf['Stem']['Bar']}")
-        
-    with col_re2:
-        st.info("Base Design (Cantilevers)")
-        st.write(f"Heel Moment: {reinf['Heel']['M_uls']:.1f} kNm/m")
-        st.text(f"Heel Prov: {reinf['Heel']['Bar']}")
-        st.write(f"Toe Moment: {reinf['Toe']['M_uls']:.1f} kNm/m")
-        st.text(f"Toe Prov: {reinf['Toe']['Bar']}")
+with tab4, instr.timer("app.tab.reinforcement"):
+    if tab4.open:
+        st.subheader("Reinforcement Recommendations (BS 8110)")
+        col_sel1, col_sel2 = st.columns(2)
+        col_sel1.radio("Bar Selection", calc.BAR_CRITERIA, key="bar_criterion", horizontal=True,
+                       format_func={"weight": "Lightest", "cost": "Cheapest"}.get)
+        col_sel2.checkbox("Allow two layers", key="two_layers")
+        reinf = design(inputs)[1]
+
+        col_re1, col_re2 = st.columns(2)
+        with col_re1:
+            st.info("Stem Design (One-Way Slab)")
+            st.write(f"Model: {'Continuous' if stem_cont else 'Simply Supported'}")
+            st.write(f"Ult. Moment: {reinf['Stem']['M_uls']:.1f} kNm/m")
+            st.write(f"Area Req: {reinf['Stem']['As_req']:.0f} mm2/m")
+            st.success(f"Use: {reinf['Stem']['Bar']}")
+
+        with col_re2:
+            st.info("Base Design (Cantilevers)")
+            st.write(f"Heel Moment: {reinf['Heel']['M_uls']:.1f} kNm/m")
+            st.text(f"Heel Prov: {reinf['Heel']['Bar']}")
+            st.write(f"Toe Moment: {reinf['Toe']['M_uls']:.1f} kNm/m")
+            st.text(f"Toe Prov: {reinf['Toe']['Bar']}")
+
+        import stem
+
+        st.markdown("**Stem Curtailment**")
+        n_strips = st.number_input("Stem strips", min_value=1, max_value=5000, step=50, key="stem_strips")
+        stem_design = stem.design_stem(inputs, int(n_strips), st.session_state["bar_criterion"], bar_layers())
+        st.dataframe([
+            {
+                "From (m above base)": round(z.y_bottom, 2),
+                "To (m)": round(z.y_top, 2),
+                "As req (mm2/m)": round(z.As_req),
+                "Bars": z.bars.label,
+                "As prov (mm2/m)": round(z.bars.area),
+            }
+            for z in reversed(stem_design.zones)
+        ], hide_index=True)
 
 # --- Tab 5: 3D ---
-with tab5:
-    repeats = st.slider("Number of Bays to Show", 1, 10, 2)
-    st.plotly_chart(viz.draw_wall_3d(inputs, repeats), use_container_width=True)
+with tab5, instr.timer("app.tab.sketch"):
+    if tab5.open:
+        import visualization as viz
+
+        repeats = st.slider("Number of Bays to Show", 1, 1000, key="bays")
+        fig = CACHE.get_or_compute(("figure", calc.inputs_key(inputs), repeats),
+                                   lambda: viz.draw_wall_3d(inputs, repeats))
+        st.plotly_chart(fig, use_container_width=True)
 
 # --- Tab 6: Report ---
-with tab6:
-    if st.button("Download PDF Report"):
-        batch_res = {c: calc.calculate_stability(inputs, c) for c in ["LC-A", "LC-B", "LC-C"]}
-        pdf_file = reporting.generate_pdf_report(inputs, batch_res, reinf)
-        with open(pdf_file, "rb") as f:
-            st.download_button("Click to Save PDF", f, file_name="Design_Report.pdf")
+with tab6, instr.timer("app.tab.report"):
+    if tab6.open:
+        import reporting
+
+        if st.button("Download PDF Report"):
+            import store
+
+            def render():
+                return reporting.render_pdf_report(inputs, calc.cached_stability_all(inputs), design(inputs)[1])
+
+            key = store.content_hash(inputs, st.session_state["bar_criterion"], bar_layers())
+            pdf_bytes = CACHE.get_or_compute(("pdf", key), render)
+            st.download_button("Click to Save PDF", pdf_bytes, file_name="Design_Report.pdf", mime="application/pdf")
+
+# --- Tab 7: Design Space ---
+with tab7, instr.timer("app.tab.design_space"):
+    if tab7.open:
+        import numpy as np
+        import design_space
+        import visualization as viz
+
+        st.subheader("Design Space (Pass / Fail over Two Dimensions)")
+        fields = list(design_space.AXES)
+        col_x, col_y, col_n = st.columns(3)
+        ds_x = col_x.selectbox("X axis", fields, key="ds_x", on_change=reset_ds_range, args=("x",))
+        ds_x_range = col_x.slider(f"{ds_x} range", *design_space.AXES[ds_x][:2], key="ds_x_range")
+        ds_y = col_y.selectbox("Y axis", fields, key="ds_y", on_change=reset_ds_range, args=("y",))
+        ds_y_range = col_y.slider(f"{ds_y} range", *design_space.AXES[ds_y][:2], key="ds_y_range")
+        ds_n = col_n.number_input("Grid points per axis", min_value=10, max_value=1000, step=50, key="ds_n")
+        q_allow = st.session_state["q_allow"]
+        col_n.caption(f"All load cases, q_max <= {q_allow:.0f} kPa (Loads & Stability tab)")
+
+        if ds_x == ds_y:
+            st.warning("Choose two different fields.")
+        else:
+            def render():
+                space = design_space.evaluate_grid(
+                    inputs, ds_x, np.linspace(*ds_x_range, int(ds_n)), ds_y, np.linspace(*ds_y_range, int(ds_n)),
+                    q_allow=q_allow)
+                caption = (f"{space.passed.mean():.1%} of the grid passes; {space.evaluations:,} of "
+                           f"{space.passed.size:,} points evaluated, the rest interpolated away from the boundary")
+                return viz.draw_design_space(space), caption
+
+            key = ("figure", "design_space", calc.inputs_key(inputs), ds_x, ds_x_range, ds_y, ds_y_range,
+                   int(ds_n), q_allow)
+            fig, caption = CACHE.get_or_compute(key, render)
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption(caption)
+
+# --- Sidebar: Cache Counters & Diagnostics ---
+with st.sidebar:
+    with st.expander("Result Store"):
+        rs = result_store()
+        st.caption(f"{len(rs)} stored designs ({rs.path})")
+        st.caption(f"{rs.stats['memory_hits']} memory hits / {rs.stats['store_hits']} store hits / "
+                   f"{rs.stats['computed']} computed")
+
+    with st.expander("Shared Cache"):
+        cs = CACHE.stats()
+        st.caption(f"{cs['bytes'] / 2**20:.1f} of {cs['max_bytes'] / 2**20:.0f} MB, "
+                   f"{cs['entries']} entries, {cs['hit_rate']:.0%} hit rate")
+        for ns, c in sorted(cs["namespaces"].items()):
+            st.caption(f"{ns}: {c['entries']} entries, {c['bytes'] / 2**20:.1f} MB, "
+                       f"{c['hit_rate']:.0%} hits, {c['evictions']} evicted")
+
+    if show_diagnostics:
+        instr.record("app.rerun", time.perf_counter() - rerun_start)
+    instr.end_run()
+    if show_diagnostics:
+        with st.expander("Diagnostics: This Rerun", expanded=True):
+            st.caption(f"Scalar kernels: {kernels.backend()} (called phase by phase while timing)")
+            rows = rerun_stats.rows()
+            if rows:
+                st.dataframe(rows, hide_index=True)
+            if rerun_stats.counters:
+                st.json(rerun_stats.counters)
+            st.download_button("Prometheus Metrics", instr.export_prometheus(), file_name="metrics.prom")
+            st.download_button("Structured Log (JSONL)", instr.export_json(), file_name="metrics.jsonl")
@@ -0,0 +1,592 @@
+import numpy as np
+from dataclasses import dataclass, fields, MISSING
+from typing import Dict, Iterable, Sequence, Tuple
+
+import calculations as calc
+
+# Vectorised counterpart of calculations.calculate_stability.
+# Inputs are held as one NumPy array per WallInputs field (struct-of-arrays)
+# and every `if` of the scalar path is expressed as a masked array op, so
+# tens of thousands of sections are checked in a single call.
+
+FIELD_NAMES = tuple(f.name for f in fields(calc.WallInputs))
+BOOL_FIELDS = ("uplift_full_base", "stem_continuous")
+_DEFAULTS = {f.name: f.default for f in fields(calc.WallInputs) if f.default is not MISSING}
+
+
+class WallInputsBatch:
+    # Struct-of-arrays form of WallInputs.
+    # Columns may be given as scalars or arrays; they are broadcast to a common shape.
+
+    def __init__(self, **columns):
+        unknown = [k for k in columns if k not in FIELD_NAMES]
+        if unknown:
+            raise TypeError(f"Unknown WallInputs field(s): {', '.join(unknown)}")
+        missing = [k for k in FIELD_NAMES if k not in columns and k not in _DEFAULTS]
+        if missing:
+            raise TypeError(f"Missing WallInputs field(s): {', '.join(missing)}")
+
+        arrays = []
+        for name in FIELD_NAMES:
+            value = columns[name] if name in columns else _DEFAULTS[name]
+            dtype = bool if name in BOOL_FIELDS else float
+            arrays.append(np.atleast_1d(np.asarray(value, dtype=dtype)))
+
+        for name, arr in zip(FIELD_NAMES, np.broadcast_arrays(*arrays)):
+            setattr(self, name, arr)
+        self.shape = np.broadcast_shapes(*(a.shape for a in arrays))
+
+    @classmethod
+    def from_inputs(cls, inputs: Iterable[calc.WallInputs]) -> "WallInputsBatch":
+        rows = list(inputs)
+        return cls(**{name: [getattr(r, name) for r in rows] for name in FIELD_NAMES})
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in FIELD_NAMES}
+
+    def replace(self, **columns) -> "WallInputsBatch":
+        # New batch with some columns swapped out (broadcasting applies again).
+        cols = self.columns()
+        cols.update(columns)
+        return WallInputsBatch(**cols)
+
+    def take(self, index) -> "WallInputsBatch":
+        return WallInputsBatch(**{name: getattr(self, name).reshape(-1)[index] for name in FIELD_NAMES})
+
+    def row(self, i: int) -> calc.WallInputs:
+        values = {}
+        for name in FIELD_NAMES:
+            v = getattr(self, name).reshape(-1)[i]
+            values[name] = bool(v) if name in BOOL_FIELDS else float(v)
+        return calc.WallInputs(**values)
+
+
+# Component forces kept alongside the headline results so a row can be
+# expanded back into a StabilityResult (whose debug breakdown is built from them).
+COMPONENT_FIELDS = (
+    "Pa_1", "Pa_2", "Pa_3", "Pw_back", "Pw_front",
+    "F_friction", "F_key", "F_anchor_h", "M_uplift", "head_max",
+    "P_AE", "F_inertia", "Pw_dyn",
+)
+RESULT_FIELDS = (
+    "sum_H", "sum_V", "uplift", "res_mom", "ot_mom", "m_res_net",
+    "fs_slide", "fs_ot", "eccentricity", "q_max", "q_min",
+)
+
+
+@dataclass
+class StabilityBatchResult:
+    # Columnar StabilityResult: one array per field.
+    case_name: str
+    sum_H: np.ndarray
+    sum_V: np.ndarray
+    uplift: np.ndarray
+    res_mom: np.ndarray
+    ot_mom: np.ndarray
+    m_res_net: np.ndarray
+    fs_slide: np.ndarray
+    fs_ot: np.ndarray
+    eccentricity: np.ndarray
+    q_max: np.ndarray
+    q_min: np.ndarray
+    status: np.ndarray
+
+    # Components
+    W_conc: np.ndarray
+    Pa_1: np.ndarray
+    Pa_2: np.ndarray
+    Pa_3: np.ndarray
+    Pw_back: np.ndarray
+    Pw_front: np.ndarray
+    F_friction: np.ndarray
+    F_key: np.ndarray
+    F_anchor_h: np.ndarray
+    M_uplift: np.ndarray
+    head_max: np.ndarray
+    P_AE: np.ndarray
+    F_inertia: np.ndarray
+    Pw_dyn: np.ndarray
+
+    def __len__(self):
+        return self.fs_slide.size
+
+    @property
+    def passed(self) -> np.ndarray:
+        return self.status == "PASS"
+
+    def row(self, i: int) -> calc.StabilityResult:
+        values = {name: float(getattr(self, name).reshape(-1)[i]) for name in RESULT_FIELDS + COMPONENT_FIELDS}
+        return calc.StabilityResult(case_name=self.case_name, status=str(self.status.reshape(-1)[i]), **values)
+
+    def to_results(self) -> list:
+        # Column-wise tolist() once, rather than per-element array indexing.
+        cols = [getattr(self, name).reshape(-1).tolist() for name in RESULT_FIELDS + COMPONENT_FIELDS]
+        status = self.status.reshape(-1).tolist()
+        make = calc.StabilityResult
+        case = self.case_name
+        n = len(RESULT_FIELDS)
+        # Positional construction: StabilityResult field order is
+        # case_name, RESULT_FIELDS, status, COMPONENT_FIELDS.
+        return [make(case, *v[:n], status[i], *v[n:]) for i, v in enumerate(zip(*cols))]
+
+
+def concrete_weight(b: WallInputsBatch):
+    # Concrete self-weight per metre run (the W_conc terms of calculate_stability),
+    # its moment about the toe, the counterfort volume per metre and the
+    # weight x centroid height above the underside of the base (for inertia).
+    stem_back_x = b.toe + b.t_stem_bottom
+    h_stem = b.H - b.t_base
+
+    w_stem_rect = b.t_stem_top * h_stem * b.gamma_c
+    x_stem_rect = stem_back_x - b.t_stem_top / 2.0
+
+    w_stem_tri = 0.5 * (b.t_stem_bottom - b.t_stem_top) * h_stem * b.gamma_c
+    x_stem_tri = stem_back_x - b.t_stem_top - (b.t_stem_bottom - b.t_stem_top) / 3.0
+
+    w_base = b.B * b.t_base * b.gamma_c
+    x_base = b.B / 2.0
+
+    x_key = b.toe + b.t_stem_bottom / 2.0
+    w_key = b.d_key * b.w_key * b.gamma_c
+
+    area_cf = 0.5 * b.heel * h_stem
+    vol_cf_m = (area_cf * b.t_cf) / b.s_cf
+    w_cf = vol_cf_m * b.gamma_c
+    x_cf = stem_back_x + b.heel / 3.0
+
+    W_conc = w_stem_rect + w_stem_tri + w_base + w_key + w_cf
+    M_conc = (w_stem_rect * x_stem_rect) + (w_stem_tri * x_stem_tri) + \
+             (w_base * x_base) + (w_key * x_key) + (w_cf * x_cf)
+    M_height = (w_stem_rect * (b.t_base + h_stem / 2.0)) + (w_stem_tri * (b.t_base + h_stem / 3.0)) + \
+               (w_base * b.t_base / 2.0) - (w_key * b.d_key / 2.0) + (w_cf * (b.t_base + h_stem / 3.0))
+    return W_conc, M_conc, vol_cf_m, M_height
+
+
+def kae(phi, theta):
+    # calculate_kae for arrays (phi in degrees, theta in radians).
+    p = np.radians(phi)
+    t = np.minimum(theta, p)
+    root = np.sqrt(np.sin(p) * np.sin(p - t) / np.cos(t))
+    return np.cos(p - t) ** 2 / (np.cos(t) ** 2 * (1 + root) ** 2)
+
+
+def stability_arrays(b: WallInputsBatch, h_w_canal, h_w_backfill, kh=0.0, kv=0.0,
+                     surcharge_factor=1.0, crane_factor=1.0, anchor_factor=1.0) -> Dict[str, np.ndarray]:
+    # Core kernel. `h_w_canal` / `h_w_backfill` (and the seismic `kh` / `kv`
+    # and load factors) broadcast against the input columns, so one wall can be
+    # swept over many water levels or accelerations, or many walls checked
+    # against one level.
+    # Mirrors calculate_stability line for line, in two stages: the terms that
+    # do not depend on kh / kv, then the seismic loads, FS and bearing (which
+    # the yield-acceleration search repeats on its own).
+    terms = stability_terms(b, h_w_canal, h_w_backfill, surcharge_factor, crane_factor, anchor_factor)
+    return stability_from_terms(terms, kh, kv)
+
+
+def stability_terms(b: WallInputsBatch, h_w_canal, h_w_backfill,
+                    surcharge_factor=1.0, crane_factor=1.0, anchor_factor=1.0) -> Dict[str, np.ndarray]:
+    # Weights, uplift and static pressures, broadcast to one common shape.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        h_w_canal = np.asarray(h_w_canal, dtype=float)
+        h_w_backfill = np.asarray(h_w_backfill, dtype=float)
+        surcharge = b.surcharge * surcharge_factor
+        anchor_cap = b.anchor_cap * anchor_factor
+
+        ka = np.tan(np.radians(45 - b.phi_soil / 2.0)) ** 2
+        kp = np.tan(np.radians(45 + b.phi_soil / 2.0)) ** 2
+
+        # --- Vertical Forces & Moments about TOE ---
+        stem_back_x = b.toe + b.t_stem_bottom
+        h_stem = b.H - b.t_base
+        W_conc, M_conc, vol_cf_m, M_height = concrete_weight(b)
+
+        # Soil on heel (water level clamped to the stem height)
+        h_w_local_bf = np.minimum(np.maximum(h_w_backfill - b.t_base, 0.0), h_stem)
+        h_dry = h_stem - h_w_local_bf
+
+        w_soil_dry_gross = b.heel * h_dry * b.gamma_soil
+        w_soil_sat_gross = b.heel * h_w_local_bf * b.gamma_sat
+
+        soil_area = b.heel * h_stem
+        avg_gamma_soil = np.where(
+            (h_stem > 0) & (soil_area != 0),
+            (w_soil_dry_gross + w_soil_sat_gross) / np.where(soil_area != 0, soil_area, 1.0),
+            b.gamma_soil,
+        )
+        w_soil_displaced = vol_cf_m * avg_gamma_soil
+
+        W_soil = w_soil_dry_gross + w_soil_sat_gross - w_soil_displaced
+        x_soil = stem_back_x + b.heel / 2.0
+        M_soil = W_soil * x_soil
+
+        w_sur = surcharge * b.heel
+        M_sur = w_sur * x_soil
+
+        W_crane = b.crane_load * crane_factor
+        x_crane = stem_back_x + b.crane_dist
+        M_crane = np.where(W_crane > 0, W_crane * x_crane, 0.0)
+
+        ang_rad = np.radians(b.anchor_inclination)
+        F_anchor_v = anchor_cap * np.sin(ang_rad)
+        F_anchor_h = anchor_cap * np.cos(ang_rad)
+
+        # --- Uplift ---
+        head_max = np.maximum(h_w_canal, h_w_backfill)
+
+        U_rect = (b.gamma_w * head_max) * b.B
+        x_U_rect = b.B / 2.0
+
+        u1 = b.gamma_w * h_w_canal
+        u2 = b.gamma_w * h_w_backfill
+        u_sum = u1 + u2
+        U_trap = 0.5 * u_sum * b.B
+        x_U_trap = np.where(u_sum > 0, (b.B / 3.0) * (u1 + 2 * u2) / np.where(u_sum > 0, u_sum, 1.0), 0.0)
+
+        U = np.where(b.uplift_full_base, U_rect, U_trap)
+        x_U = np.where(b.uplift_full_base, x_U_rect, x_U_trap)
+        M_uplift = U * x_U
+
+        M_anchor = F_anchor_v * stem_back_x
+
+        # --- Horizontal Forces ---
+        h_dry_soil = np.minimum(np.maximum(b.H - h_w_backfill, 0.0), b.H)
+        h_wet_soil = h_w_backfill
+
+        Pa_1 = 0.5 * ka * b.gamma_soil * h_dry_soil ** 2
+        y_1 = h_wet_soil + h_dry_soil / 3.0
+
+        q_transfer = ka * b.gamma_soil * h_dry_soil
+        Pa_2 = q_transfer * h_wet_soil
+        y_2 = h_wet_soil / 2.0
+
+        gamma_sub = b.gamma_sat - b.gamma_w
+        Pa_3 = 0.5 * ka * gamma_sub * h_wet_soil ** 2
+        y_3 = h_wet_soil / 3.0
+
+        Pw_back = 0.5 * b.gamma_w * h_wet_soil ** 2
+        y_wb = h_wet_soil / 3.0
+
+        Pa_sur = ka * surcharge * b.H
+        y_sur = b.H / 2.0
+
+        sum_H_drive = Pa_1 + Pa_2 + Pa_3 + Pw_back + Pa_sur
+        M_OT = (Pa_1 * y_1) + (Pa_2 * y_2) + (Pa_3 * y_3) + (Pw_back * y_wb) + (Pa_sur * y_sur)
+
+        # Seismic earth pressure per unit coefficient, above / below the water table
+        S_1 = 0.5 * b.gamma_soil * h_dry_soil ** 2 + surcharge * h_dry_soil
+        S_3 = b.gamma_soil * h_dry_soil * h_wet_soil + 0.5 * gamma_sub * h_wet_soil ** 2 + surcharge * h_wet_soil
+        sub_ratio = np.where(gamma_sub > 0, b.gamma_sat / gamma_sub, 1.0)  # tan(theta_sub) / tan(theta)
+
+        Pw_front = 0.5 * b.gamma_w * h_w_canal ** 2
+        y_wf = h_w_canal / 3.0
+        M_water_resist = Pw_front * y_wf
+
+        sigma_v_top = h_w_canal * b.gamma_w
+        F_key = np.where(
+            b.d_key > 0,
+            (kp * sigma_v_top * b.d_key) + (0.5 * kp * (b.gamma_sat - b.gamma_w) * b.d_key ** 2),
+            0.0,
+        )
+
+    terms = {
+        "W_conc": W_conc, "W_soil": W_soil, "M_conc": M_conc, "M_soil": M_soil,
+        "w_sur": w_sur, "W_crane": W_crane, "F_anchor_v": F_anchor_v,
+        "M_sur": M_sur, "M_crane": M_crane, "M_anchor": M_anchor,
+        "M_W_height": M_height + W_soil * (b.t_base + h_stem / 2.0),
+        "U": U, "M_uplift": M_uplift, "head_max": head_max,
+        "Pa_1": Pa_1, "Pa_2": Pa_2, "Pa_3": Pa_3, "Pw_back": Pw_back,
+        "sum_H_static": sum_H_drive, "M_OT_static": M_OT,
+        "ka": ka, "S_1": S_1, "S_3": S_3, "sub_ratio": sub_ratio,
+        "Pw_front": Pw_front, "M_water_resist": M_water_resist, "F_key": F_key, "F_anchor_h": F_anchor_h,
+        "h_w_canal": h_w_canal, "H": b.H, "B": b.B, "phi_soil": b.phi_soil, "gamma_w": b.gamma_w, "mu_rock": b.mu_rock,
+    }
+    shape = np.broadcast_shapes(*(v.shape for v in terms.values()))
+    return {k: np.broadcast_to(v, shape) for k, v in terms.items()}
+
+
+def stability_from_terms(t: Dict[str, np.ndarray], kh=0.0, kv=0.0) -> Dict[str, np.ndarray]:
+    # Seismic loads (zero where kh = kv = 0, so static results are
+    # unchanged), factors of safety and bearing.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kh = np.asarray(kh, dtype=float)
+        kv = np.asarray(kv, dtype=float)
+        W_conc, W_soil = t["W_conc"], t["W_soil"]
+        B = t["B"]
+
+        # Upward acceleration lightens the concrete and soil
+        sum_V = W_conc + W_soil + t["w_sur"] + t["W_crane"] + t["F_anchor_v"] - kv * (W_conc + W_soil)
+        sum_V_eff = sum_V - t["U"]
+        M_conc, M_soil = t["M_conc"], t["M_soil"]
+        M_resist_weights = M_conc + M_soil + t["M_sur"] + t["M_crane"] - kv * (M_conc + M_soil)
+        M_resist_total = M_resist_weights + t["M_anchor"]
+
+        seismic = (kh != 0) | (kv != 0)
+        tan_theta = kh / (1 - kv)
+        K_1 = (1 - kv) * kae(t["phi_soil"], np.arctan(tan_theta))
+        K_3 = (1 - kv) * kae(t["phi_soil"], np.arctan(t["sub_ratio"] * tan_theta))
+        P_AE = np.where(seismic, (K_1 - t["ka"]) * t["S_1"] + (K_3 - t["ka"]) * t["S_3"], 0.0)
+        F_inertia = kh * (W_conc + W_soil)
+        h_w_canal = t["h_w_canal"]
+        Pw_dyn = (7.0 / 12.0) * kh * t["gamma_w"] * h_w_canal ** 2
+
+        sum_H_drive = t["sum_H_static"] + (P_AE + F_inertia + Pw_dyn)
+        M_OT = t["M_OT_static"] + ((P_AE * 0.6 * t["H"]) + (kh * t["M_W_height"]) + (Pw_dyn * 0.4 * h_w_canal))
+
+        sum_V_eff = np.maximum(sum_V_eff, 0.0)
+        F_friction = t["mu_rock"] * sum_V_eff
+
+        sum_H_resist_force = F_friction + t["F_key"] + t["F_anchor_h"] + t["Pw_front"]
+
+        # --- Factors of Safety ---
+        fs_slide = np.where(sum_H_drive > 0, sum_H_resist_force / sum_H_drive, 99.0)
+
+        res_mom = M_resist_total + t["M_water_resist"]
+        ot_mom = M_OT + t["M_uplift"]
+        fs_ot = np.where(ot_mom > 0, res_mom / ot_mom, 99.0)
+
+        # --- Bearing ---
+        M_net = res_mom - ot_mom
+        x_resultant = np.where(sum_V_eff > 0, M_net / sum_V_eff, 0.0)
+        e = (B / 2.0) - x_resultant
+
+        q_avg = sum_V_eff / B
+        in_middle_third = np.abs(e) <= B / 6.0
+        q_max = np.where(
+            in_middle_third,
+            q_avg * (1 + 6 * e / B),
+            np.where(x_resultant > 0, (2 * sum_V_eff) / (3 * x_resultant), 9999.0),
+        )
+        q_min = np.where(in_middle_third, q_avg * (1 - 6 * e / B), 0.0)
+
+    shape = np.broadcast_shapes(fs_slide.shape, q_max.shape)
+    out = {
+        "sum_H": sum_H_drive, "sum_V": sum_V_eff, "uplift": t["U"],
+        "res_mom": res_mom, "ot_mom": ot_mom, "m_res_net": M_net,
+        "fs_slide": fs_slide, "fs_ot": fs_ot, "eccentricity": e,
+        "q_max": q_max, "q_min": q_min,
+        "W_conc": W_conc, "Pa_1": t["Pa_1"], "Pa_2": t["Pa_2"], "Pa_3": t["Pa_3"],
+        "Pw_back": t["Pw_back"], "Pw_front": t["Pw_front"], "F_friction": F_friction,
+        "F_key": t["F_key"], "F_anchor_h": t["F_anchor_h"], "M_uplift": t["M_uplift"],
+        "head_max": t["head_max"], "P_AE": P_AE, "F_inertia": F_inertia, "Pw_dyn": Pw_dyn,
+    }
+    return {k: np.broadcast_to(v, shape) for k, v in out.items()}
+
+
+# The twelve status strings of an eccentricity label, indexed by status_codes().
+status_strings = calc.status_strings
+
+
+def status_codes(fs_slide, fs_ot, eccentricity, B, limits=calc.FS_LIMITS, e_max=1 / 6,
+                 q_max=None, q_allow=np.inf) -> np.ndarray:
+    # Same precedence as the scalar status string (calc.combination_status):
+    # Overturning overrides Sliding, Eccentricity and Bearing are appended.
+    # Code = check + 3 x eccentricity + 6 x bearing (0 = PASS). The limits
+    # may be arrays broadcasting against the results.
+    fs_slide_min, fs_ot_min = limits
+    code = np.where(fs_ot < fs_ot_min, 2, np.where(fs_slide < fs_slide_min, 1, 0)).astype(np.int8)
+    code += 3 * (np.abs(eccentricity) > e_max * B)
+    if q_max is not None:
+        code += 6 * (q_max > q_allow)
+    return code
+
+
+def stability_status(fs_slide, fs_ot, eccentricity, B, limits=calc.FS_LIMITS, e_max=1 / 6,
+                     q_max=None, q_allow=np.inf, eccentricity_label="B/6") -> np.ndarray:
+    # Status strings, looked up by code rather than built per result. The
+    # label may also be an array (one per row of a combination axis).
+    code = status_codes(fs_slide, fs_ot, eccentricity, B, limits, e_max, q_max, q_allow)
+    labels = np.asarray(eccentricity_label)
+    strings = np.array([s for label in labels.flat for s in status_strings(label)])
+    return strings[np.arange(labels.size).reshape(labels.shape) * 12 + code]
+
+
+def combination_status(c: calc.LoadCombination, arrays: Dict[str, np.ndarray], B) -> np.ndarray:
+    return stability_status(arrays["fs_slide"], arrays["fs_ot"], arrays["eccentricity"], B, c.limits, c.e_max,
+                            arrays["q_max"], c.q_allow, c.eccentricity_label)
+
+
+def _make_result(case, arrays: Dict[str, np.ndarray], B) -> StabilityBatchResult:
+    c = calc.combination(case)
+    return StabilityBatchResult(case_name=c.name, status=combination_status(c, arrays, B), **arrays)
+
+
+def calculate_stability_batch(batch: WallInputsBatch, case_name) -> StabilityBatchResult:
+    return _make_result(case_name, {k: v[0] for k, v in stability_arrays_by_case(batch, (case_name,)).items()}, batch.B)
+
+
+def stability_arrays_by_case(batch: WallInputsBatch, cases: Sequence = calc.LOAD_CASES) -> Dict[str, np.ndarray]:
+    # All cases (LoadCombinations or standard names) in one kernel call: the
+    # water levels, load factors and seismic coefficients of each are stacked
+    # along a leading case axis and broadcast against the input columns.
+    combos = [calc.combination(c) for c in cases]
+
+    def column(name):
+        return np.array([getattr(c, name) for c in combos], dtype=float).reshape((-1,) + (1,) * len(batch.shape))
+
+    H = batch.H
+    # Load factors only get a case axis where some case scales the load.
+    factors = {}
+    for name in ("surcharge_factor", "crane_factor", "anchor_factor"):
+        f = column(name)
+        factors[name] = f if np.any(f != 1.0) else 1.0
+    terms = stability_terms(batch, column("canal_level") * H, column("backfill_level") * H, **factors)
+    if not any(c.seismic_factor for c in combos):
+        return stability_from_terms(terms)
+    seismic = column("seismic_factor")
+    return stability_from_terms(terms, seismic * batch.kh, seismic * batch.kv)
+
+
+def calculate_stability_all(batch: WallInputsBatch, cases: Sequence = calc.LOAD_CASES) -> Dict[str, StabilityBatchResult]:
+    # {case name: result}; the names of the combinations must be unique.
+    arrays = stability_arrays_by_case(batch, cases)
+    results = {}
+    for i, c in enumerate(cases):
+        result = _make_result(c, {k: v[i] for k, v in arrays.items()}, batch.B)
+        results[result.case_name] = result
+    return results
+
+
+# --- Bar Selection and Reinforcement ---
+
+BAR_COLUMNS = ("diameter", "spacing", "layers", "area", "weight", "cost")
+
+def bar_table_arrays(table: calc.BarTable):
+    # (sorted areas, {column: array}, {criterion: suffix-best index array})
+    return (
+        np.array(table.areas),
+        {name: np.array([getattr(a, name) for a in table.arrangements]) for name in BAR_COLUMNS},
+        {c: np.array(best) for c, best in table.best.items()},
+    )
+
+
+# The calculations.BAR_TABLES as arrays, built once.
+_BAR_ARRAYS = {layers: bar_table_arrays(table) for layers, table in calc.BAR_TABLES.items()}
+
+
+def select_from_table(arrays, As, criterion: str = "weight") -> Dict[str, np.ndarray]:
+    # One searchsorted over the sorted area column, then the precomputed
+    # suffix-best index. "index" points into the table's arrangements.
+    if criterion not in calc.BAR_CRITERIA:
+        raise ValueError(f"Unknown bar criterion: {criterion}")
+    areas, cols, best = arrays
+    i = np.minimum(np.searchsorted(areas, np.asarray(As, dtype=float), side="left"), areas.size - 1)
+    k = best[criterion][i]
+    out = {name: col[k] for name, col in cols.items()}
+    out["index"] = k
+    return out
+
+
+def select_bars(As, criterion: str = "weight", max_layers: int = 2) -> Dict[str, np.ndarray]:
+    # Vectorised calculations.select_bars ("index" is into calc.BAR_TABLES[max_layers]).
+    return select_from_table(_BAR_ARRAYS[max_layers], As, criterion)
+
+
+REINFORCEMENT_MEMBERS = ("Stem", "Heel", "Toe")
+
+
+def reinforcement_arrays(b: WallInputsBatch, q_max_B, criterion: str = "weight",
+                         max_layers: int = 2) -> Dict[str, Dict[str, np.ndarray]]:
+    # Vectorised calculations.calculate_reinforcement. q_max_B is the LC-B
+    # bearing pressure used for the toe (e.g. calculate_stability_all(b)["LC-B"].q_max).
+    ka = np.tan(np.radians(45 - b.phi_soil / 2.0)) ** 2
+    h_s = b.H - b.t_base
+
+    # 1. Stem
+    p_lat = (ka * (b.gamma_sat - 9.81) * h_s) + (9.81 * h_s) + (ka * b.surcharge)
+    coeff = np.where(b.stem_continuous, 0.10, 0.125)
+    M_stem_uls = coeff * p_lat * (b.s_cf ** 2) * calc.ULS_FACTOR
+
+    d = b.t_stem_bottom * 1000 - b.cover - 8
+    d = np.where(d <= 0, 100.0, d)
+    As_stem = (M_stem_uls * 1e6) / (0.95 * b.fy * 0.95 * d)
+    As_min = 0.0013 * 1000 * (b.t_stem_bottom * 1000)
+
+    # 2. Heel
+    w_heel = (b.gamma_soil * h_s) + b.surcharge + (b.gamma_c * b.t_base)
+    M_heel_uls = calc.ULS_FACTOR * (w_heel * (b.heel ** 2) / 2.0)
+    d_base = b.t_base * 1000 - b.cover - 10
+    As_heel = (M_heel_uls * 1e6) / (0.95 * b.fy * 0.95 * d_base)
+    As_base_min = 0.0013 * 1000 * (b.t_base * 1000)
+
+    # 3. Toe
+    M_toe_uls = calc.ULS_FACTOR * (q_max_B * (b.toe ** 2) / 2.0)
+    As_toe = (M_toe_uls * 1e6) / (0.95 * b.fy * 0.95 * d_base)
+
+    out = {}
+    for member, M_uls, As_req in (
+        ("Stem", M_stem_uls, np.maximum(As_stem, As_min)),
+        ("Heel", M_heel_uls, np.maximum(As_heel, As_base_min)),
+        ("Toe", M_toe_uls, np.maximum(As_toe, As_base_min)),
+    ):
+        bars = select_bars(As_req, criterion, max_layers)
+        out[member] = {"M_uls": M_uls, "As_req": As_req, **{f"bar_{k}": v for k, v in bars.items()}}
+    return out
+
+
+def reinforcement_rows(arrays: Dict[str, Dict[str, np.ndarray]], max_layers: int = 2) -> list:
+    # Expand reinforcement_arrays() into calculate_reinforcement-style dicts.
+    table = calc.BAR_TABLES[max_layers].arrangements
+    cols = {
+        m: [arrays[m][k].reshape(-1).tolist() for k in ("M_uls", "As_req", "bar_index")]
+        for m in REINFORCEMENT_MEMBERS
+    }
+    n = len(cols["Stem"][0])
+    out = []
+    for i in range(n):
+        row = {}
+        for m, (M_uls, As_req, index) in cols.items():
+            bars = table[index[i]]
+            label = f"{bars.label} (As={bars.area:.0f}) > {As_req[i]:.0f}" if m == "Stem" else bars.label
+            row[m] = {"M_uls": M_uls[i], "As_req": As_req[i], "Bar": label, "Arrangement": bars}
+        out.append(row)
+    return out
+
+
+# --- Water-Level Envelope ---
+
+@dataclass
+class EnvelopeResult:
+    # Grids are indexed [canal level, backfill level].
+    h_canal: np.ndarray
+    h_backfill: np.ndarray
+    fs_slide: np.ndarray
+    fs_ot: np.ndarray
+    eccentricity: np.ndarray
+    q_max: np.ndarray
+    governing: Dict[str, Dict[str, float]]
+
+def water_level_envelope(inp: calc.WallInputs, n_canal: int = 200, n_backfill: int = 200) -> EnvelopeResult:
+    # Sweep canal level x backfill level over [0, H] in one kernel call and
+    # report the governing combination for each check.
+    b = WallInputsBatch.from_inputs([inp])
+    h_canal = np.linspace(0.0, inp.H, n_canal)
+    h_backfill = np.linspace(0.0, inp.H, n_backfill)
+    arrays = stability_arrays(b, h_canal[:, None], h_backfill[None, :])
+
+    checks = {
+        "sliding": (arrays["fs_slide"], np.argmin),
+        "overturning": (arrays["fs_ot"], np.argmin),
+        "eccentricity": (np.abs(arrays["eccentricity"]), np.argmax),
+        "bearing": (arrays["q_max"], np.argmax),
+    }
+    governing = {}
+    for name, (grid, pick) in checks.items():
+        i, j = np.unravel_index(pick(grid), grid.shape)
+        governing[name] = {
+            "h_canal": float(h_canal[i]),
+            "h_backfill": float(h_backfill[j]),
+            "value": float(grid[i, j]),
+        }
+
+    return EnvelopeResult(
+        h_canal=h_canal,
+        h_backfill=h_backfill,
+        fs_slide=arrays["fs_slide"],
+        fs_ot=arrays["fs_ot"],
+        eccentricity=arrays["eccentricity"],
+        q_max=arrays["q_max"],
+        governing=governing,
+    )
@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import dataclasses
+import functools
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import calculations as calc
+import batch
+import visualization as viz
+import reporting
+import optimizer
+import seismic
+import columnar
+import combinations
+import design_space
+import kernels
+import sensitivity
+import service
+import stem
+
+# Benchmarks for the hot paths, with a stored baseline.
+#   python bench.py                 run and compare against bench_baseline.json
+#   python bench.py --check         exit 1 if any path is slower than baseline * (1 + threshold)
+#   python bench.py --update        overwrite the baseline with this run
+#   python bench.py -k stability    only benchmarks whose name contains "stability"
+# Timings are the best per-call time over several repeats. Baselines are
+# machine specific: refresh them with --update when the reference box changes.
+# The "[..., compiled]" / "[..., interpreted]" pairs time the scalar path
+# with and without the Numba kernels; without Numba both are interpreted.
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+DEFAULT_THRESHOLD = 0.25
+
+def representative_inputs(**overrides) -> calc.WallInputs:
+    # The app.py defaults.
+    values = dict(
+        H=6.0, B=4.0, toe=1.0, heel=2.5, t_base=0.5,
+        t_stem_top=0.3, t_stem_bottom=0.5,
+        s_cf=2.5, t_cf=0.4, d_key=0.5, w_key=0.5, L_wall=20.0,
+        surcharge=10.0, crane_load=0.0, crane_dist=2.0,
+        anchor_cap=0.0, anchor_inclination=15.0,
+    )
+    values.update(overrides)
+    return calc.WallInputs(**values)
+
+def random_inputs(n: int, seed: int = 0) -> List[calc.WallInputs]:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        toe = rng.uniform(0.0, 2.0)
+        heel = rng.uniform(0.5, 5.0)
+        t_stem_bottom = rng.uniform(0.3, 0.8)
+        rows.append(representative_inputs(
+            H=rng.uniform(2.0, 10.0), B=toe + t_stem_bottom + heel, toe=toe, heel=heel,
+            t_base=rng.uniform(0.3, 1.0), t_stem_top=rng.uniform(0.2, 0.3), t_stem_bottom=t_stem_bottom,
+            s_cf=rng.uniform(2.0, 4.0), d_key=rng.choice([0.0, rng.uniform(0.1, 1.0)]),
+            surcharge=rng.uniform(0.0, 30.0), crane_load=rng.choice([0.0, rng.uniform(10, 200)]),
+            phi_soil=rng.uniform(25.0, 40.0), mu_rock=rng.uniform(0.3, 0.7),
+            anchor_cap=rng.choice([0.0, rng.uniform(10, 200)]),
+            uplift_full_base=rng.random() < 0.5, stem_continuous=rng.random() < 0.5,
+        ))
+    return rows
+
+def _cycle(items):
+    # Zero-arg callable returning the next item on each call.
+    return functools.partial(next, itertools.cycle(items))
+
+# --- Benchmarks ---
+# Each entry builds its fixtures once and returns the callable to time.
+
+def _stability_single(inputs):
+    nxt = _cycle(inputs)
+    return lambda: calc.calculate_stability(nxt(), "LC-B")
+
+def _stability_all(inputs):
+    nxt = _cycle(inputs)
+    def run():
+        inp = nxt()
+        for c in calc.LOAD_CASES:
+            calc.calculate_stability(inp, c)
+    return run
+
+def _reinforcement(inputs):
+    nxt = _cycle(inputs)
+    return lambda: calc.calculate_reinforcement(nxt())
+
+def _kernels(compiled, make):
+    # make()'s callable with the compiled kernels switched on or off (for
+    # this benchmark only: run_benchmarks restores the setting).
+    kernels.enable(compiled)
+    kernels.warm_up()
+    return make()
+
+def _suggest_bar():
+    rng = random.Random(1)
+    nxt = _cycle([rng.uniform(100.0, 6000.0) for _ in range(1000)])
+    return lambda: calc.suggest_bar(nxt())
+
+def _select_bars():
+    rng = random.Random(1)
+    nxt = _cycle([rng.uniform(100.0, 6000.0) for _ in range(1000)])
+    return lambda: calc.select_bars(nxt())
+
+def _batch_reinforcement(n):
+    b = batch.WallInputsBatch.from_inputs(random_inputs(n))
+    q_max_B = batch.calculate_stability_batch(b, "LC-B").q_max
+    return lambda: batch.reinforcement_arrays(b, q_max_B)
+
+def _stem(n):
+    inp = representative_inputs(H=9.0, t_stem_top=0.25, t_stem_bottom=0.6, s_cf=4.0)
+    return lambda: stem.design_stem(inp, n)
+
+def _solve():
+    inp = representative_inputs(H=4.0)
+    return lambda: optimizer.solve_dimension(inp, "B", ("fs_slide", "fs_ot", "eccentricity", "bearing"))
+
+def _sensitivities():
+    inp = representative_inputs()
+    return lambda: sensitivity.sensitivities(inp)
+
+def _yield_acceleration(n):
+    b = batch.WallInputsBatch.from_inputs(random_inputs(n))
+    return lambda: seismic.yield_acceleration(b)
+
+def _combinations(n):
+    b = batch.WallInputsBatch.from_inputs(random_inputs(n))
+    return lambda: combinations.check_combinations(b, combinations.EXAMPLE_TABLE)
+
+def _service(n, connections):
+    # n requests through the HTTP service from `connections` keep-alive
+    # clients (in this process, so they share the CPU with the server).
+    svc = service.RunningService()
+    bodies = [json.dumps(dataclasses.asdict(r)).encode() for r in random_inputs(n)]
+
+    async def client(part):
+        reader, writer = await asyncio.open_connection(svc.host, svc.port)
+        for body in part:
+            writer.write(b"POST /design HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            head = await reader.readuntil(b"\r\n\r\n")
+            await reader.readexactly(int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0]))
+        writer.close()
+
+    async def burst():
+        await asyncio.gather(*(client(bodies[k::connections]) for k in range(connections)))
+    return lambda: asyncio.run(burst())
+
+def _sweep_grid(n):
+    # n designs of an H x heel grid, as columnar.grid_batches yields them.
+    k = int(n ** 0.5)
+    return columnar.grid_batches(representative_inputs(), H=np.linspace(3.0, 8.0, k),
+                                 heel=np.linspace(1.0, 5.0, n // k))
+
+def _columnar_write(n, ext):
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "sweep" + ext)
+    return lambda: columnar.write_sweep(path, _sweep_grid(n), reinforcement=True)
+
+def _columnar_read(n, ext):
+    # Two columns of the rows with H > 6 out of an n-row sweep.
+    path = os.path.join(tempfile.mkdtemp(), "sweep" + ext)
+    columnar.write_sweep(path, _sweep_grid(n), reinforcement=True)
+    where = columnar.pc.field("H") > 6.0
+    return lambda: columnar.read_sweep(path, ["H", "LC-A_fs_slide"], where)
+
+def _design_space(n, coarse=design_space.COARSE):
+    inp = representative_inputs()
+    return lambda: design_space.evaluate_grid(inp, "heel", np.linspace(1.0, 6.0, n), "H", np.linspace(3.0, 9.0, n),
+                                              q_allow=300.0, coarse=coarse)
+
+def _draw_design_space(n):
+    space = _design_space(n)()
+    return lambda: viz.draw_design_space(space)
+
+def _batch_all(n):
+    b = batch.WallInputsBatch.from_inputs(random_inputs(n))
+    return lambda: batch.calculate_stability_all(b)
+
+def _draw(bays):
+    inp = representative_inputs()
+    return lambda: viz.draw_wall_3d(inp, bays)
+
+def _pdf():
+    inp = representative_inputs()
+    results = {c: calc.calculate_stability(inp, c) for c in calc.LOAD_CASES}
+    reinf = calc.calculate_reinforcement(inp)
+    return lambda: reporting.render_pdf_report(inp, results, reinf)
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {
+    "stability.single[representative]": lambda: _stability_single([representative_inputs()]),
+    "stability.single[random]": lambda: _stability_single(random_inputs(1000)),
+    "stability.all_cases[representative]": lambda: _stability_all([representative_inputs()]),
+    "stability.all_cases[random]": lambda: _stability_all(random_inputs(1000)),
+    "reinforcement[representative]": lambda: _reinforcement([representative_inputs()]),
+    "reinforcement[random]": lambda: _reinforcement(random_inputs(1000)),
+    "stability.single[random, compiled]": lambda: _kernels(True, lambda: _stability_single(random_inputs(1000))),
+    "stability.single[random, interpreted]": lambda: _kernels(False, lambda: _stability_single(random_inputs(1000))),
+    "reinforcement[random, compiled]": lambda: _kernels(True, lambda: _reinforcement(random_inputs(1000))),
+    "reinforcement[random, interpreted]": lambda: _kernels(False, lambda: _reinforcement(random_inputs(1000))),
+    "suggest_bar[random]": _suggest_bar,
+    "select_bars[random]": _select_bars,
+    "stem_strips[1000]": lambda: _stem(1000),
+    "solve_dimension[B, all checks]": _solve,
+    "sensitivities[all fields]": _sensitivities,
+    "batch.stability_all[10000 random]": lambda: _batch_all(10000),
+    "batch.reinforcement[10000 random]": lambda: _batch_reinforcement(10000),
+    "seismic.yield_acceleration[256 random]": lambda: _yield_acceleration(256),
+    "seismic.yield_acceleration[10000 random]": lambda: _yield_acceleration(10000),
+    "combinations.check[example table, 10000 random]": lambda: _combinations(10000),
+    "service.design[2000 requests, 50 connections]": lambda: _service(2000, 50),
+    "columnar.write[100000 rows, parquet]": lambda: _columnar_write(100000, ".parquet"),
+    "columnar.write[100000 rows, arrow]": lambda: _columnar_write(100000, ".arrow"),
+    "columnar.read[projected, filtered, parquet]": lambda: _columnar_read(100000, ".parquet"),
+    "columnar.read[projected, filtered, arrow]": lambda: _columnar_read(100000, ".arrow"),
+    "design_space[1000x1000 adaptive]": lambda: _design_space(1000),
+    "design_space[1000x1000 every node]": lambda: _design_space(1000, coarse=1),
+    "draw_design_space[1000x1000]": lambda: _draw_design_space(1000),
+    "draw_wall_3d[2 bays]": lambda: _draw(2),
+    "draw_wall_3d[50 bays]": lambda: _draw(50),
+    "draw_wall_3d[500 bays]": lambda: _draw(500),
+    "pdf_report[representative]": _pdf,
+}
+
+def time_call(fn: Callable[[], object], repeat: int = 5, min_time: float = 0.2) -> float:
+    # Best per-call seconds over `repeat` rounds of at least `min_time` each.
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timer.timeit(number)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def run_benchmarks(names: List[str], repeat: int = 5, min_time: float = 0.2) -> Dict[str, float]:
+    results = {}
+    for name in names:
+        saved = kernels.ENABLED
+        try:
+            results[name] = time_call(BENCHMARKS[name](), repeat, min_time)
+        finally:
+            kernels.enable(saved)
+    return results
+
+def load_baseline(path: str = BASELINE_FILE) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def save_baseline(results: Dict[str, float], path: str = BASELINE_FILE):
+    data = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor()},
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    # Names of benchmarks slower than baseline * (1 + threshold).
+    return [n for n, t in results.items() if n in baseline and t > baseline[n] * (1 + threshold)]
+
+def _fmt(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.1f} ns"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the wall design hot paths.")
+    parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 on regressions")
+    parser.add_argument("--update", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown vs baseline as a fraction (default 0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing round")
+    args = parser.parse_args(argv)
+
+    names = [n for n in BENCHMARKS if args.filter in n]
+    if not kernels.AVAILABLE and any("compiled" in n for n in names):
+        print("Numba is not installed: the compiled benchmarks run the interpreted path")
+    baseline = load_baseline(args.baseline)
+    results = {}
+    for name in names:
+        results.update(run_benchmarks([name], args.repeat, args.min_time))
+        t = results[name]
+        if name in baseline:
+            ratio = t / baseline[name]
+            flag = "  REGRESSION" if ratio > 1 + args.threshold else ""
+            print(f"{name:40s} {_fmt(t)}   x{ratio:5.2f} vs baseline{flag}")
+        else:
+            print(f"{name:40s} {_fmt(t)}   (no baseline)")
+
+    if args.update:
+        merged = dict(baseline)
+        merged.update(results)
+        save_baseline(merged, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
 import math
-from dataclasses import dataclass
+import operator
+from bisect import bisect_left
+from dataclasses import dataclass, fields
+from functools import lru_cache
 from typing import Dict, List, Tuple
 
+import instrumentation as instr
+import kernels
+
 @dataclass
 class WallInputs:
     # Dimensions
@@ -45,7 +51,14 @@ class WallInputs:
     uplift_full_base: bool = True
     stem_continuous: bool = False # False = wL^2/8, True = wL^2/10
 
-@dataclass
+    # Seismic (pseudo-static coefficients of the seismic case; kv > 0 is upwards).
+    # Last, so positional WallInputs(...) calls keep their meaning.
+    kh: float = 0.0
+    kv: float = 0.0
+
+# Compact result: slotted (no per-instance dict), with the component
+# forces stored as numbers. debug_info is only formatted when read.
+@dataclass(slots=True)
 class StabilityResult:
     case_name: str
     sum_H: float
@@ -60,7 +73,30 @@ class StabilityResult:
     q_max: float
     q_min: float
     status: str
-    debug_info: str
+
+    # Components
+    Pa_1: float = 0.0
+    Pa_2: float = 0.0
+    Pa_3: float = 0.0
+    Pw_back: float = 0.0
+    Pw_front: float = 0.0
+    F_friction: float = 0.0
+    F_key: float = 0.0
+    F_anchor_h: float = 0.0
+    M_uplift: float = 0.0
+    head_max: float = 0.0
+    P_AE: float = 0.0       # seismic earth pressure increment
+    F_inertia: float = 0.0  # seismic inertia of wall and heel soil
+    Pw_dyn: float = 0.0     # hydrodynamic canal water force
+
+    @property
+    def debug_info(self) -> str:
+        return format_debug_info(
+            self.Pa_1, self.Pa_2, self.Pa_3, self.Pw_back, self.Pw_front,
+            self.F_friction, self.F_key, self.F_anchor_h,
+            self.uplift, self.M_uplift, self.head_max,
+            self.P_AE, self.F_inertia, self.Pw_dyn,
+        )
 
 def calculate_ka(phi: float) -> float:
     # Rankine
@@ -71,60 +107,175 @@ def calculate_kp(phi: float) -> float:
     # Rankine Passive
     return math.tan(math.radians(45 + phi/2.0))**2
 
-def calculate_stability(inp: WallInputs, case_name: str) -> StabilityResult:
-    # --- 1. Load Case Definition ---
-    # LC-A: Canal Full (H), Backfill Empty (0).
-    # LC-B: Canal Full (H), Backfill Full (H).
-    # LC-C: Canal Empty (0), Backfill Full (H).
-    
-    h_w_canal = 0.0
-    h_w_backfill = 0.0
-    
-    if case_name == "LC-A":
-        h_w_canal = inp.H
-        h_w_backfill = 0.0
-    elif case_name == "LC-B":
-        h_w_canal = inp.H
-        h_w_backfill = inp.H
-    elif case_name == "LC-C":
-        h_w_canal = 0.0
-        h_w_backfill = inp.H
-    else:
-        h_w_canal = 0
-        h_w_backfill = 0
+def calculate_kae(phi: float, theta: float) -> float:
+    # Mononobe-Okabe active, vertical back, level backfill, no wall friction
+    # (equal to calculate_ka at theta = 0). theta = atan(kh / (1 - kv)) in
+    # radians. Past theta = phi the backfill has no equilibrium; the
+    # coefficient is held at its theta = phi value.
+    p = math.radians(phi)
+    t = min(theta, p)
+    root = math.sqrt(math.sin(p) * math.sin(p - t) / math.cos(t))
+    return math.cos(p - t)**2 / (math.cos(t)**2 * (1 + root)**2)
 
-    # Constants
-    ka = calculate_ka(inp.phi_soil)
-    kp = calculate_kp(inp.phi_soil)
-    
+# Minimum (sliding, overturning) factors of safety.
+FS_LIMITS = (1.5, 2.0)
+SEISMIC_FS_LIMITS = (1.1, 1.5)
+
+# Partial load factor on the characteristic bending moments (BS 8110).
+ULS_FACTOR = 1.4
+
+@dataclass(frozen=True)
+class LoadCombination:
+    # One row of a load-combination table. Water levels are fractions of H;
+    # the factors multiply the inputs' surcharge, crane_load, anchor_cap and
+    # kh / kv. The rest are its acceptance limits.
+    name: str
+    canal_level: float = 0.0
+    backfill_level: float = 0.0
+    surcharge_factor: float = 1.0
+    crane_factor: float = 1.0
+    anchor_factor: float = 1.0
+    seismic_factor: float = 0.0
+    fs_slide_min: float = FS_LIMITS[0]
+    fs_ot_min: float = FS_LIMITS[1]
+    e_max: float = 1 / 6         # x B
+    q_allow: float = math.inf    # kPa
+    description: str = ""
+
+    @property
+    def limits(self) -> Tuple[float, float]:
+        return self.fs_slide_min, self.fs_ot_min
+
+    @property
+    def eccentricity_label(self) -> str:
+        return _eccentricity_label(self.e_max)
+
+# LC-A: Canal Full (H), Backfill Empty (0).
+# LC-B: Canal Full (H), Backfill Full (H).
+# LC-C: Canal Empty (0), Backfill Full (H).
+# LC-E: LC-B plus pseudo-static seismic loads (kh, kv), against reduced limits.
+STANDARD_COMBINATIONS = (
+    LoadCombination("LC-A", canal_level=1.0, description="Canal full, backfill empty"),
+    LoadCombination("LC-B", canal_level=1.0, backfill_level=1.0, description="Canal full, backfill full"),
+    LoadCombination("LC-C", backfill_level=1.0, description="Canal empty, backfill full"),
+    LoadCombination("LC-E", canal_level=1.0, backfill_level=1.0, seismic_factor=1.0,
+                    fs_slide_min=SEISMIC_FS_LIMITS[0], fs_ot_min=SEISMIC_FS_LIMITS[1],
+                    description="LC-B with pseudo-static seismic loads"),
+)
+COMBINATIONS = {c.name: c for c in STANDARD_COMBINATIONS}
+
+LOAD_CASES = ("LC-A", "LC-B", "LC-C")
+
+# Checked on its own (not in LOAD_CASES): zero kh / kv makes it LC-B.
+SEISMIC_CASE = "LC-E"
+
+def combination(case) -> LoadCombination:
+    # A load case is a LoadCombination or the name of a standard one.
+    # Unknown names raise: they used to fall through to a dry case (no
+    # water either side) with the default limits, so a typo such as "LC-b"
+    # quietly checked the wrong, usually more favourable, loading.
+    if isinstance(case, LoadCombination):
+        return case
+    try:
+        return COMBINATIONS[case]
+    except KeyError:
+        raise ValueError(f"Unknown load case {case!r}") from None
+
+def fs_limits(case) -> Tuple[float, float]:
+    return combination(case).limits
+
+def seismic_coefficients(case, inp):
+    # (kh, kv) acting in a load case: the inputs' scaled by its seismic
+    # factor. Works for WallInputs and WallInputsBatch alike.
+    c = combination(case)
+    return c.seismic_factor * inp.kh, c.seismic_factor * inp.kv
+
+def water_levels(case, H):
+    # (Canal, Backfill) water heights of a load case.
+    # Works for floats and NumPy arrays alike.
+    c = combination(case)
+    return c.canal_level * H, c.backfill_level * H
+
+_STATUS_BASE = ("PASS", "FAIL (Sliding)", "FAIL (Overturning)")
+
+@lru_cache(maxsize=None)
+def status_strings(eccentricity_label: str = "B/6") -> Tuple[str, ...]:
+    # The twelve possible status strings, indexed by
+    # check + 3 x eccentricity + 6 x bearing (check: 0 ok, 1 sliding, 2 overturning).
+    return tuple(
+        base + ecc + bearing
+        for bearing in ("", " (Bearing)")
+        for ecc in ("", f" (Eccentricity > {eccentricity_label})")
+        for base in _STATUS_BASE
+    )
+
+@lru_cache(maxsize=None)
+def _eccentricity_label(e_max: float) -> str:
+    return f"B/{1 / e_max:g}"
+
+@lru_cache(maxsize=None)
+def _statuses(e_max: float) -> Tuple[str, ...]:
+    return status_strings(_eccentricity_label(e_max))
+
+def combination_status(c: LoadCombination, fs_slide: float, fs_ot: float, e: float, B: float, q_max: float) -> str:
+    # Overturning overrides Sliding; Eccentricity and Bearing are appended.
+    check = 2 if fs_ot < c.fs_ot_min else 1 if fs_slide < c.fs_slide_min else 0
+    return _statuses(c.e_max)[check + 3 * (abs(e) > c.e_max * B) + 6 * (q_max > c.q_allow)]
+
+def format_debug_info(Pa_1, Pa_2, Pa_3, Pw_back, Pw_front, F_friction, F_key, F_anchor_h, U, M_uplift, head_max,
+                      P_AE=0.0, F_inertia=0.0, Pw_dyn=0.0) -> str:
+    debug = f"Pa1={Pa_1:.1f}, Pa2={Pa_2:.1f}, Pa3={Pa_3:.1f}, Pw_b={Pw_back:.1f}, Pw_f={Pw_front:.1f}\n"
+    debug += f"Frique={F_friction:.1f}, Key={F_key:.1f}, AncH={F_anchor_h:.1f}\n"
+    debug += f"Uplift={U:.1f}, M_U={M_uplift:.1f}, HeadMax={head_max:.1f}"
+    if P_AE or F_inertia or Pw_dyn:
+        debug += f"\nSeismic: dPae={P_AE:.1f}, Inertia={F_inertia:.1f}, Pw_dyn={Pw_dyn:.1f}"
+    return debug
+
+# The arithmetic of calculate_stability and calculate_reinforcement, on
+# plain floats and tuples (no objects, no strings) so that kernels can
+# compile it as is. Each phase is its own function: stability_values and
+# reinforcement_values run them in a row, and with instrumentation on the
+# calculate_* functions call them one by one to time each phase.
+
+# Order of the values stability_values returns (StabilityResult fields
+# without case_name and status).
+STABILITY_OUTPUTS = (
+    "sum_H", "sum_V", "uplift", "res_mom", "ot_mom", "m_res_net", "fs_slide", "fs_ot", "eccentricity",
+    "q_max", "q_min", "Pa_1", "Pa_2", "Pa_3", "Pw_back", "Pw_front", "F_friction", "F_key", "F_anchor_h",
+    "M_uplift", "head_max", "P_AE", "F_inertia", "Pw_dyn",
+)
+
+def stability_vertical(H, B, toe, heel, t_base, t_stem_top, t_stem_bottom, s_cf, t_cf, d_key, w_key_width,
+                       surcharge, crane_load, crane_dist, gamma_c, gamma_soil, gamma_sat, anchor_cap,
+                       anchor_inclination, h_w_backfill):
     # --- 2. Vertical Forces (V) & Moments about TOE ---
     
     # A. Concrete Weights
     # Stem (Vertical Back Face assumption)
-    stem_back_x = inp.toe + inp.t_stem_bottom
-    h_stem = inp.H - inp.t_base
+    stem_back_x = toe + t_stem_bottom
+    h_stem = H - t_base
     
     # Visual Logic: Stem Top Thickness `t_t`, Bottom `t_b`.
-    w_stem_rect = inp.t_stem_top * h_stem * inp.gamma_c
-    x_stem_rect = stem_back_x - inp.t_stem_top / 2.0
+    w_stem_rect = t_stem_top * h_stem * gamma_c
+    x_stem_rect = stem_back_x - t_stem_top / 2.0
     
-    w_stem_tri = 0.5 * (inp.t_stem_bottom - inp.t_stem_top) * h_stem * inp.gamma_c
-    x_stem_tri = stem_back_x - inp.t_stem_top - (inp.t_stem_bottom - inp.t_stem_top)/3.0
+    w_stem_tri = 0.5 * (t_stem_bottom - t_stem_top) * h_stem * gamma_c
+    x_stem_tri = stem_back_x - t_stem_top - (t_stem_bottom - t_stem_top)/3.0
     
     # Base
-    w_base = inp.B * inp.t_base * inp.gamma_c
-    x_base = inp.B / 2.0
+    w_base = B * t_base * gamma_c
+    x_base = B / 2.0
     
     # Key
-    x_key = inp.toe + inp.t_stem_bottom / 2.0
-    w_key = inp.d_key * inp.w_key * inp.gamma_c
+    x_key = toe + t_stem_bottom / 2.0
+    w_key = d_key * w_key_width * gamma_c
     
     # Counterforts
     # Triangular (Stem Back to Heel End).
-    area_cf = 0.5 * inp.heel * h_stem
-    vol_cf_m = (area_cf * inp.t_cf) / inp.s_cf
-    w_cf = vol_cf_m * inp.gamma_c
-    x_cf = stem_back_x + inp.heel / 3.0
+    area_cf = 0.5 * heel * h_stem
+    vol_cf_m = (area_cf * t_cf) / s_cf
+    w_cf = vol_cf_m * gamma_c
+    x_cf = stem_back_x + heel / 3.0
     
     # Sum Concrete
     W_conc = w_stem_rect + w_stem_tri + w_base + w_key + w_cf
@@ -132,68 +283,88 @@ def calculate_stability(inp: WallInputs, case_name: str) -> StabilityResult:
              (w_base * x_base) + (w_key * x_key) + (w_cf * x_cf)
              
     # B. Soil Weight (Heel)
-    h_w_local_bf = h_w_backfill - inp.t_base
-    if h_w_local_bf < 0: h_w_local_bf = 0
+    h_w_local_bf = h_w_backfill - t_base
+    if h_w_local_bf < 0: h_w_local_bf = 0.0
     if h_w_local_bf > h_stem: h_w_local_bf = h_stem
     
     h_dry = h_stem - h_w_local_bf
     
     # Gross Soil (Assume No CF)
-    w_soil_dry_gross = inp.heel * h_dry * inp.gamma_soil
-    w_soil_sat_gross = inp.heel * h_w_local_bf * inp.gamma_sat
+    w_soil_dry_gross = heel * h_dry * gamma_soil
+    w_soil_sat_gross = heel * h_w_local_bf * gamma_sat
     
     # Displacement Correction
     h_total_soil = h_stem
     if h_total_soil > 0:
-        avg_gamma_soil = (w_soil_dry_gross + w_soil_sat_gross) / (inp.heel * h_total_soil)
+        avg_gamma_soil = (w_soil_dry_gross + w_soil_sat_gross) / (heel * h_total_soil)
     else:
-        avg_gamma_soil = inp.gamma_soil
+        avg_gamma_soil = gamma_soil
         
     w_soil_displaced = vol_cf_m * avg_gamma_soil
     
     W_soil = w_soil_dry_gross + w_soil_sat_gross - w_soil_displaced
-    x_soil = stem_back_x + inp.heel / 2.0
+    x_soil = stem_back_x + heel / 2.0
     M_soil = W_soil * x_soil
+
+    # Weight x centroid height above the underside of the base (seismic inertia)
+    y_soil = t_base + h_stem / 2.0
+    M_W_height = (w_stem_rect * (t_base + h_stem / 2.0)) + (w_stem_tri * (t_base + h_stem / 3.0)) + \
+                 (w_base * t_base / 2.0) - (w_key * d_key / 2.0) + (w_cf * (t_base + h_stem / 3.0)) + \
+                 (W_soil * y_soil)
     
     # C. Surcharge (Vertical)
-    w_sur = inp.surcharge * inp.heel
+    w_sur = surcharge * heel
     M_sur = w_sur * x_soil
     
     # D. Crane Load
-    W_crane = inp.crane_load
-    x_crane = stem_back_x + inp.crane_dist
-    M_crane = W_crane * x_crane if W_crane > 0 else 0
+    W_crane = crane_load
+    x_crane = stem_back_x + crane_dist
+    M_crane = W_crane * x_crane if W_crane > 0 else 0.0
     
     # E. Anchors (Vertical Component)
-    ang_rad = math.radians(inp.anchor_inclination)
-    F_anchor_v = inp.anchor_cap * math.sin(ang_rad)
-    F_anchor_h = inp.anchor_cap * math.cos(ang_rad)
-    
+    ang_rad = math.radians(anchor_inclination)
+    F_anchor_v = anchor_cap * math.sin(ang_rad)
+    F_anchor_h = anchor_cap * math.cos(ang_rad)
+
+    return (W_conc, M_conc, W_soil, M_soil, w_sur, M_sur, W_crane, M_crane, F_anchor_v, F_anchor_h,
+            stem_back_x, M_W_height)
+
+def stability_uplift(B, gamma_w, uplift_full_base, h_w_canal, h_w_backfill):
     # --- 3. Uplift ---
     head_max = max(h_w_canal, h_w_backfill)
     
-    if inp.uplift_full_base:
+    if uplift_full_base:
         # Rectangular distribution
-        U = (inp.gamma_w * head_max) * inp.B
-        x_U = inp.B / 2.0
+        U = (gamma_w * head_max) * B
+        x_U = B / 2.0
     else:
         # Standard Triangular/Trap
-        u1 = inp.gamma_w * h_w_canal
-        u2 = inp.gamma_w * h_w_backfill
-        U = 0.5 * (u1 + u2) * inp.B
+        u1 = gamma_w * h_w_canal
+        u2 = gamma_w * h_w_backfill
+        U = 0.5 * (u1 + u2) * B
         if (u1+u2) > 0:
-            x_U = (inp.B/3.0) * (u1 + 2*u2)/(u1 + u2)
+            x_U = (B/3.0) * (u1 + 2*u2)/(u1 + u2)
         else:
             x_U = 0.0
             
     M_uplift = U * x_U
-    
+    return U, M_uplift, head_max
+
+def stability_horizontal(H, d_key, surcharge, gamma_w, phi_soil, gamma_soil, gamma_sat, mu_rock,
+                         h_w_canal, h_w_backfill, kh, kv, vertical, uplift):
+    W_conc, M_conc, W_soil, M_soil, w_sur, M_sur, W_crane, M_crane, F_anchor_v, F_anchor_h, \
+        stem_back_x, M_W_height = vertical
+    U, M_uplift, head_max = uplift
+    ka = calculate_ka(phi_soil)
+    kp = calculate_kp(phi_soil)
+
     # Total Vertical
-    sum_V = W_conc + W_soil + w_sur + W_crane + F_anchor_v
+    # (upward seismic acceleration lightens the concrete and soil by kv)
+    sum_V = W_conc + W_soil + w_sur + W_crane + F_anchor_v - kv * (W_conc + W_soil)
     sum_V_eff = sum_V - U
     
     # Resisting Moment about Toe
-    M_resist_weights = M_conc + M_soil + M_sur + M_crane
+    M_resist_weights = M_conc + M_soil + M_sur + M_crane - kv * (M_conc + M_soil)
     M_anchor = F_anchor_v * stem_back_x # Approximated at Stem Back
     M_resist_total = M_resist_weights + M_anchor
     
@@ -201,165 +372,396 @@ def calculate_stability(inp: WallInputs, case_name: str) -> StabilityResult:
     
     # Driving:
     # 1. Earth Pressure (Backfill)
-    h_dry_soil = inp.H - h_w_backfill
-    if h_dry_soil < 0: h_dry_soil = 0
-    if h_dry_soil > inp.H: h_dry_soil = inp.H
+    h_dry_soil = H - h_w_backfill
+    if h_dry_soil < 0: h_dry_soil = 0.0
+    if h_dry_soil > H: h_dry_soil = H
     h_wet_soil = h_w_backfill
     
     # Forces
-    Pa_1 = 0.5 * ka * inp.gamma_soil * h_dry_soil**2
+    Pa_1 = 0.5 * ka * gamma_soil * h_dry_soil**2
     y_1  = h_wet_soil + h_dry_soil/3.0
     
-    q_transfer = ka * inp.gamma_soil * h_dry_soil
+    q_transfer = ka * gamma_soil * h_dry_soil
     Pa_2 = q_transfer * h_wet_soil
     y_2 = h_wet_soil / 2.0
     
-    gamma_sub = inp.gamma_sat - inp.gamma_w
+    gamma_sub = gamma_sat - gamma_w
     Pa_3 = 0.5 * ka * gamma_sub * h_wet_soil**2
     y_3 = h_wet_soil / 3.0
     
-    Pw_back = 0.5 * inp.gamma_w * h_wet_soil**2
+    Pw_back = 0.5 * gamma_w * h_wet_soil**2
     y_wb = h_wet_soil / 3.0
     
-    Pa_sur = ka * inp.surcharge * inp.H
-    y_sur = inp.H / 2.0
+    Pa_sur = ka * surcharge * H
+    y_sur = H / 2.0
     
     sum_H_drive = Pa_1 + Pa_2 + Pa_3 + Pw_back + Pa_sur
     M_OT = (Pa_1 * y_1) + (Pa_2 * y_2) + (Pa_3 * y_3) + (Pw_back * y_wb) + (Pa_sur * y_sur)
+
+    # 2. Seismic (pseudo-static)
+    # Mononobe-Okabe increment over the static earth pressure: soil and
+    # surcharge above the water table at theta, below it at the larger theta
+    # of restrained pore water (Matsuzawa), acting at 0.6H (Seed-Whitman).
+    # Inertia of the concrete and the heel soil at their centroids, and the
+    # Westergaard hydrodynamic pressure of the canal water at 0.4h.
+    P_AE = F_inertia = Pw_dyn = 0.0
+    if kh != 0 or kv != 0:
+        theta = math.atan(kh / (1 - kv))
+        theta_sub = math.atan(gamma_sat / gamma_sub * kh / (1 - kv)) if gamma_sub > 0 else theta
+        K_1 = (1 - kv) * calculate_kae(phi_soil, theta)
+        K_3 = (1 - kv) * calculate_kae(phi_soil, theta_sub)
+        S_1 = 0.5 * gamma_soil * h_dry_soil**2 + surcharge * h_dry_soil
+        S_3 = gamma_soil * h_dry_soil * h_wet_soil + 0.5 * gamma_sub * h_wet_soil**2 + surcharge * h_wet_soil
+        P_AE = (K_1 - ka) * S_1 + (K_3 - ka) * S_3
+
+        F_inertia = kh * (W_conc + W_soil)
+
+        Pw_dyn = (7.0 / 12.0) * kh * gamma_w * h_w_canal**2
+
+        sum_H_drive += P_AE + F_inertia + Pw_dyn
+        M_OT += (P_AE * 0.6 * H) + (kh * M_W_height) + (Pw_dyn * 0.4 * h_w_canal)
     
     # Resisting:
     # 1. Water Pressure (Canal - Front)
-    Pw_front = 0.5 * inp.gamma_w * h_w_canal**2
+    Pw_front = 0.5 * gamma_w * h_w_canal**2
     y_wf = h_w_canal / 3.0
     M_water_resist = Pw_front * y_wf
     
     # 2. Friction
-    if sum_V_eff < 0: sum_V_eff = 0
-    F_friction = inp.mu_rock * sum_V_eff
+    if sum_V_eff < 0: sum_V_eff = 0.0
+    F_friction = mu_rock * sum_V_eff
     
     # 3. Shear Key Passive
     F_key = 0.0
-    if inp.d_key > 0:
-        sigma_v_top = (h_w_canal * inp.gamma_w) 
-        F_key = (kp * sigma_v_top * inp.d_key) + (0.5 * kp * (inp.gamma_sat - inp.gamma_w) * inp.d_key**2)
+    if d_key > 0:
+        sigma_v_top = (h_w_canal * gamma_w) 
+        F_key = (kp * sigma_v_top * d_key) + (0.5 * kp * (gamma_sat - gamma_w) * d_key**2)
         
     sum_H_resist_force = F_friction + F_key + F_anchor_h + Pw_front
-    
+
+    return (sum_V_eff, M_resist_total + M_water_resist, M_OT + M_uplift, sum_H_drive, sum_H_resist_force,
+            Pa_1, Pa_2, Pa_3, Pw_back, Pw_front, F_friction, F_key, F_anchor_h, P_AE, F_inertia, Pw_dyn)
+
+def stability_bearing(B, uplift, horizontal):
+    # Returns STABILITY_OUTPUTS.
+    U, M_uplift, head_max = uplift
+    sum_V_eff, M_res, M_ot, sum_H_drive, sum_H_resist_force, Pa_1, Pa_2, Pa_3, Pw_back, Pw_front, \
+        F_friction, F_key, F_anchor_h, P_AE, F_inertia, Pw_dyn = horizontal
+
     # Factors of Safety
     fs_slide = sum_H_resist_force / sum_H_drive if sum_H_drive > 0 else 99.0
     
     # Overturning
-    fs_ot = (M_resist_total + M_water_resist) / (M_OT + M_uplift) if (M_OT + M_uplift) > 0 else 99.0
+    fs_ot = M_res / M_ot if M_ot > 0 else 99.0
     
     # Bearing
-    M_net = (M_resist_total + M_water_resist) - (M_OT + M_uplift)
-    x_resultant = M_net / sum_V_eff if sum_V_eff > 0 else 0
-    e = (inp.B / 2.0) - x_resultant
-    
-    q_avg = sum_V_eff / inp.B
-    if abs(e) <= inp.B / 6.0:
-        q_max = q_avg * (1 + 6*e/inp.B)
-        q_min = q_avg * (1 - 6*e/inp.B)
+    M_net = M_res - M_ot
+    x_resultant = M_net / sum_V_eff if sum_V_eff > 0 else 0.0
+    e = (B / 2.0) - x_resultant
+    
+    q_avg = sum_V_eff / B
+    if abs(e) <= B / 6.0:
+        q_max = q_avg * (1 + 6*e/B)
+        q_min = q_avg * (1 - 6*e/B)
     else:
         dist_a = x_resultant
         if dist_a > 0:
             q_max = (2 * sum_V_eff) / (3 * dist_a)
             q_min = 0.0
         else:
-            q_max = 9999
+            q_max = 9999.0
             q_min = 0.0
-            
-    status = "PASS"
-    if fs_slide < 1.5: status = "FAIL (Sliding)"
-    if fs_ot < 2.0: status = "FAIL (Overturning)"
-    if abs(e) > inp.B/6.0: status += " (Eccentricity > B/6)"
-    
-    debug = f"Pa1={Pa_1:.1f}, Pa2={Pa_2:.1f}, Pa3={Pa_3:.1f}, Pw_b={Pw_back:.1f}, Pw_f={Pw_front:.1f}\n"
-    debug += f"Frique={F_friction:.1f}, Key={F_key:.1f}, AncH={F_anchor_h:.1f}\n"
-    debug += f"Uplift={U:.1f}, M_U={M_uplift:.1f}, HeadMax={head_max:.1f}"
 
-    return StabilityResult(
-        case_name=case_name,
-        sum_H=sum_H_drive,
-        sum_V=sum_V_eff,
-        uplift=U,
-        res_mom=M_resist_total + M_water_resist,
-        ot_mom=M_OT + M_uplift,
-        m_res_net=M_net,
-        fs_slide=fs_slide,
-        fs_ot=fs_ot,
-        eccentricity=e,
-        q_max=q_max,
-        q_min=q_min,
-        status=status,
-        debug_info=debug
-    )
+    return (sum_H_drive, sum_V_eff, U, M_res, M_ot, M_net, fs_slide, fs_ot, e, q_max, q_min,
+            Pa_1, Pa_2, Pa_3, Pw_back, Pw_front, F_friction, F_key, F_anchor_h,
+            M_uplift, head_max, P_AE, F_inertia, Pw_dyn)
 
-def calculate_reinforcement(inp: WallInputs) -> Dict:
-    # BS 8110 Logic
+def stability_values(H, B, toe, heel, t_base, t_stem_top, t_stem_bottom, s_cf, t_cf, d_key, w_key_width,
+                     surcharge, crane_load, crane_dist, gamma_w, gamma_c, phi_soil, gamma_soil, gamma_sat,
+                     mu_rock, anchor_cap, anchor_inclination, uplift_full_base, h_w_canal, h_w_backfill, kh, kv):
+    # Loads already factored by the load combination (surcharge, crane_load,
+    # anchor_cap, kh, kv).
+    vertical = stability_vertical(H, B, toe, heel, t_base, t_stem_top, t_stem_bottom, s_cf, t_cf, d_key,
+                                  w_key_width, surcharge, crane_load, crane_dist, gamma_c, gamma_soil, gamma_sat,
+                                  anchor_cap, anchor_inclination, h_w_backfill)
+    uplift = stability_uplift(B, gamma_w, uplift_full_base, h_w_canal, h_w_backfill)
+    horizontal = stability_horizontal(H, d_key, surcharge, gamma_w, phi_soil, gamma_soil, gamma_sat, mu_rock,
+                                      h_w_canal, h_w_backfill, kh, kv, vertical, uplift)
+    return stability_bearing(B, uplift, horizontal)
+
+def calculate_stability(inp: WallInputs, case_name) -> StabilityResult:
+    # --- 1. Load Case Definition ---
+    # A LoadCombination, or the name of a standard one (LC-A, LC-B, LC-C, LC-E):
+    # water levels, factored surcharge / crane / anchor / seismic loads and
+    # acceptance limits.
+    
+    lap = instr.lap_timer("stability")
+    combo = combination(case_name)
+    h_w_canal, h_w_backfill = water_levels(combo, inp.H)
+    kh, kv = seismic_coefficients(combo, inp)
+    surcharge = inp.surcharge * combo.surcharge_factor
+    crane_load = inp.crane_load * combo.crane_factor
+    anchor_cap = inp.anchor_cap * combo.anchor_factor
+
+    if instr.is_enabled():
+        # The same kernels phase by phase, to time each.
+        vertical = kernels.stability_vertical(
+            inp.H, inp.B, inp.toe, inp.heel, inp.t_base, inp.t_stem_top, inp.t_stem_bottom, inp.s_cf, inp.t_cf,
+            inp.d_key, inp.w_key, surcharge, crane_load, inp.crane_dist, inp.gamma_c, inp.gamma_soil,
+            inp.gamma_sat, anchor_cap, inp.anchor_inclination, h_w_backfill)
+        lap("vertical")
+        uplift = kernels.stability_uplift(inp.B, inp.gamma_w, inp.uplift_full_base, h_w_canal, h_w_backfill)
+        lap("uplift")
+        horizontal = kernels.stability_horizontal(
+            inp.H, inp.d_key, surcharge, inp.gamma_w, inp.phi_soil, inp.gamma_soil, inp.gamma_sat, inp.mu_rock,
+            h_w_canal, h_w_backfill, kh, kv, vertical, uplift)
+        lap("horizontal")
+        values = kernels.stability_bearing(inp.B, uplift, horizontal)
+    else:
+        values = kernels.stability_values(
+            inp.H, inp.B, inp.toe, inp.heel, inp.t_base, inp.t_stem_top, inp.t_stem_bottom, inp.s_cf, inp.t_cf,
+            inp.d_key, inp.w_key, surcharge, crane_load, inp.crane_dist, inp.gamma_w, inp.gamma_c, inp.phi_soil,
+            inp.gamma_soil, inp.gamma_sat, inp.mu_rock, anchor_cap, inp.anchor_inclination, inp.uplift_full_base,
+            h_w_canal, h_w_backfill, kh, kv)
+
+    status = combination_status(combo, values[6], values[7], values[8], inp.B, values[9])
     
+    lap("bearing")
+
+    return StabilityResult(combo.name, *values[:11], status, *values[11:])
+
+def reinforcement_stem(H, t_base, t_stem_bottom, s_cf, surcharge, phi_soil, gamma_sat, fy, cover,
+                       stem_continuous, uls_factor):
     # 1. Stem
-    ka = calculate_ka(inp.phi_soil)
-    h_s = inp.H - inp.t_base
+    ka = calculate_ka(phi_soil)
+    h_s = H - t_base
     
     # Pressure
-    p_lat = (ka * (inp.gamma_sat - 9.81) * h_s) + (9.81 * h_s) + (ka * inp.surcharge)
+    p_lat = (ka * (gamma_sat - 9.81) * h_s) + (9.81 * h_s) + (ka * surcharge)
     
-    coeff = 0.10 if inp.stem_continuous else 0.125
+    coeff = 0.10 if stem_continuous else 0.125
     
-    M_stem_sls = coeff * p_lat * (inp.s_cf**2)
-    M_stem_uls = M_stem_sls * 1.4
+    M_stem_sls = coeff * p_lat * (s_cf**2)
+    M_stem_uls = M_stem_sls * uls_factor
     
-    d = inp.t_stem_bottom * 1000 - inp.cover - 8
-    if d <= 0: d = 100
+    d = t_stem_bottom * 1000 - cover - 8
+    if d <= 0: d = 100.0
     z = 0.95 * d
-    As_req = (M_stem_uls * 1e6) / (0.95 * inp.fy * z)
+    As_req = (M_stem_uls * 1e6) / (0.95 * fy * z)
     
-    As_min = 0.0013 * 1000 * (inp.t_stem_bottom * 1000)
+    As_min = 0.0013 * 1000 * (t_stem_bottom * 1000)
     As_final = max(As_req, As_min)
-    
-    bar_diam = suggest_bar(As_final)
-    
+    return M_stem_uls, As_final
+
+def reinforcement_heel(H, t_base, heel, surcharge, gamma_c, gamma_soil, fy, cover, uls_factor):
     # 2. Heel
-    w_heel = (inp.gamma_soil * h_s) + inp.surcharge + (inp.gamma_c * inp.t_base)
-    M_heel_uls = 1.4 * (w_heel * (inp.heel**2) / 2.0)
+    h_s = H - t_base
+    w_heel = (gamma_soil * h_s) + surcharge + (gamma_c * t_base)
+    M_heel_uls = uls_factor * (w_heel * (heel**2) / 2.0)
     
-    d_base = inp.t_base * 1000 - inp.cover - 10
-    As_heel = (M_heel_uls * 1e6) / (0.95 * inp.fy * 0.95*d_base)
-    As_heel_min = 0.0013 * 1000 * (inp.t_base * 1000)
+    d_base = t_base * 1000 - cover - 10
+    As_heel = (M_heel_uls * 1e6) / (0.95 * fy * 0.95*d_base)
+    As_heel_min = 0.0013 * 1000 * (t_base * 1000)
     As_heel_final = max(As_heel, As_heel_min)
+    return M_heel_uls, As_heel_final
+
+def reinforcement_toe(t_base, toe, fy, cover, q_des, uls_factor):
+    # 3. Toe (q_des: LC-B q_max), same depth and minimum steel as the heel
+    M_toe_uls = uls_factor * (q_des * (toe**2) / 2.0)
     
-    # 3. Toe
-    res_B = calculate_stability(inp, "LC-B")
-    q_des = res_B.q_max 
-    M_toe_uls = 1.4 * (q_des * (inp.toe**2) / 2.0)
-    
-    As_toe = (M_toe_uls * 1e6) / (0.95 * inp.fy * 0.95*d_base)
+    d_base = t_base * 1000 - cover - 10
+    As_toe = (M_toe_uls * 1e6) / (0.95 * fy * 0.95*d_base)
+    As_heel_min = 0.0013 * 1000 * (t_base * 1000)
     As_toe_final = max(As_toe, As_heel_min)
-    
+    return M_toe_uls, As_toe_final
+
+def reinforcement_values(H, t_base, t_stem_bottom, s_cf, toe, heel, surcharge, gamma_c, phi_soil, gamma_soil,
+                         gamma_sat, fy, cover, stem_continuous, q_des, uls_factor):
+    # (M_uls, As_req) of the stem, heel and toe.
+    M_stem_uls, As_final = reinforcement_stem(H, t_base, t_stem_bottom, s_cf, surcharge, phi_soil, gamma_sat,
+                                              fy, cover, stem_continuous, uls_factor)
+    M_heel_uls, As_heel_final = reinforcement_heel(H, t_base, heel, surcharge, gamma_c, gamma_soil, fy, cover,
+                                                   uls_factor)
+    M_toe_uls, As_toe_final = reinforcement_toe(t_base, toe, fy, cover, q_des, uls_factor)
+    return M_stem_uls, As_final, M_heel_uls, As_heel_final, M_toe_uls, As_toe_final
+
+def calculate_reinforcement(inp: WallInputs, res_B: StabilityResult = None,
+                            criterion: str = "weight", max_layers: int = 2) -> Dict:
+    # BS 8110 Logic
+    lap = instr.lap_timer("reinforcement")
+    if instr.is_enabled():
+        # The same kernels phase by phase, to time each.
+        M_stem_uls, As_final = kernels.reinforcement_stem(
+            inp.H, inp.t_base, inp.t_stem_bottom, inp.s_cf, inp.surcharge, inp.phi_soil, inp.gamma_sat, inp.fy,
+            inp.cover, inp.stem_continuous, ULS_FACTOR)
+        lap("stem")
+        M_heel_uls, As_heel_final = kernels.reinforcement_heel(
+            inp.H, inp.t_base, inp.heel, inp.surcharge, inp.gamma_c, inp.gamma_soil, inp.fy, inp.cover, ULS_FACTOR)
+        lap("heel")
+        if res_B is None:
+            res_B = calculate_stability(inp, "LC-B")
+        M_toe_uls, As_toe_final = kernels.reinforcement_toe(inp.t_base, inp.toe, inp.fy, inp.cover, res_B.q_max,
+                                                            ULS_FACTOR)
+        lap("toe")
+    else:
+        if res_B is None:
+            res_B = calculate_stability(inp, "LC-B")
+        M_stem_uls, As_final, M_heel_uls, As_heel_final, M_toe_uls, As_toe_final = kernels.reinforcement_values(
+            inp.H, inp.t_base, inp.t_stem_bottom, inp.s_cf, inp.toe, inp.heel, inp.surcharge, inp.gamma_c,
+            inp.phi_soil, inp.gamma_soil, inp.gamma_sat, inp.fy, inp.cover, inp.stem_continuous, res_B.q_max,
+            ULS_FACTOR)
+
+    stem_bars = select_bars(As_final, criterion, max_layers)
+    heel_bars = select_bars(As_heel_final, criterion, max_layers)
+    toe_bars = select_bars(As_toe_final, criterion, max_layers)
+    lap("bars")
     return {
         "Stem": {
             "M_uls": M_stem_uls,
             "As_req": As_final,
-            "Bar": f"H{bar_diam} @ 150 (As={area_of(bar_diam, 150):.0f}) > {As_final:.0f}"
+            "Bar": f"{stem_bars.label} (As={stem_bars.area:.0f}) > {As_final:.0f}",
+            "Arrangement": stem_bars,
         },
         "Heel": {
             "M_uls": M_heel_uls,
             "As_req": As_heel_final,
-            "Bar": f"H{suggest_bar(As_heel_final)} @ 150"
+            "Bar": heel_bars.label,
+            "Arrangement": heel_bars,
         },
         "Toe": {
             "M_uls": M_toe_uls,
             "As_req": As_toe_final,
-            "Bar": f"H{suggest_bar(As_toe_final)} @ 150"
+            "Bar": toe_bars.label,
+            "Arrangement": toe_bars,
         }
     }
 
 def suggest_bar(As):
-    for d in [10, 12, 16, 20, 25, 32]:
-        if area_of(d, 150) >= As:
-            return d
-    return 32
+    # Smallest diameter that provides As at 150 centres (32 if none does).
+    i = bisect_left(_AREAS_AT_150, As)
+    return BAR_DIAMETERS[min(i, len(BAR_DIAMETERS) - 1)]
 
 def area_of(d, s):
     return (math.pi * d**2 / 4.0) * (1000.0 / s)
+
+# --- Bar Selection Table ---
+# Every diameter x spacing (x layers) arrangement, sorted by area provided.
+# For each position the lightest / cheapest arrangement at or above it is
+# precomputed (a suffix minimum), so selecting bars for a required area is
+# one bisection on the sorted area column.
+
+BAR_DIAMETERS = (10, 12, 16, 20, 25, 32)
+BAR_SPACINGS = tuple(range(75, 301, 25))
+STEEL_DENSITY = 7850.0  # kg/m3
+
+# Cost model (relative units per m2 of face): steel by weight, with smaller
+# bars dearer per kg, plus a fixing cost per bar (per m width, per m run).
+BAR_PRICE_PER_KG = {10: 1.30, 12: 1.25, 16: 1.15, 20: 1.10, 25: 1.10, 32: 1.15}
+FIXING_COST_PER_BAR = 0.60
+
+BAR_CRITERIA = ("weight", "cost")
+
+@dataclass(frozen=True, slots=True)
+class BarArrangement:
+    diameter: int
+    spacing: int
+    layers: int
+    area: float    # mm2/m
+    weight: float  # kg/m2
+    cost: float    # per m2
+
+    @property
+    def label(self) -> str:
+        bars = f"H{self.diameter} @ {self.spacing}"
+        return bars if self.layers == 1 else f"{self.layers} layers {bars}"
+
+def bar_arrangement(d: int, s: int, layers: int = 1) -> BarArrangement:
+    area = layers * area_of(d, s)
+    weight = area * 1e-6 * STEEL_DENSITY
+    n_bars = layers * 1000.0 / s
+    return BarArrangement(d, s, layers, area, weight, weight * BAR_PRICE_PER_KG[d] + n_bars * FIXING_COST_PER_BAR)
+
+class BarTable:
+    # Sorted arrangements plus, per criterion, the index of the best
+    # arrangement at or after each position.
+    def __init__(self, arrangements):
+        # Ties in area: fewer layers, then wider spacing first.
+        self.arrangements = sorted(arrangements, key=lambda a: (a.area, a.layers, -a.spacing, a.diameter))
+        self.areas = [a.area for a in self.arrangements]
+        self.best = {c: self._suffix_best(c) for c in BAR_CRITERIA}
+
+    def _suffix_best(self, criterion: str) -> List[int]:
+        n = len(self.arrangements)
+        best = [0] * n
+        k = n - 1
+        for i in range(n - 1, -1, -1):
+            if getattr(self.arrangements[i], criterion) <= getattr(self.arrangements[k], criterion):
+                k = i
+            best[i] = k
+        return best
+
+    def index(self, As: float, criterion: str = "weight") -> int:
+        # Beyond the largest arrangement the largest one is returned.
+        i = min(bisect_left(self.areas, As), len(self.areas) - 1)
+        return self.best[criterion][i]
+
+    def select(self, As: float, criterion: str = "weight") -> BarArrangement:
+        return self.arrangements[self.index(As, criterion)]
+
+BAR_TABLES = {
+    layers: BarTable(bar_arrangement(d, s, n) for d in BAR_DIAMETERS for s in BAR_SPACINGS for n in range(1, layers + 1))
+    for layers in (1, 2)
+}
+
+_AREAS_AT_150 = [area_of(d, 150) for d in BAR_DIAMETERS]
+
+def select_bars(As: float, criterion: str = "weight", max_layers: int = 2) -> BarArrangement:
+    # Lightest (or cheapest) arrangement providing at least As mm2/m.
+    if criterion not in BAR_CRITERIA:
+        raise ValueError(f"Unknown bar criterion: {criterion}")
+    return BAR_TABLES[max_layers].select(As, criterion)
+
+# --- Memoized Design Cache ---
+# Results are keyed on an immutable tuple of every WallInputs field, so
+# Streamlit reruns that rebuild an identical WallInputs cost a dict lookup.
+# Cached results are shared between callers: treat them as read-only.
+
+CACHE_SIZE = 256
+
+_input_getter = operator.attrgetter(*(f.name for f in fields(WallInputs)))
+
+def inputs_key(inp: WallInputs) -> Tuple:
+    # Hashable, frozen snapshot of a WallInputs (field order).
+    return _input_getter(inp)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_stability(key: Tuple, case_name: str) -> StabilityResult:
+    instr.count("cache.stability.miss")
+    return calculate_stability(WallInputs(*key), case_name)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _cached_reinforcement(key: Tuple, criterion: str, max_layers: int) -> Dict:
+    instr.count("cache.reinforcement.miss")
+    return calculate_reinforcement(WallInputs(*key), res_B=_cached_stability(key, "LC-B"),
+                                   criterion=criterion, max_layers=max_layers)
+
+def cached_stability(inp: WallInputs, case_name: str) -> StabilityResult:
+    return _cached_stability(inputs_key(inp), case_name)
+
+def cached_stability_all(inp: WallInputs, cases=LOAD_CASES) -> Dict[str, StabilityResult]:
+    key = inputs_key(inp)
+    return {c: _cached_stability(key, c) for c in cases}
+
+def cached_reinforcement(inp: WallInputs, criterion: str = "weight", max_layers: int = 2) -> Dict:
+    return _cached_reinforcement(inputs_key(inp), criterion, max_layers)
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    stats = {}
+    for name, fn in (("stability", _cached_stability), ("reinforcement", _cached_reinforcement)):
+        info = fn.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+    return stats
+
+def clear_cache():
+    _cached_stability.cache_clear()
+    _cached_reinforcement.cache_clear()
@@ -0,0 +1,138 @@
+import argparse
+import sys
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union, TextIO
+
+import calculations as calc
+import records
+
+# Long-wall design along a chainage profile.
+# The profile is a list of stations (increasing `chainage`, in m), each
+# carrying WallInputs fields that change from that point on; anything a
+# station leaves out is carried forward from the previous one. The last
+# station marks the end of the wall.
+#
+# The wall is cut into counterfort bays of length s_cf. Load-type fields
+# in ENVELOPE_FIELDS vary linearly between stations and each bay takes the
+# maximum over its length; every other field steps at the station.
+# Stations are read lazily, so only a few are held in memory at a time.
+
+ENVELOPE_FIELDS = ("H", "surcharge", "crane_load")
+
+_TOL = 1e-9
+
+@dataclass
+class SegmentResult:
+    index: int
+    ch_start: float
+    ch_end: float
+    inputs: calc.WallInputs
+    stability: Dict[str, calc.StabilityResult]
+    reinforcement: Dict
+    reused: bool  # identical to the previous bay, results not recomputed
+
+def read_stations(source: Union[str, TextIO], base: Optional[calc.WallInputs] = None,
+                  fmt: Optional[str] = None) -> Iterator[Tuple[float, calc.WallInputs]]:
+    prev = base
+    for rec in records.read_records(source, fmt):
+        if "chainage" not in rec:
+            raise ValueError("Profile record without a 'chainage' value")
+        prev = records.inputs_from_record(rec, prev)
+        yield float(rec["chainage"]), prev
+
+def _value_at(buf, ch: float, name: str) -> float:
+    # Linear interpolation of `name` between buffered stations.
+    for (c0, s0), (c1, s1) in zip(buf, list(buf)[1:]):
+        if c0 <= ch <= c1:
+            v0, v1 = getattr(s0, name), getattr(s1, name)
+            if c1 - c0 <= _TOL:
+                return max(v0, v1)
+            return v0 + (v1 - v0) * (ch - c0) / (c1 - c0)
+    return getattr(buf[-1][1], name)
+
+def iter_bays(stations: Iterable[Tuple[float, calc.WallInputs]]) -> Iterator[Tuple[float, float, calc.WallInputs]]:
+    it = iter(stations)
+    buf = deque()
+
+    def fill(upto: float):
+        # Read ahead until a station at or beyond `upto` is buffered.
+        while buf[-1][0] < upto - _TOL:
+            st = next(it, None)
+            if st is None:
+                return
+            if st[0] < buf[-1][0]:
+                raise ValueError(f"Chainage must increase ({st[0]} after {buf[-1][0]})")
+            buf.append(st)
+
+    first = next(it, None)
+    if first is None:
+        return
+    buf.append(first)
+    a = first[0]
+
+    while True:
+        fill(a)
+        while len(buf) >= 2 and buf[1][0] <= a + _TOL:
+            buf.popleft()
+        active = buf[0][1]
+
+        b = a + active.s_cf
+        fill(b)
+        b = min(b, buf[-1][0])
+        if b - a <= _TOL:
+            return
+
+        envelope = {}
+        for name in ENVELOPE_FIELDS:
+            values = [_value_at(buf, a, name), _value_at(buf, b, name)]
+            values += [getattr(s, name) for c, s in buf if a < c < b]
+            envelope[name] = max(values)
+
+        yield a, b, replace(active, L_wall=b - a, **envelope)
+        a = b
+
+def design_segments(stations: Iterable[Tuple[float, calc.WallInputs]]) -> Iterator[SegmentResult]:
+    # Stability (all cases) and reinforcement per bay. A bay whose inputs
+    # match the previous bay (bay length aside) reuses its results.
+    prev_key = None
+    prev_results = None
+    for i, (a, b, inp) in enumerate(iter_bays(stations)):
+        key = calc.inputs_key(replace(inp, L_wall=0.0))
+        reused = key == prev_key
+        if not reused:
+            stability = {c: calc.calculate_stability(inp, c) for c in calc.LOAD_CASES}
+            reinf = calc.calculate_reinforcement(inp, res_B=stability["LC-B"])
+            prev_key, prev_results = key, (stability, reinf)
+        stability, reinf = prev_results
+        yield SegmentResult(i, a, b, inp, stability, reinf, reused)
+
+def segment_record(seg: SegmentResult) -> Dict:
+    out = {"segment": seg.index, "ch_start": seg.ch_start, "ch_end": seg.ch_end,
+           "H": seg.inputs.H, "surcharge": seg.inputs.surcharge, "crane_load": seg.inputs.crane_load}
+    out.update(records.design_record(seg.inputs, seg.stability, seg.reinforcement))
+    return out
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Design a long counterfort wall bay by bay along a chainage profile.")
+    parser.add_argument("profile", help="CSV or JSONL chainage profile ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Output file (default stdout)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Input format (default from extension)")
+    parser.add_argument("--output-format", choices=("csv", "jsonl"), default="jsonl")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        writer = records.RecordWriter(out, args.output_format)
+        n = reused = 0
+        for seg in design_segments(read_stations(args.profile, fmt=args.format)):
+            writer.write(segment_record(seg))
+            n += 1
+            reused += seg.reused
+        print(f"{n} bays designed ({n - reused} computed, {reused} reused)", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == "__main__":
+    main()
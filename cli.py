@@ -0,0 +1,173 @@
+import argparse
+import itertools
+import json
+import math
+import sys
+import time
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import calculations as calc
+import batch
+import combinations
+import records
+import seismic
+import store
+
+# Headless batch runner:
+#   python cli.py walls.csv -o results.jsonl --workers 4 --chunk-size 256
+# Records are read lazily, designed chunk by chunk (stability for every
+# load case and reinforcement through the batch engine) and written
+# back in input order as soon as each chunk is done.
+# With --store, designs already in the SQLite result store are reused and
+# new ones are added (one transaction per chunk; each worker process opens
+# its own connection).
+# With --seismic, each row also gets the yield accelerations of the seismic
+# case (kh at which FS sliding / overturning reach their limits; empty when
+# not reached by seismic.KH_MAX), searched for the whole chunk at once.
+# With --combinations table.csv, each row also gets FS, e, q_max and status
+# for every combination of a load-combination table (see combinations.py),
+# checked for the whole chunk in one batch call, plus the governing one.
+
+def _chunks(it: Iterable, size: int) -> Iterator[List]:
+    it = iter(it)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+_stores: Dict[str, store.ResultStore] = {}
+
+def _open_store(path: str) -> store.ResultStore:
+    # One connection per process and path.
+    if path not in _stores:
+        _stores[path] = store.ResultStore(path)
+    return _stores[path]
+
+def design_chunk(args: Tuple[int, List[Dict], Optional[calc.WallInputs], Optional[str], bool,
+                             Optional[combinations.Table]]) -> List[Dict]:
+    start, recs, base, store_path, with_seismic, table = args
+    out = [None] * len(recs)
+    inputs, slots = [], []
+    for i, rec in enumerate(recs):
+        try:
+            inputs.append(records.inputs_from_record(rec, base))
+            slots.append(i)
+        except ValueError as exc:
+            out[i] = {"row": start + i, "error": str(exc)}
+
+    designs = [None] * len(inputs)
+    if store_path:
+        db = _open_store(store_path)
+        keys = [store.content_hash(inp) for inp in inputs]
+        found = db.get_many(keys)
+        designs = [found.get(k) for k in keys]
+
+    todo = [j for j, d in enumerate(designs) if d is None]
+    b_all = batch.WallInputsBatch.from_inputs(inputs) if inputs and (todo or with_seismic or table) else None
+    if todo:
+        b = b_all if len(todo) == len(inputs) else b_all.take(todo)
+        results = batch.calculate_stability_all(b)
+        per_case = {c: res.to_results() for c, res in results.items()}
+        reinforcement = batch.reinforcement_rows(batch.reinforcement_arrays(b, results["LC-B"].q_max))
+        for k, (j, reinf) in enumerate(zip(todo, reinforcement)):
+            designs[j] = ({c: rows[k] for c, rows in per_case.items()}, reinf)
+        if store_path:
+            db.put_many([(inputs[j], *designs[j]) for j in todo], keys=[keys[j] for j in todo])
+
+    if with_seismic and b_all is not None:
+        ky = seismic.yield_acceleration(b_all)
+        kh_yield = [(None if math.isinf(s) else s, None if math.isinf(o) else o)
+                    for s, o in zip(ky.kh_slide.tolist(), ky.kh_ot.tolist())]
+    if table and b_all is not None:
+        check = combinations.check_combinations(b_all, table)
+        combo_rows = check.rows()
+        for row, passed, governing in zip(combo_rows, check.passed.tolist(), check.governing.tolist()):
+            row["combinations_pass"], row["governing_combination"] = passed, governing
+
+    for k, (i, inp, (stability, reinf)) in enumerate(zip(slots, inputs, designs)):
+        row = {"row": start + i}
+        row.update(recs[i])
+        row.update(records.design_record(inp, stability, reinf))
+        if with_seismic:
+            row["kh_yield_slide"], row["kh_yield_ot"] = kh_yield[k]
+        if table:
+            row.update(combo_rows[k])
+        row["error"] = ""
+        out[i] = row
+    return out
+
+def output_fields(with_seismic: bool = False, table: Optional[combinations.Table] = None) -> List[str]:
+    # Every column design_chunk can produce, for the CSV header (error rows
+    # only fill "row" and "error").
+    fields = ["row", *batch.FIELD_NAMES, *records.design_fields()]
+    if with_seismic:
+        fields += ["kh_yield_slide", "kh_yield_ot"]
+    if table:
+        for c in table:
+            fields += [f"{calc.combination(c).name}_{k}" for k in ("fs_slide", "fs_ot", "e", "q_max", "status")]
+        fields += ["combinations_pass", "governing_combination"]
+    return list(dict.fromkeys(fields + ["error"]))  # a table may repeat the standard cases
+
+def run(recs: Iterable[Dict], writer: records.RecordWriter, base: Optional[calc.WallInputs] = None,
+        workers: int = 0, chunk_size: int = 256, store_path: Optional[str] = None,
+        with_seismic: bool = False, table: Optional[combinations.Table] = None) -> int:
+    # Returns the number of records written.
+    if writer.fieldnames is None:
+        writer.fieldnames = output_fields(with_seismic, table)
+    jobs = ((k * chunk_size, chunk, base, store_path, with_seismic, table)
+            for k, chunk in enumerate(_chunks(recs, chunk_size)))
+    n = 0
+    if workers and workers > 1:
+        with Pool(workers) as pool:
+            # imap keeps input order while later chunks are still being computed
+            for rows in pool.imap(design_chunk, jobs):
+                for row in rows:
+                    writer.write(row)
+                n += len(rows)
+    else:
+        for job in jobs:
+            rows = design_chunk(job)
+            for row in rows:
+                writer.write(row)
+            n += len(rows)
+    return n
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch design of counterfort walls (BS 8110).")
+    parser.add_argument("input", help="CSV or JSONL file of WallInputs records ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Output file (default stdout)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Input format (default from extension, jsonl for stdin)")
+    parser.add_argument("--output-format", choices=("csv", "jsonl"), default="jsonl")
+    parser.add_argument("--base", help="JSON file with default WallInputs values for fields a record leaves out")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = run in this process)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Records per work unit")
+    parser.add_argument("--store", nargs="?", const=store.DEFAULT_PATH,
+                        help="Reuse / save designs in a SQLite result store (default path if no file given)")
+    parser.add_argument("--seismic", action="store_true",
+                        help="Add the seismic yield accelerations (kh_yield_slide, kh_yield_ot)")
+    parser.add_argument("--combinations", help="CSV or JSONL load-combination table to check every design against")
+    args = parser.parse_args(argv)
+
+    base = None
+    if args.base:
+        with open(args.base) as f:
+            base = records.inputs_from_record(json.load(f))
+    table = combinations.read_combinations(args.combinations) if args.combinations else None
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    t0 = time.perf_counter()
+    try:
+        writer = records.RecordWriter(out, args.output_format)
+        n = run(records.read_records(args.input, args.format), writer, base, args.workers, args.chunk_size, args.store,
+                args.seismic, table)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - t0
+    rate = n / elapsed if elapsed > 0 else float("inf")
+    print(f"{n} designs in {elapsed:.2f} s ({rate:.0f} designs/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+import calculations as calc
+import batch
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: pip install pyarrow
+    pa = pc = pq = None
+
+# Columnar sweep results (Parquet or Arrow IPC), one row per design.
+# Columns: "design" (running index), every WallInputs field, then per load
+# case "<case>_<field>" for the batch.RESULT_FIELDS and "<case>_status",
+# and "all_pass"; optionally "<member>_M_uls", "_As_req", "_bar_diameter",
+# "_bar_spacing", "_bar_layers" for the reinforcement. Numbers stay float64
+# (the toggles bool), never formatted strings; the status columns are
+# dictionary-encoded over the twelve possible strings of their case
+# (batch.status_codes / status_strings), one byte per row.
+#
+# SweepWriter streams: each batch written is computed by the batch engine
+# and buffered until a row group is full, so a sweep of any size runs in the
+# memory of one row group. read_sweep() projects columns and filters rows
+# (pyarrow.compute expressions): Arrow IPC files are memory-mapped and read
+# without copying, so only the pages of the columns touched are loaded;
+# Parquet files are read column by column, skipping row groups whose
+# statistics rule out the filter (sweeps written in grid order keep their
+# leading parameter sorted, which makes this effective).
+#
+# The format follows the extension: .parquet, or .arrow / .feather / .ipc.
+
+ROW_GROUP_SIZE = 256 * 1024
+PARQUET_COMPRESSION = "zstd"
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+STATUS_TYPE = pa.dictionary(pa.int8(), pa.string()) if pa is not None else None
+
+def _require():
+    if pa is None:
+        raise ImportError("Columnar sweep files need pyarrow (pip install pyarrow)")
+
+def _format(path: str) -> str:
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext == ".parquet":
+        return "parquet"
+    if ext in ARROW_EXTENSIONS:
+        return "arrow"
+    raise ValueError(f"Unknown sweep file type {ext!r} (use .parquet or .arrow)")
+
+def sweep_schema(cases: Sequence = calc.LOAD_CASES, reinforcement: bool = False) -> "pa.Schema":
+    _require()
+    cols = [("design", pa.int64())]
+    cols += [(n, pa.bool_() if n in batch.BOOL_FIELDS else pa.float64()) for n in batch.FIELD_NAMES]
+    for c in cases:
+        name = calc.combination(c).name
+        cols += [(f"{name}_{f}", pa.float64()) for f in batch.RESULT_FIELDS]
+        cols.append((f"{name}_status", STATUS_TYPE))
+    cols.append(("all_pass", pa.bool_()))
+    if reinforcement:
+        for m in batch.REINFORCEMENT_MEMBERS:
+            key = m.lower()
+            cols += [(f"{key}_M_uls", pa.float64()), (f"{key}_As_req", pa.float64())]
+            cols += [(f"{key}_bar_{k}", pa.int32()) for k in ("diameter", "spacing", "layers")]
+    return pa.schema(cols)
+
+class SweepWriter:
+    # with SweepWriter("sweep.parquet") as w:
+    #     for b in grid_batches(base, H=..., B=...):
+    #         w.write(b)
+    def __init__(self, path: str, cases: Sequence = calc.LOAD_CASES, reinforcement: bool = False,
+                 row_group_size: int = ROW_GROUP_SIZE, criterion: str = "weight", max_layers: int = 2):
+        _require()
+        self.path = path
+        self.format = _format(path)
+        self.cases = tuple(cases)
+        self.reinforcement = reinforcement
+        self.row_group_size = row_group_size
+        self.criterion = criterion
+        self.max_layers = max_layers
+        self.schema = sweep_schema(self.cases, reinforcement)
+        self._combos = [calc.combination(c) for c in self.cases]
+        self._statuses = [pa.array(batch.status_strings(c.eccentricity_label)) for c in self._combos]
+        self._run = tuple(self._combos)
+        if reinforcement and "LC-B" not in [c.name for c in self._combos]:
+            self._run += (calc.combination("LC-B"),)
+        self._run_names = [c.name for c in self._run]
+        self.rows = 0
+        self._buffer: List["pa.RecordBatch"] = []
+        self._buffered = 0
+        if self.format == "parquet":
+            # Dictionary pages only where values repeat (inputs, statuses, bars):
+            # on the result floats they cost time and save nothing.
+            repeats = [f.name for f in self.schema
+                       if f.name in batch.FIELD_NAMES or f.type == STATUS_TYPE or "_bar_" in f.name]
+            self._writer = pq.ParquetWriter(path, self.schema, compression=PARQUET_COMPRESSION,
+                                            use_dictionary=repeats)
+        else:
+            self._sink = pa.OSFile(path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+
+    def write(self, b: batch.WallInputsBatch):
+        # Compute and buffer one batch.
+        b = b.take(slice(None))  # flat columns
+        n = len(b)
+        results = batch.stability_arrays_by_case(b, self._run)
+
+        arrays = {"design": np.arange(self.rows, self.rows + n, dtype=np.int64)}
+        arrays.update(b.columns())
+        passed = np.ones(n, dtype=bool)
+        for i, c in enumerate(self._combos):
+            res = {f: results[f][i] for f in batch.RESULT_FIELDS}
+            arrays.update((f"{c.name}_{f}", v) for f, v in res.items())
+            code = batch.status_codes(res["fs_slide"], res["fs_ot"], res["eccentricity"], b.B,
+                                      c.limits, c.e_max, res["q_max"], c.q_allow)
+            arrays[f"{c.name}_status"] = pa.DictionaryArray.from_arrays(code, self._statuses[i])
+            passed &= code == 0
+        arrays["all_pass"] = passed
+        if self.reinforcement:
+            q_max_B = results["q_max"][self._run_names.index("LC-B")]
+            reinf = batch.reinforcement_arrays(b, q_max_B, self.criterion, self.max_layers)
+            for m in batch.REINFORCEMENT_MEMBERS:
+                key, r = m.lower(), reinf[m]
+                arrays[f"{key}_M_uls"], arrays[f"{key}_As_req"] = r["M_uls"], r["As_req"]
+                for k in ("diameter", "spacing", "layers"):
+                    arrays[f"{key}_bar_{k}"] = r[f"bar_{k}"]
+
+        record = pa.RecordBatch.from_arrays(
+            [pa.array(np.ascontiguousarray(arrays[f.name]), type=f.type) if f.type != STATUS_TYPE else arrays[f.name]
+             for f in self.schema],
+            schema=self.schema)
+        self._buffer.append(record)
+        self._buffered += n
+        self.rows += n
+        while self._buffered >= self.row_group_size:
+            self._flush(self.row_group_size)
+
+    def _flush(self, rows: Optional[int] = None):
+        # Write the first `rows` buffered rows (all by default) as one row group.
+        if not self._buffered:
+            return
+        table = pa.Table.from_batches(self._buffer, self.schema)
+        rows = self._buffered if rows is None else rows
+        head, rest = table.slice(0, rows), table.slice(rows)
+        if self.format == "parquet":
+            self._writer.write_table(head, row_group_size=rows)
+        else:
+            self._writer.write_batch(head.combine_chunks().to_batches()[0])
+        self._buffer = rest.to_batches()
+        self._buffered = rest.num_rows
+
+    def close(self):
+        if self._writer is None:
+            return
+        self._flush()
+        self._writer.close()
+        if self.format == "arrow":
+            self._sink.close()
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def grid_batches(base: calc.WallInputs, chunk_size: int = 65536, linked: bool = True,
+                 **ranges: Sequence[float]) -> Iterator[batch.WallInputsBatch]:
+    # The cartesian product of the given field values (first field slowest),
+    # everything else from `base`, in chunks. With linked geometry B follows
+    # toe + t_stem_bottom + heel when one of those is swept and B is not.
+    names = list(ranges)
+    values = [np.asarray(ranges[n], dtype=float) for n in names]
+    shape = tuple(v.size for v in values)
+    total = int(np.prod(shape)) if shape else 1
+    relink = linked and "B" not in ranges and any(n in ranges for n in ("toe", "t_stem_bottom", "heel"))
+    constant = {n: getattr(base, n) for n in batch.FIELD_NAMES if n not in ranges}
+    for start in range(0, total, chunk_size):
+        index = np.unravel_index(np.arange(start, min(start + chunk_size, total)), shape)
+        cols = dict(constant, **{n: v[i] for n, v, i in zip(names, values, index)})
+        if relink:
+            cols["B"] = cols["toe"] + cols["t_stem_bottom"] + cols["heel"]
+        yield batch.WallInputsBatch(**cols)
+
+def write_sweep(path: str, batches: Iterable[batch.WallInputsBatch], **options) -> int:
+    # Stream every batch to `path`; returns the number of rows written.
+    with SweepWriter(path, **options) as w:
+        for b in batches:
+            w.write(b)
+    return w.rows
+
+def _memory_mapped(path: str) -> "pa.Table":
+    # Zero-copy: the table's buffers point into the mapped file.
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+def read_sweep(path: str, columns: Optional[Sequence[str]] = None, filter=None) -> "pa.Table":
+    # Projected (and filtered) table. `filter` is a pyarrow.compute
+    # expression, e.g. (pc.field("H") > 5) & (pc.field("LC-A_fs_slide") < 1.5).
+    _require()
+    columns = None if columns is None else list(columns)
+    if _format(path) == "parquet":
+        return pq.read_table(path, columns=columns, filters=filter, memory_map=True)
+    table = _memory_mapped(path)
+    if filter is not None:
+        table = table.filter(filter)
+    return table if columns is None else table.select(columns)
+
+def iter_sweep(path: str, columns: Optional[Sequence[str]] = None,
+               batch_size: int = ROW_GROUP_SIZE) -> Iterator["pa.RecordBatch"]:
+    # Record batches in file order, for passes that need every row.
+    _require()
+    columns = None if columns is None else list(columns)
+    if _format(path) == "parquet":
+        yield from pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_size, columns=columns)
+        return
+    reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+    for i in range(reader.num_record_batches):
+        record = reader.get_batch(i)
+        yield record if columns is None else record.select(columns)
+
+def sweep_rows(path: str) -> int:
+    # Row count from the file metadata / batch headers only.
+    _require()
+    if _format(path) == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+    return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
@@ -0,0 +1,142 @@
+import numpy as np
+from dataclasses import dataclass, fields, replace
+from typing import Dict, Optional, Sequence, TextIO, Tuple, Union
+
+import calculations as calc
+import batch
+import records
+
+# Load-combination tables. Each row of a CSV or JSON-lines file is one
+# calculations.LoadCombination: a name, water levels (x H), factors on the
+# surcharge / crane / anchor / seismic inputs and acceptance limits; columns
+# a row leaves out take the LoadCombination defaults (or, for a row named
+# after a standard case, that case's values), and fractions such as "1/4"
+# are accepted for e_max. A whole table is checked for every wall of a
+# batch in one kernel call, with the combinations along the leading axis.
+#
+#   name,canal_level,backfill_level,crane_factor,anchor_factor,fs_slide_min,fs_ot_min,e_max
+#   CRANE-OFF,1,1,0,1,1.5,2.0,1/6
+#   ANCHORS-LOST,1,1,1,0,1.3,1.5,1/4
+
+Table = Tuple[calc.LoadCombination, ...]
+
+_TEXT_FIELDS = ("name", "description")
+_FIELD_NAMES = tuple(f.name for f in fields(calc.LoadCombination))
+
+# Typical project combinations, as an example and a starting point.
+EXAMPLE_TABLE: Table = calc.STANDARD_COMBINATIONS[:3] + (
+    calc.LoadCombination("CONSTRUCTION", surcharge_factor=0.5, crane_factor=0.0, anchor_factor=0.0,
+                         fs_slide_min=1.3, fs_ot_min=1.5, e_max=1 / 4,
+                         description="Backfill placed dry, no anchors, construction traffic only"),
+    calc.LoadCombination("CRANE-OFF", canal_level=1.0, backfill_level=1.0, crane_factor=0.0,
+                         description="LC-B without the crane"),
+    calc.LoadCombination("CRANE-OFF-DRY", backfill_level=1.0, crane_factor=0.0,
+                         description="LC-C without the crane"),
+    calc.LoadCombination("ANCHORS-LOST", canal_level=1.0, backfill_level=1.0, anchor_factor=0.0,
+                         fs_slide_min=1.3, fs_ot_min=1.5, e_max=1 / 4,
+                         description="LC-B with the anchors out of service"),
+    calc.LoadCombination("FLOOD", canal_level=1.0, backfill_level=1.0, surcharge_factor=0.0, crane_factor=0.0,
+                         fs_slide_min=1.3, fs_ot_min=1.5, e_max=1 / 4,
+                         description="Both sides flooded, site cleared"),
+    calc.LoadCombination("RAPID-DRAWDOWN", canal_level=0.25, backfill_level=1.0,
+                         fs_slide_min=1.3, fs_ot_min=1.5, e_max=1 / 4,
+                         description="Canal drawn down to H/4 before the backfill drains"),
+    calc.STANDARD_COMBINATIONS[3],
+)
+
+def _number(v) -> float:
+    if isinstance(v, str) and "/" in v:
+        num, den = v.split("/")
+        return float(num) / float(den)
+    return float(v)
+
+def combination_from_record(record: Dict) -> calc.LoadCombination:
+    # A row named after a standard case (LC-A ...) starts from that case.
+    # Unknown keys are ignored.
+    values = {}
+    for name in _FIELD_NAMES:
+        if name in record:
+            v = record[name]
+            values[name] = str(v).strip() if name in _TEXT_FIELDS else _number(v)
+    if not values.get("name"):
+        raise ValueError(f"Load combination without a name: {record}")
+    standard = calc.COMBINATIONS.get(values["name"])
+    return calc.LoadCombination(**values) if standard is None else replace(standard, **values)
+
+def read_combinations(source: Union[str, TextIO], fmt: Optional[str] = None) -> Table:
+    # A table from a path, open file or "-" (format as records.read_records).
+    table = tuple(combination_from_record(r) for r in records.read_records(source, fmt))
+    names = [c.name for c in table]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate load combination names: {', '.join(duplicates)}")
+    if not table:
+        raise ValueError("Empty load combination table")
+    return table
+
+def write_combinations(table: Sequence[calc.LoadCombination], out: TextIO, fmt: str = "csv"):
+    writer = records.RecordWriter(out, fmt)
+    for c in table:
+        writer.write({name: getattr(c, name) for name in _FIELD_NAMES})
+
+@dataclass
+class CombinationCheck:
+    # Arrays are indexed [combination, wall].
+    table: Table
+    fs_slide: np.ndarray
+    fs_ot: np.ndarray
+    eccentricity: np.ndarray
+    q_max: np.ndarray
+    status: np.ndarray
+    utilisation: np.ndarray  # largest of limit / FS, |e| / e_max B and q_max / q_allow
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return tuple(c.name for c in self.table)
+
+    @property
+    def passed(self) -> np.ndarray:
+        # Per wall: every combination passes.
+        return np.all(self.status == "PASS", axis=0)
+
+    @property
+    def governing(self) -> np.ndarray:
+        # Per wall: name of the combination with the highest utilisation.
+        return np.array(self.names)[np.argmax(self.utilisation, axis=0)]
+
+    def rows(self) -> list:
+        # One flat record per wall, like records.design_record.
+        out = []
+        cols = {k: getattr(self, k).T.tolist() for k in ("fs_slide", "fs_ot", "eccentricity", "q_max", "status")}
+        for i in range(self.status.shape[1]):
+            row = {}
+            for j, name in enumerate(self.names):
+                row[f"{name}_fs_slide"] = cols["fs_slide"][i][j]
+                row[f"{name}_fs_ot"] = cols["fs_ot"][i][j]
+                row[f"{name}_e"] = cols["eccentricity"][i][j]
+                row[f"{name}_q_max"] = cols["q_max"][i][j]
+                row[f"{name}_status"] = cols["status"][i][j]
+            out.append(row)
+        return out
+
+def check_combinations(b: batch.WallInputsBatch, table: Sequence = EXAMPLE_TABLE) -> CombinationCheck:
+    # Every combination of the table for every wall of the batch, in one
+    # batch.stability_arrays_by_case call; limits broadcast down the
+    # combination axis.
+    table = tuple(calc.combination(c) for c in table)
+    b = b.take(slice(None))  # flat columns
+    arrays = batch.stability_arrays_by_case(b, table)
+
+    def column(name):
+        return np.array([getattr(c, name) for c in table], dtype=float)[:, None]
+
+    fs_slide_min, fs_ot_min, e_max, q_allow = (column(n) for n in ("fs_slide_min", "fs_ot_min", "e_max", "q_allow"))
+    labels = np.array([c.eccentricity_label for c in table])[:, None]
+    fs_slide, fs_ot, e, q_max = arrays["fs_slide"], arrays["fs_ot"], arrays["eccentricity"], arrays["q_max"]
+
+    status = batch.stability_status(fs_slide, fs_ot, e, b.B, (fs_slide_min, fs_ot_min), e_max, q_max, q_allow, labels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        utilisation = np.maximum.reduce([
+            fs_slide_min / fs_slide, fs_ot_min / fs_ot, np.abs(e) / (e_max * b.B), q_max / q_allow,
+        ])
+    return CombinationCheck(table, fs_slide, fs_ot, e, q_max, status, utilisation)
@@ -0,0 +1,176 @@
+import math
+import numpy as np
+from dataclasses import dataclass
+from typing import Sequence, Tuple
+
+import calculations as calc
+import batch
+
+# Design-space maps: the governing FS sliding, FS overturning and q_max over
+# two WallInputs fields (B x heel, s_cf x t_stem_bottom, ...), everything
+# else from a base design, checked against a set of load cases.
+#
+# Grids are refined adaptively. The batch engine first runs on a coarse
+# lattice (every `coarse`-th node of each axis, plus the last one); each
+# halving of the lattice spacing then evaluates only the new nodes inside
+# cells whose corners disagree on pass/fail. New nodes inside cells that
+# agree take the corners' verdict and bilinear values. The pass/fail
+# boundary is therefore resolved to the full grid, at a cost proportional
+# to its length rather than to the grid area; a pass or fail island smaller
+# than one coarse cell can be missed (coarse=1 evaluates every node).
+#
+# Geometry stays consistent: B = toe + t_stem_bottom + heel. With B on an
+# axis the heel follows it (the toe when the heel is the other axis);
+# otherwise B follows a swept toe, heel or t_stem_bottom. Nodes where that
+# leaves a negative toe or heel are invalid: NaN values, never passing.
+
+# Fields offered as axes: (slider min, slider max, default range).
+AXES = {
+    "B": (1.0, 15.0, (2.5, 8.0)),
+    "heel": (0.5, 12.0, (1.0, 6.0)),
+    "toe": (0.0, 5.0, (0.0, 3.0)),
+    "t_base": (0.2, 2.0, (0.3, 1.0)),
+    "t_stem_bottom": (0.2, 2.0, (0.3, 1.0)),
+    "s_cf": (1.0, 8.0, (2.0, 5.0)),
+    "t_cf": (0.2, 1.0, (0.3, 0.8)),
+    "d_key": (0.0, 3.0, (0.0, 1.5)),
+    "H": (1.0, 20.0, (3.0, 9.0)),
+    "phi_soil": (15.0, 45.0, (25.0, 40.0)),
+    "mu_rock": (0.2, 0.9, (0.3, 0.7)),
+    "surcharge": (0.0, 50.0, (0.0, 30.0)),
+}
+
+COARSE = 16
+MAX_DISPLAY = 300  # nodes per axis sent to the browser
+
+@dataclass
+class DesignSpace:
+    # Maps are indexed [y, x], as plotly draws a z matrix.
+    x_name: str
+    y_name: str
+    x: np.ndarray
+    y: np.ndarray
+    fs_slide: np.ndarray  # lowest over the cases
+    fs_ot: np.ndarray     # lowest over the cases
+    q_max: np.ndarray     # highest over the cases
+    passed: np.ndarray    # every case passes, q_max <= q_allow
+    evaluated: np.ndarray  # node computed (not interpolated)
+    limits: Tuple[float, float]  # strictest FS limits of the cases
+    q_allow: float
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.passed.shape
+
+    @property
+    def evaluations(self) -> int:
+        return int(self.evaluated.sum())
+
+    def downsample(self, max_points: int = MAX_DISPLAY) -> "DesignSpace":
+        # At most max_points nodes per axis, block by block: the block's
+        # worst FS and q_max, passing only if all of it passes, centred on
+        # the mean of its coordinates. Blocks keep failures visible where
+        # striding would step over them.
+        ky, kx = (math.ceil(n / max_points) for n in self.shape)
+        if kx == ky == 1:
+            return self
+
+        def blocks(z, fill):
+            ny, nx = z.shape
+            padded = np.full((-(-ny // ky) * ky, -(-nx // kx) * kx), fill, dtype=z.dtype)
+            padded[:ny, :nx] = z
+            return padded.reshape(padded.shape[0] // ky, ky, padded.shape[1] // kx, kx)
+
+        def centres(v, k):
+            starts = np.arange(0, v.size, k)
+            return np.add.reduceat(v, starts) / np.diff(np.append(starts, v.size))
+
+        return DesignSpace(
+            self.x_name, self.y_name, centres(self.x, kx), centres(self.y, ky),
+            np.fmin.reduce(np.fmin.reduce(blocks(self.fs_slide, np.nan), axis=3), axis=1),
+            np.fmin.reduce(np.fmin.reduce(blocks(self.fs_ot, np.nan), axis=3), axis=1),
+            np.fmax.reduce(np.fmax.reduce(blocks(self.q_max, np.nan), axis=3), axis=1),
+            blocks(self.passed, True).all(axis=(1, 3)),
+            blocks(self.evaluated, False).any(axis=(1, 3)),
+            self.limits, self.q_allow)
+
+def _lattice(n: int, step: int) -> np.ndarray:
+    # Every step-th index of an axis of n nodes, plus the last.
+    return np.unique(np.minimum(np.arange(0, n - 1 + step, step), n - 1))
+
+def _corners(i: np.ndarray, n: int, step: int):
+    # Ends of the lattice cell holding each index, and its position in it.
+    i0 = i // step * step
+    i1 = np.minimum(i0 + step, n - 1)
+    t = np.where(i1 > i0, (i - i0) / np.maximum(i1 - i0, 1), 0.0)
+    return i0, i1, t
+
+def _linked(b: batch.WallInputsBatch, axes: Sequence[str]) -> batch.WallInputsBatch:
+    if "B" in axes:
+        if "heel" in axes:
+            return b.replace(toe=b.B - b.t_stem_bottom - b.heel)
+        return b.replace(heel=b.B - b.toe - b.t_stem_bottom)
+    if any(n in axes for n in ("toe", "t_stem_bottom", "heel")):
+        return b.replace(B=b.toe + b.t_stem_bottom + b.heel)
+    return b
+
+def evaluate_grid(base: calc.WallInputs, x_name: str, x: Sequence[float], y_name: str, y: Sequence[float],
+                  cases: Sequence = calc.LOAD_CASES, q_allow: float = np.inf, coarse: int = COARSE) -> DesignSpace:
+    if x_name == y_name:
+        raise ValueError("The two axes must be different fields")
+    for name in (x_name, y_name):
+        if name not in batch.FIELD_NAMES or name in batch.BOOL_FIELDS:
+            raise ValueError(f"Cannot map over {name!r}")
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    nx, ny = x.size, y.size
+    combos = [calc.combination(c) for c in cases]
+    fs_slide_min = np.array([c.fs_slide_min for c in combos])[:, None]
+    fs_ot_min = np.array([c.fs_ot_min for c in combos])[:, None]
+    e_max = np.array([c.e_max for c in combos])[:, None]
+    case_q_allow = np.minimum([c.q_allow for c in combos], q_allow)[:, None]
+    base_batch = batch.WallInputsBatch.from_inputs([base])
+
+    shape = (ny, nx)
+    values = np.full((3,) + shape, np.nan)  # fs_slide, fs_ot, q_max
+    state = np.zeros(shape, dtype=np.int8)  # 1 passed, 2 invalid, 0 failed
+    evaluated = np.zeros(shape, dtype=bool)
+    known = np.zeros(shape, dtype=bool)
+
+    def evaluate(iy, ix):
+        b = _linked(base_batch.replace(**{x_name: x[ix], y_name: y[iy]}), (x_name, y_name))
+        arrays = batch.stability_arrays_by_case(b, combos)
+        code = batch.status_codes(arrays["fs_slide"], arrays["fs_ot"], arrays["eccentricity"], b.B,
+                                  (fs_slide_min, fs_ot_min), e_max, arrays["q_max"], case_q_allow)
+        valid = (b.toe >= 0) & (b.heel > 0)
+        governing = [arrays["fs_slide"].min(axis=0), arrays["fs_ot"].min(axis=0), arrays["q_max"].max(axis=0)]
+        values[:, iy, ix] = np.where(valid, governing, np.nan)
+        state[iy, ix] = np.where(valid, np.all(code == 0, axis=0), 2)
+        evaluated[iy, ix] = known[iy, ix] = True
+
+    # Lattice spacings are powers of two, so each level halves the last.
+    step = 1 << max(int(coarse) - 1, 0).bit_length()
+    iy, ix = np.meshgrid(_lattice(ny, step), _lattice(nx, step), indexing="ij")
+    evaluate(iy.ravel(), ix.ravel())
+    while step > 1:
+        cell, step = step, step // 2
+        iy, ix = np.meshgrid(_lattice(ny, step), _lattice(nx, step), indexing="ij")
+        new = ~known[iy, ix]
+        iy, ix = iy[new], ix[new]
+        y0, y1, ty = _corners(iy, ny, cell)
+        x0, x1, tx = _corners(ix, nx, cell)
+        corners = [(y0, x0), (y0, x1), (y1, x0), (y1, x1)]
+        first = state[corners[0]]
+        mixed = np.zeros(iy.size, dtype=bool)
+        for c in corners[1:]:
+            mixed |= state[c] != first
+        evaluate(iy[mixed], ix[mixed])
+
+        same = ~mixed
+        iy, ix, ty, tx = iy[same], ix[same], ty[same], tx[same]
+        weights = [(1 - ty) * (1 - tx), (1 - ty) * tx, ty * (1 - tx), ty * tx]
+        values[:, iy, ix] = sum(w * values[:, a[same], b[same]] for w, (a, b) in zip(weights, corners))
+        state[iy, ix] = first[same]
+        known[iy, ix] = True
+
+    limits = (float(fs_slide_min.max()), float(fs_ot_min.max()))
+    return DesignSpace(x_name, y_name, x, y, *values, state == 1, evaluated, limits, float(case_q_allow.min()))
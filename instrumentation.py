@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+
+# Opt-in phase timers and counters.
+# Off unless WALL_PROFILE=1 is set or enable() is called for the whole
+# process, or begin_run(profile=True) for the calling thread until its
+# end_run(). When off, every hook is a constant-time no-op (a flag check or
+# an empty function call).
+#
+# Timings go to process-wide totals (for export) and, if the calling thread
+# has started one with begin_run(), to a per-run collector so the app can
+# show the breakdown of a single Streamlit rerun. Streamlit runs each
+# session's script in its own thread, so one session's diagnostics never
+# switch timing on for another.
+
+ENABLED = os.environ.get("WALL_PROFILE", "") not in ("", "0")
+
+_lock = threading.Lock()
+_timers: Dict[str, List[float]] = {}  # name -> [count, total_s, max_s]
+_counters: Dict[str, int] = {}
+class _Local(threading.local):
+    # Class defaults: reading an unset thread-local would raise and catch
+    # AttributeError inside every hook.
+    run = None
+    profile = False
+
+_local = _Local()
+
+def enable(flag: bool = True):
+    global ENABLED
+    ENABLED = flag
+
+def is_enabled() -> bool:
+    return ENABLED or _local.profile
+
+class RunStats:
+    # Timings and counters recorded by one thread between begin_run() and end_run().
+    def __init__(self):
+        self.timers: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    def rows(self) -> List[Dict]:
+        return [
+            {"phase": name, "calls": int(c), "total_ms": total * 1e3, "max_ms": mx * 1e3}
+            for name, (c, total, mx) in sorted(self.timers.items())
+        ]
+
+def begin_run(profile: bool = False) -> RunStats:
+    run = RunStats()
+    _local.run = run
+    _local.profile = profile
+    return run
+
+def end_run() -> Optional[RunStats]:
+    run = _local.run
+    _local.run = None
+    _local.profile = False
+    return run
+
+def _add(table, name, dt):
+    entry = table.get(name)
+    if entry is None:
+        table[name] = [1, dt, dt]
+    else:
+        entry[0] += 1
+        entry[1] += dt
+        if dt > entry[2]:
+            entry[2] = dt
+
+def record(name: str, seconds: float):
+    with _lock:
+        _add(_timers, name, seconds)
+    run = _local.run
+    if run is not None:
+        _add(run.timers, name, seconds)
+
+def count(name: str, n: int = 1):
+    if not is_enabled():
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+    run = _local.run
+    if run is not None:
+        run.counters[name] = run.counters.get(name, 0) + n
+
+# --- Hooks ---
+
+def _noop_lap(name: str):
+    pass
+
+def lap_timer(prefix: str):
+    # Returns lap(name): records the time since the previous lap (or since
+    # lap_timer was called) as "<prefix>.<name>". A no-op when disabled.
+    if not is_enabled():
+        return _noop_lap
+    last = [time.perf_counter()]
+    def lap(name: str):
+        now = time.perf_counter()
+        record(f"{prefix}.{name}", now - last[0])
+        last[0] = now
+    return lap
+
+@contextmanager
+def _timing(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+@contextmanager
+def _null():
+    yield
+
+def timer(name: str):
+    return _timing(name) if is_enabled() else _null()
+
+def timed(name: str):
+    # Decorator form of timer().
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+# --- Export ---
+
+def snapshot() -> Dict:
+    with _lock:
+        return {
+            "timers": {k: {"count": int(v[0]), "total_s": v[1], "max_s": v[2]} for k, v in _timers.items()},
+            "counters": dict(_counters),
+        }
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+def export_json() -> str:
+    # Structured log: one JSON object per line.
+    snap = snapshot()
+    ts = time.time()
+    lines = [json.dumps({"ts": ts, "type": "timer", "name": k, **v}) for k, v in sorted(snap["timers"].items())]
+    lines += [json.dumps({"ts": ts, "type": "counter", "name": k, "value": v}) for k, v in sorted(snap["counters"].items())]
+    return "\n".join(lines)
+
+def _metric_name(name: str) -> str:
+    return "wall_" + "".join(ch if ch.isalnum() else "_" for ch in name)
+
+def export_prometheus() -> str:
+    snap = snapshot()
+    out = []
+    for name, v in sorted(snap["timers"].items()):
+        m = _metric_name(name) + "_seconds"
+        out.append(f"# TYPE {m} summary")
+        out.append(f"{m}_count {v['count']}")
+        out.append(f"{m}_sum {v['total_s']:.9f}")
+        out.append(f"# TYPE {m}_max gauge")
+        out.append(f"{m}_max {v['max_s']:.9f}")
+    for name, v in sorted(snap["counters"].items()):
+        m = _metric_name(name) + "_total"
+        out.append(f"# TYPE {m} counter")
+        out.append(f"{m} {v}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,83 @@
+import importlib.util
+import os
+import types
+
+# Numba for the scalar path. The arithmetic has one implementation, the
+# plain-float phase functions of calculations (stability_vertical ...
+# stability_bearing, reinforcement_stem ... reinforcement_toe) and
+# stability_values / reinforcement_values, which run them in a row.
+# calculate_stability and calculate_reinforcement always call them through
+# the names below: the Python functions themselves or, where Numba is
+# installed and ENABLED, Numba's compilation of the very same functions.
+# Normally that is one call to the *_values kernel; with instrumentation
+# on, one call per phase so that each phase is timed. Numba is imported,
+# and the functions compiled, on the first design call rather than at
+# import, so `import calculations` stays cheap; cache=True keeps the
+# machine code on disk, so only the first process pays for compiling. Set
+# WALL_JIT=0 to keep the interpreted path.
+#
+# Numba compiles without fastmath, so every operation rounds as it does in
+# the interpreter, except x**2: compiled it is x*x (correctly rounded),
+# where the interpreter's pow() is occasionally an ulp off. Results agree
+# to ~1e-14 relative, statuses and bar choices exactly.
+
+AVAILABLE = importlib.util.find_spec("numba") is not None
+ENABLED = AVAILABLE and os.environ.get("WALL_JIT", "1") != "0"
+
+# The calculations functions bound here, and everything compiled with them.
+KERNELS = ("stability_values", "stability_vertical", "stability_uplift", "stability_horizontal",
+           "stability_bearing", "reinforcement_values", "reinforcement_stem", "reinforcement_heel",
+           "reinforcement_toe")
+_COMPILED = ("calculate_ka", "calculate_kp", "calculate_kae") + KERNELS
+_compiled = None
+
+def _compile(calc):
+    # Each function is copied over one namespace in which the others are
+    # compiled too, so compiled code calls compiled code; the module's
+    # Python functions stay as they are.
+    global _compiled
+    if _compiled is None:
+        import numba
+        ns = dict(vars(calc))
+        for name in _COMPILED:
+            f = ns[name]
+            ns[name] = numba.njit(cache=True)(types.FunctionType(f.__code__, ns, name, f.__defaults__))
+        _compiled = {name: ns[name] for name in KERNELS}
+    return _compiled
+
+def _bind():
+    import calculations as calc
+    globals().update(_compile(calc) if ENABLED else {name: getattr(calc, name) for name in KERNELS})
+
+def _first_call(name):
+    # Until the first call: bind, then forward.
+    def first(*args):
+        _bind()
+        return globals()[name](*args)
+    return first
+
+def _unbind():
+    globals().update({name: _first_call(name) for name in KERNELS})
+
+_unbind()
+
+def enable(flag: bool = True):
+    # Compiled kernels can only be enabled where Numba is installed.
+    global ENABLED
+    flag = bool(flag) and AVAILABLE
+    if flag != ENABLED:
+        ENABLED = flag
+        _unbind()
+
+def backend() -> str:
+    return "numba" if ENABLED else "python"
+
+def warm_up():
+    # Import Numba and compile now rather than on the first design call
+    # (the phase kernels compile along with the *_values ones).
+    _bind()
+    if ENABLED:
+        stability_values(6.0, 4.0, 1.0, 2.5, 0.5, 0.3, 0.5, 2.5, 0.4, 0.5, 0.5, 10.0, 0.0, 2.0, 9.81, 24.0, 30.0,
+                         18.0, 20.0, 0.5, 0.0, 15.0, True, 6.0, 6.0, 0.1, 0.0)
+        reinforcement_values(6.0, 0.5, 0.5, 2.5, 1.0, 2.5, 10.0, 24.0, 30.0, 18.0, 20.0, 460.0, 50.0, False, 50.0,
+                             1.4)
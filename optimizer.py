@@ -0,0 +1,246 @@
+import numpy as np
+from dataclasses import dataclass, replace
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import calculations as calc
+import batch
+
+# Geometry sizing on top of the batch engine.
+# Candidates are visited in order of increasing concrete volume, in chunks;
+# within a chunk each load case is only evaluated on the candidates that
+# survived the previous one. The first chunk holding a feasible candidate
+# therefore contains the grid optimum and the search stops there.
+
+# (min, max, step) for each searched dimension. B is not searched on its
+# own: it follows from toe + t_stem_bottom + heel. Wide enough for the app's
+# default 6 m wall under full-base uplift (a heel of ~12 m), at ~0.5M
+# candidates; narrow the ranges or refine one dimension with solve_dimension.
+SEARCH_RANGES = {
+    "toe": (0.0, 4.0, 0.25),
+    "heel": (1.0, 14.0, 0.25),
+    "t_base": (0.3, 1.5, 0.1),
+    "d_key": (0.0, 2.0, 0.25),
+    "s_cf": (2.0, 4.0, 0.5),
+}
+
+FS_SLIDE_MIN, FS_OT_MIN = calc.FS_LIMITS
+
+@dataclass
+class OptimizationResult:
+    inputs: calc.WallInputs
+    volume: float  # m3 of concrete per m run
+    results: Dict[str, calc.StabilityResult]
+    n_candidates: int
+    n_evaluated: int  # candidate x case evaluations actually run
+
+def _axis(lo: float, hi: float, step: float) -> np.ndarray:
+    n = int(round((hi - lo) / step)) + 1
+    return np.round(lo + step * np.arange(n), 6)
+
+def candidate_grid(base: calc.WallInputs, ranges: Dict[str, Tuple[float, float, float]] = None) -> batch.WallInputsBatch:
+    ranges = SEARCH_RANGES if ranges is None else ranges
+    names = list(ranges)
+    axes = [_axis(*ranges[n]) for n in names]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    columns = {n: m.reshape(-1) for n, m in zip(names, mesh)}
+
+    cand = batch.WallInputsBatch.from_inputs([base]).replace(**columns)
+    return cand.replace(B=cand.toe + cand.t_stem_bottom + cand.heel)
+
+def concrete_volume(cand: batch.WallInputsBatch) -> np.ndarray:
+    W_conc = batch.concrete_weight(cand)[0]
+    return W_conc / cand.gamma_c
+
+def feasible(res: batch.StabilityBatchResult, B, q_allow: float = np.inf, case=None) -> np.ndarray:
+    # Passes every check of its load case (res.case_name unless given): the
+    # case's FS limits and e_max, and the stricter of its q_allow and `q_allow`.
+    c = calc.combination(res.case_name if case is None else case)
+    return batch.status_codes(res.fs_slide, res.fs_ot, res.eccentricity, B, c.limits, c.e_max,
+                              res.q_max, min(c.q_allow, q_allow)) == 0
+
+def optimize_geometry(base: calc.WallInputs, q_allow: float = 300.0,
+                      ranges: Dict[str, Tuple[float, float, float]] = None,
+                      cases: Sequence[str] = ("LC-C", "LC-B", "LC-A"),
+                      chunk_size: int = 20000) -> Optional[OptimizationResult]:
+    # Minimum concrete section passing every case (its own FS, eccentricity
+    # and bearing limits) with q_max <= q_allow. Returns None if nothing in
+    # the ranges works.
+    cand = candidate_grid(base, ranges)
+    volume = concrete_volume(cand)
+    order = np.argsort(volume, kind="stable")
+
+    n_evaluated = 0
+    for start in range(0, order.size, chunk_size):
+        alive = order[start:start + chunk_size]
+        for case in cases:
+            sub = cand.take(alive)
+            res = batch.calculate_stability_batch(sub, case)
+            n_evaluated += alive.size
+            alive = alive[feasible(res, sub.B, q_allow, case)]
+            if alive.size == 0:
+                break
+        if alive.size:
+            # `order` is volume-sorted, so the first survivor is the lightest
+            best = cand.row(int(alive[0]))
+            return OptimizationResult(
+                inputs=best,
+                volume=float(volume[alive[0]]),
+                results={calc.combination(c).name: calc.calculate_stability(best, c) for c in cases},
+                n_candidates=order.size,
+                n_evaluated=n_evaluated,
+            )
+    return None
+
+
+# --- One-dimensional sizing solver ---
+# Smallest value of one free dimension that just meets a criterion in every
+# load case. The margin g(x) (>= 0 when satisfied, the worst case/check
+# governing) is only piecewise smooth: the min over cases and checks has
+# kinks, and q_max switches formula at |e| = B/6 (and jumps once the
+# resultant leaves the base). So the interval is first scanned on a coarse
+# grid in one batch call, the first sign change is taken as the bracket,
+# and Brent's method refines it. Brent falls back to bisection whenever an
+# interpolation step is poor, so kinks and jumps only cost a few extra steps.
+
+SOLVE_DIMENSIONS = ("B", "heel", "toe", "t_base", "d_key")
+CRITERIA = ("fs_slide", "fs_ot", "eccentricity", "bearing")
+
+@dataclass
+class SolveResult:
+    name: str
+    value: float
+    inputs: calc.WallInputs
+    margin: float       # governing margin at `value` (>= 0)
+    evaluations: int    # scalar design checks (all cases) in the Brent stage
+    grid_points: int    # batch-evaluated bracketing points
+
+def with_dimension(inp, name: str, x):
+    # Set one dimension, keeping B = toe + t_stem_bottom + heel: solving for B
+    # moves the heel, changing toe or heel moves B. Works on WallInputs and
+    # WallInputsBatch alike.
+    if name not in SOLVE_DIMENSIONS:
+        raise ValueError(f"Cannot solve for {name}; choose one of {', '.join(SOLVE_DIMENSIONS)}")
+    if name == "B":
+        values = {"B": x, "heel": x - inp.toe - inp.t_stem_bottom}
+    elif name in ("toe", "heel"):
+        values = {name: x, "B": x + inp.t_stem_bottom + (inp.heel if name == "toe" else inp.toe)}
+    else:
+        values = {name: x}
+    return inp.replace(**values) if isinstance(inp, batch.WallInputsBatch) else replace(inp, **values)
+
+def margin(res, B, criteria: Sequence[str] = ("fs_slide",), q_allow: float = 300.0,
+           fs_slide_min: float = FS_SLIDE_MIN, fs_ot_min: float = FS_OT_MIN, e_max: float = 1 / 6):
+    # Relative margin of one result (StabilityResult or StabilityBatchResult):
+    # the smallest of the selected checks, each scaled so 0 is the limit.
+    # The limits may be arrays broadcasting against the results.
+    checks = {
+        "fs_slide": lambda: res.fs_slide / fs_slide_min - 1.0,
+        "fs_ot": lambda: res.fs_ot / fs_ot_min - 1.0,
+        "eccentricity": lambda: 1.0 - np.abs(res.eccentricity) / (e_max * B),
+        "bearing": lambda: 1.0 - res.q_max / q_allow,
+    }
+    unknown = [c for c in criteria if c not in checks]
+    if unknown:
+        raise ValueError(f"Unknown criterion: {', '.join(unknown)}")
+    return np.minimum.reduce([np.asarray(checks[c](), dtype=float) for c in criteria])
+
+def default_bounds(inp: calc.WallInputs, name: str) -> Tuple[float, float]:
+    if name == "B":
+        lo, hi, _ = SEARCH_RANGES["heel"]
+        return inp.toe + inp.t_stem_bottom + lo, inp.toe + inp.t_stem_bottom + hi
+    lo, hi, _ = SEARCH_RANGES[name]
+    return lo, hi
+
+def brent(f: Callable[[float], float], a: float, b: float, fa: float, fb: float,
+          xtol: float = 1e-4, maxiter: int = 100) -> Tuple[float, float, float, float, int]:
+    # Brent's method on a bracket with f(a) < 0 <= f(b). Returns the final
+    # bracket (lo, f_lo, hi, f_hi) with f_lo < 0 <= f_hi and the number of
+    # evaluations; hi - lo <= 2 * xtol on convergence.
+    if not (fa < 0 <= fb):
+        raise ValueError("brent needs f(a) < 0 <= f(b)")
+    lo, flo, hi, fhi = a, fa, b, fb
+    # Classic formulation: b is the best estimate, c the opposite end.
+    c, fc = a, fa
+    d = e = b - a
+    n = 0
+    for n in range(1, maxiter + 1):
+        if abs(fc) < abs(fb):
+            a, fa, b, fb, c, fc = b, fb, c, fc, b, fb
+        tol = 2 * np.finfo(float).eps * abs(b) + 0.5 * xtol
+        m = 0.5 * (c - b)
+        if abs(m) <= tol or fb == 0:
+            break
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            # Inverse quadratic (or secant) step
+            s = fb / fa
+            if a == c:
+                p, q = 2 * m * s, 1 - s
+            else:
+                q, r = fa / fc, fb / fc
+                p = s * (2 * m * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * m * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+        a, fa = b, fb
+        b = b + (d if abs(d) > tol else (tol if m > 0 else -tol))
+        fb = f(b)
+        if (fb >= 0) == (fc >= 0):
+            c, fc = a, fa
+            d = e = b - a
+        if fb >= 0 and b < hi:
+            hi, fhi = b, fb
+        elif fb < 0 and b > lo:
+            lo, flo = b, fb
+    return lo, flo, hi, fhi, n
+
+def _case_limits(cases: Sequence[str], q_allow: float) -> list:
+    # margin() keyword limits of each case, the bearing one capped at q_allow.
+    return [dict(fs_slide_min=c.fs_slide_min, fs_ot_min=c.fs_ot_min, e_max=c.e_max,
+                 q_allow=min(c.q_allow, q_allow)) for c in map(calc.combination, cases)]
+
+def solve_dimension(base: calc.WallInputs, name: str, criteria: Sequence[str] = ("fs_slide",),
+                    bounds: Tuple[float, float] = None, q_allow: float = 300.0,
+                    cases: Sequence[str] = calc.LOAD_CASES, xtol: float = 1e-3,
+                    grid: int = 16) -> Optional[SolveResult]:
+    # Smallest `name` in `bounds` whose margin is >= 0 in every case, to
+    # within xtol. None if the criterion fails over the whole interval.
+    lo, hi = default_bounds(base, name) if bounds is None else bounds
+
+    # 1. Bracket: coarse grid over [lo, hi], every case, one kernel call.
+    xs = np.linspace(lo, hi, grid + 1)
+    cand = with_dimension(batch.WallInputsBatch.from_inputs([base]), name, xs)
+    arrays = batch.stability_arrays_by_case(cand, cases)
+    limits = _case_limits(cases, q_allow)
+    by_case = {k: np.array([lim[k] for lim in limits])[:, None] for k in limits[0]}
+    g = np.min(margin(SimpleNamespace(**arrays), cand.B, criteria, **by_case), axis=0)
+    ok = np.flatnonzero(g >= 0)
+    if ok.size == 0:
+        return None
+    k = int(ok[0])
+
+    def f(x):
+        inp = with_dimension(base, name, x)
+        return float(min(margin(calc.calculate_stability(inp, c), inp.B, criteria, **lim)
+                         for c, lim in zip(cases, limits)))
+
+    if k == 0:
+        x, gx, n = float(xs[0]), float(g[0]), 0
+    else:
+        # Re-evaluate the bracket ends with the scalar path so both stages agree.
+        a, b = float(xs[k - 1]), float(xs[k])
+        fa, fb = f(a), f(b)
+        n = 2
+        if fa < 0 <= fb:
+            _, _, x, gx, steps = brent(f, a, b, fa, fb, xtol / 2)
+            n += steps
+        else:
+            x, gx = (a, fa) if fa >= 0 else (b, fb)
+    return SolveResult(name, x, with_dimension(base, name, x), gx, n, xs.size)
@@ -0,0 +1,130 @@
+import csv
+import json
+import sys
+from dataclasses import fields, replace
+from typing import Dict, Iterator, List, Optional, Sequence, TextIO, Union
+
+import calculations as calc
+
+# Reading WallInputs records from CSV / JSONL and flattening results back
+# into plain dicts. Shared by the chainage pipeline and the batch runner.
+
+_FIELD_TYPES = {f.name: f.type for f in fields(calc.WallInputs)}
+
+def _open(source: Union[str, TextIO]):
+    if source == "-":
+        return sys.stdin, False
+    if isinstance(source, str):
+        return open(source, newline=""), True
+    return source, False
+
+def _guess_format(source) -> str:
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    return "csv" if str(name).lower().endswith(".csv") else "jsonl"
+
+def read_records(source: Union[str, TextIO], fmt: Optional[str] = None) -> Iterator[Dict]:
+    # Lazily yield one dict per record. `source` is a path, an open text
+    # file, or "-" for stdin. Format defaults to the file extension
+    # (.csv, anything else is read as JSON lines).
+    fmt = fmt or _guess_format(source)
+    f, owned = _open(source)
+    try:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield {k.strip(): v for k, v in row.items() if k and v not in (None, "")}
+        elif fmt == "jsonl":
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unknown record format: {fmt}")
+    finally:
+        if owned:
+            f.close()
+
+def _to_bool(v) -> bool:
+    if isinstance(v, str):
+        return v.strip().lower() in ("1", "true", "yes", "y")
+    if not isinstance(v, (bool, int, float)):
+        raise TypeError(v)
+    return bool(v)
+
+def _to_float(v) -> float:
+    if isinstance(v, bool) or not isinstance(v, (int, float, str)):
+        raise TypeError(v)
+    return float(v)
+
+def inputs_from_record(record: Dict, base: Optional[calc.WallInputs] = None) -> calc.WallInputs:
+    # Build a WallInputs from a record; fields not in the record come from
+    # `base` (or the dataclass defaults). Unknown keys are ignored. Anything
+    # that is not a record of numbers / booleans raises ValueError, which
+    # the batch runner turns into an error row.
+    if not isinstance(record, dict):
+        raise ValueError(f"Expected a WallInputs object, got {type(record).__name__}")
+    values = {}
+    for name, typ in _FIELD_TYPES.items():
+        if name not in record:
+            continue
+        v = record[name]
+        try:
+            values[name] = _to_bool(v) if typ in (bool, "bool") else _to_float(v)
+        except (TypeError, ValueError):
+            raise ValueError(f"Bad value for {name}: {v!r}") from None
+    if base is not None:
+        return replace(base, **values)
+    try:
+        return calc.WallInputs(**values)
+    except TypeError as exc:
+        raise ValueError(f"Incomplete WallInputs record: {exc}") from None
+
+def design_fields(cases: Sequence[str] = calc.LOAD_CASES) -> List[str]:
+    # Keys of design_record, in order, for results of `cases`.
+    out = []
+    for case in cases:
+        out += [f"{case}_{k}" for k in ("fs_slide", "fs_ot", "e", "q_max", "q_min", "status")]
+    for member in ("Stem", "Heel", "Toe"):
+        key = member.lower()
+        out += [f"{key}_M_uls", f"{key}_As_req", f"{key}_bar"]
+    out.append("all_pass")
+    return out
+
+def design_record(inp: calc.WallInputs, stability: Dict[str, calc.StabilityResult], reinf: Dict) -> Dict:
+    # Flat, JSON-friendly summary of one design.
+    out = {}
+    for case, res in stability.items():
+        out[f"{case}_fs_slide"] = res.fs_slide
+        out[f"{case}_fs_ot"] = res.fs_ot
+        out[f"{case}_e"] = res.eccentricity
+        out[f"{case}_q_max"] = res.q_max
+        out[f"{case}_q_min"] = res.q_min
+        out[f"{case}_status"] = res.status
+    for member in ("Stem", "Heel", "Toe"):
+        key = member.lower()
+        out[f"{key}_M_uls"] = reinf[member]["M_uls"]
+        out[f"{key}_As_req"] = reinf[member]["As_req"]
+        out[f"{key}_bar"] = reinf[member]["Bar"]
+    out["all_pass"] = all(r.status == "PASS" for r in stability.values())
+    return out
+
+class RecordWriter:
+    # Incremental CSV / JSONL writer. The CSV header is `fieldnames` when
+    # given (keys outside it are dropped, missing ones left empty), else the
+    # keys of the first record: pass fieldnames whenever records can differ
+    # in shape, e.g. error rows.
+    def __init__(self, out: TextIO, fmt: str = "jsonl", fieldnames: Optional[Sequence[str]] = None):
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"Unknown record format: {fmt}")
+        self.out = out
+        self.fmt = fmt
+        self.fieldnames = None if fieldnames is None else list(fieldnames)
+        self._csv = None
+
+    def write(self, record: Dict):
+        if self.fmt == "jsonl":
+            self.out.write(json.dumps(record) + "\n")
+            return
+        if self._csv is None:
+            self._csv = csv.DictWriter(self.out, fieldnames=self.fieldnames or list(record), extrasaction="ignore")
+            self._csv.writeheader()
+        self._csv.writerow(record)
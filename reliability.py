@@ -0,0 +1,160 @@
+import math
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import calculations as calc
+import batch
+
+# Monte Carlo probability of failure for the stability checks.
+# Samples are drawn and evaluated chunk by chunk (optionally in worker
+# processes), and only failure counts come back, so memory stays flat
+# however many samples are requested.
+
+RANDOM_VARIABLES = ("phi_soil", "gamma_soil", "gamma_sat", "mu_rock", "surcharge")
+
+# Coefficient of variation for each variable (mean is the WallInputs value).
+DEFAULT_COV = {
+    "phi_soil": 0.10,
+    "gamma_soil": 0.05,
+    "gamma_sat": 0.05,
+    "mu_rock": 0.15,
+    "surcharge": 0.30,
+}
+
+# Correlation between the underlying normals of the lognormal variables.
+DEFAULT_CORRELATION = {
+    ("gamma_soil", "gamma_sat"): 0.8,
+    ("phi_soil", "gamma_soil"): 0.3,
+}
+
+@dataclass
+class ReliabilityProgress:
+    n_samples: int
+    n_failures: int
+    pf: float
+    ci_low: float
+    ci_high: float
+    converged: bool
+
+def correlation_matrix(corr: Dict[Tuple[str, str], float] = None) -> np.ndarray:
+    corr = DEFAULT_CORRELATION if corr is None else corr
+    idx = {name: i for i, name in enumerate(RANDOM_VARIABLES)}
+    m = np.eye(len(RANDOM_VARIABLES))
+    for (a, b), rho in corr.items():
+        m[idx[a], idx[b]] = m[idx[b], idx[a]] = rho
+    return m
+
+def sample_variables(inp: calc.WallInputs, n: int, rng: np.random.Generator,
+                     cov: Dict[str, float] = None, corr: np.ndarray = None) -> Dict[str, np.ndarray]:
+    # Correlated lognormal samples. Variables with a zero mean or zero COV
+    # are held at their deterministic value.
+    cov = DEFAULT_COV if cov is None else cov
+    corr = correlation_matrix() if corr is None else corr
+
+    L = np.linalg.cholesky(corr)
+    z = rng.standard_normal((n, len(RANDOM_VARIABLES))) @ L.T
+
+    samples = {}
+    for i, name in enumerate(RANDOM_VARIABLES):
+        mean = getattr(inp, name)
+        c = cov.get(name, 0.0)
+        if mean <= 0 or c <= 0:
+            samples[name] = np.full(n, float(mean))
+            continue
+        sigma_ln = math.sqrt(math.log(1.0 + c**2))
+        mu_ln = math.log(mean) - 0.5 * sigma_ln**2
+        samples[name] = np.exp(mu_ln + sigma_ln * z[:, i])
+    return samples
+
+def count_failures(inp: calc.WallInputs, samples: Dict[str, np.ndarray],
+                   cases: Sequence[str] = calc.LOAD_CASES,
+                   fs_slide_limit: float = 1.0, fs_ot_limit: float = 1.0) -> int:
+    # A sample fails if any case drops below a limit-state FS.
+    b = batch.WallInputsBatch.from_inputs([inp]).replace(**samples)
+    arrays = batch.stability_arrays_by_case(b, cases)
+    failed = (arrays["fs_slide"] < fs_slide_limit) | (arrays["fs_ot"] < fs_ot_limit)
+    return int(failed.any(axis=0).sum())
+
+def _run_chunk(args) -> Tuple[int, int]:
+    key, n, seed, cov, corr, cases, fs_slide_limit, fs_ot_limit = args
+    inp = calc.WallInputs(*key)
+    rng = np.random.default_rng(seed)
+    samples = sample_variables(inp, n, rng, cov, corr)
+    return n, count_failures(inp, samples, cases, fs_slide_limit, fs_ot_limit)
+
+def wilson_interval(failures: int, n: int, confidence: float = 0.95) -> Tuple[float, float]:
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2.0)
+    p = failures / n
+    denom = 1 + z**2 / n
+    centre = (p + z**2 / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+def run_monte_carlo(inp: calc.WallInputs, max_samples: int = 10**7, chunk_size: int = 100_000,
+                    workers: Optional[int] = None, seed: Optional[int] = None,
+                    cov: Dict[str, float] = None, corr: Dict[Tuple[str, str], float] = None,
+                    cases: Sequence[str] = calc.LOAD_CASES,
+                    fs_slide_limit: float = 1.0, fs_ot_limit: float = 1.0,
+                    rel_tol: float = 0.05, confidence: float = 0.95) -> Iterator[ReliabilityProgress]:
+    # Yields a running Pf estimate after every chunk and stops once the
+    # confidence interval half-width is within rel_tol of Pf.
+    # workers=0 runs in-process; None uses one process per CPU.
+    key = calc.inputs_key(inp)
+    corr_m = correlation_matrix(corr)
+    n_chunks = -(-max_samples // chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+
+    def chunk_args(i):
+        n = min(chunk_size, max_samples - i * chunk_size)
+        return (key, n, seeds[i], cov, corr_m, tuple(cases), fs_slide_limit, fs_ot_limit)
+
+    n_total = 0
+    n_failed = 0
+
+    def progress(n, failed):
+        nonlocal n_total, n_failed
+        n_total += n
+        n_failed += failed
+        lo, hi = wilson_interval(n_failed, n_total, confidence)
+        pf = n_failed / n_total
+        converged = n_failed > 0 and (hi - lo) / 2.0 <= rel_tol * pf
+        return ReliabilityProgress(n_total, n_failed, pf, lo, hi, converged)
+
+    if workers == 0:
+        for i in range(n_chunks):
+            p = progress(*_run_chunk(chunk_args(i)))
+            yield p
+            if p.converged:
+                return
+        return
+
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # Keep a bounded number of chunks in flight and consume them in
+        # submission order, so results are reproducible for a given seed.
+        in_flight = 2 * workers
+        pending = []
+        next_chunk = 0
+        while next_chunk < n_chunks or pending:
+            while next_chunk < n_chunks and len(pending) < in_flight:
+                pending.append(executor.submit(_run_chunk, chunk_args(next_chunk)))
+                next_chunk += 1
+            p = progress(*pending.pop(0).result())
+            yield p
+            if p.converged:
+                return
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def estimate_pf(inp: calc.WallInputs, **kwargs) -> ReliabilityProgress:
+    p = None
+    for p in run_monte_carlo(inp, **kwargs):
+        pass
+    return p
@@ -1,6 +1,12 @@
 from fpdf import FPDF
+import io
+import os
 import tempfile
+import zipfile
+from multiprocessing import Pool
+from typing import Iterable, Tuple
 import calculations as calc
+import instrumentation as instr
 
 class PDFReport(FPDF):
     def header(self):
@@ -19,7 +25,7 @@ class PDFReport(FPDF):
         self.multi_cell(0, 5, body)
         self.ln()
 
-def generate_pdf_report(inputs, stability_results_map: dict, reinf_res):
+def build_pdf_report(inputs, stability_results_map: dict, reinf_res) -> PDFReport:
     pdf = PDFReport()
     pdf.add_page()
     
@@ -62,7 +68,8 @@ def generate_pdf_report(inputs, stability_results_map: dict, reinf_res):
         pdf.ln()
     
     pdf.ln(5)
-    pdf.chapter_body("Note: Sliding FOS Target >= 1.5, OT FOS Target >= 2.0. Eccentricity Check B/6.")
+    fs_slide_min, fs_ot_min = calc.FS_LIMITS
+    pdf.chapter_body(f"Note: Sliding FOS Target >= {fs_slide_min}, OT FOS Target >= {fs_ot_min}. Eccentricity Check B/6.")
     
     res = stability_results_map.get("LC-B", list(stability_results_map.values())[0])
     pdf.chapter_title(f"3. Detailed Breakdown ({res.case_name})")
@@ -98,7 +105,57 @@ def generate_pdf_report(inputs, stability_results_map: dict, reinf_res):
         f"  Prov: {toe['Bar']}\n"
     )
     pdf.chapter_body(reinf_text)
+    return pdf
+
+def render_pdf_report(inputs, stability_results_map: dict, reinf_res) -> bytes:
+    # Report rendered straight to memory (no temp file).
+    lap = instr.lap_timer("pdf")
+    pdf = build_pdf_report(inputs, stability_results_map, reinf_res)
+    lap("build")
+    out = pdf.output(dest='S')
+    lap("output")
+    if isinstance(out, str):
+        # PyFPDF 1.7 returns a latin-1 str, fpdf2 returns bytes
+        out = out.encode('latin-1')
+    return bytes(out)
 
-    outfile = tempfile.mktemp(suffix=".pdf")
-    pdf.output(outfile, 'F')
+def generate_pdf_report(inputs, stability_results_map: dict, reinf_res):
+    # Writes the report to a temp file and returns its path.
+    fd, outfile = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(render_pdf_report(inputs, stability_results_map, reinf_res))
     return outfile
+
+# --- Bulk Reports ---
+
+def _init_report_worker():
+    # One-off per worker: import fpdf and load the core font metrics by
+    # rendering a throwaway page, so each report only pays for its own content.
+    pdf = PDFReport()
+    pdf.add_page()
+    pdf.chapter_title("warm-up")
+    pdf.chapter_body("warm-up")
+    pdf.output(dest='S')
+
+def _render_design(item: Tuple[str, calc.WallInputs]) -> Tuple[str, bytes]:
+    name, inputs = item
+    results = {c: calc.calculate_stability(inputs, c) for c in calc.LOAD_CASES}
+    reinf = calc.calculate_reinforcement(inputs, res_B=results["LC-B"])
+    return name, render_pdf_report(inputs, results, reinf)
+
+def generate_reports_archive(designs: Iterable[Tuple[str, calc.WallInputs]], workers: int = None,
+                             chunksize: int = 8) -> bytes:
+    # Zip of one PDF per (name, inputs) pair, rendered in worker processes.
+    # workers=0 renders in this process.
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        if workers == 0:
+            _init_report_worker()
+            for item in designs:
+                name, data = _render_design(item)
+                zf.writestr(f"{name}.pdf", data)
+        else:
+            with Pool(workers, initializer=_init_report_worker) as pool:
+                for name, data in pool.imap(_render_design, designs, chunksize):
+                    zf.writestr(f"{name}.pdf", data)
+    return buf.getvalue()
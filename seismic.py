@@ -0,0 +1,101 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Tuple
+
+import calculations as calc
+import batch
+
+# Yield (critical) acceleration of the pseudo-static seismic case: the kh at
+# which FS sliding and FS overturning each fall to their limit, for every
+# design of a batch at once. kv follows kh at a fixed ratio.
+#
+# Each (design, check) pair is one root of limit / FS - 1, which rises with
+# kh and is close to linear in it. The kernel's kh-independent stage
+# (batch.stability_terms) runs once; a coarse kh grid then brackets every
+# root and Anderson-Bjorck regula falsi steps all unconverged pairs together,
+# each step repeating only the seismic / FS stage (batch.stability_from_terms)
+# on their rows. Converged pairs drop out, so the extra steps a few curves
+# need (the M-O coefficient has a vertical tangent where theta reaches phi)
+# only cost their own rows.
+
+KH_MAX = 1.0
+BRACKET_GRID = (0.0, 0.25, 1.0)  # x kh_max
+XTOL = 1e-6
+FTOL = 1e-9  # on limit / FS - 1
+
+@dataclass
+class YieldAcceleration:
+    # 0 where the limit is already missed at kh = 0, inf where it is not
+    # reached by kh_max.
+    kh_slide: np.ndarray
+    kh_ot: np.ndarray
+    evaluations: float  # design checks per design
+
+def yield_acceleration(b: batch.WallInputsBatch, limits: Tuple[float, float] = calc.SEISMIC_FS_LIMITS,
+                       kv_ratio: float = 0.0, case: str = calc.SEISMIC_CASE, kh_max: float = KH_MAX,
+                       xtol: float = XTOL, maxiter: int = 50) -> YieldAcceleration:
+    n = len(b)
+    b = b.take(slice(None))  # flat columns
+    terms = batch.stability_terms(b, *calc.water_levels(case, b.H))
+    limits = np.asarray(limits, dtype=float)
+
+    def g(design, kh, check):
+        # limit / FS - 1 of each (design, check) pair at its own kh
+        arrays = batch.stability_from_terms({k: v[design] for k, v in terms.items()}, kh, kv_ratio * kh)
+        fs = np.where(check == 0, arrays["fs_slide"], arrays["fs_ot"])
+        return limits[check] / fs - 1
+
+    # Every check of every design on a coarse kh grid in one call; each pair
+    # is then bracketed by the first grid interval where it crosses the limit.
+    grid = kh_max * np.asarray(BRACKET_GRID, dtype=float)[:, None]
+    arrays = batch.stability_from_terms(terms, grid, kv_ratio * grid)
+    g_grid = limits[:, None, None] / np.stack([arrays["fs_slide"], arrays["fs_ot"]]) - 1
+    # Flat pairs: check 0 (sliding) for every design, then check 1 (overturning).
+    g_grid = g_grid.transpose(0, 2, 1).reshape(2 * n, grid.size)
+    evaluations = float(grid.size)
+
+    crossed = g_grid >= 0
+    failed_static = crossed[:, 0]
+    bracketed = ~failed_static & crossed[:, -1]
+    kh = np.where(failed_static, 0.0, np.inf)
+    active = np.flatnonzero(bracketed)
+    design, check = active % n, active // n
+    j = np.argmax(crossed[active], axis=1)
+    lo, hi = grid[j - 1, 0], grid[j, 0]
+    g_lo, g_hi = g_grid[active, j - 1], g_grid[active, j]
+    x = 0.5 * (lo + hi)
+    side = np.zeros(active.size, dtype=int)  # end replaced last step: +1 lo, -1 hi
+    repeats = np.zeros(active.size, dtype=int)  # times in a row that end was replaced
+
+    for _ in range(maxiter):
+        if not active.size:
+            break
+        # Regula falsi, or bisection where one end has stuck for six steps
+        # (near theta = phi the M-O coefficient has a vertical tangent).
+        x = np.where(repeats >= 6, 0.5 * (lo + hi), hi - g_hi * (hi - lo) / (g_hi - g_lo))
+        gx = g(design, x, check)
+        evaluations += active.size / n
+
+        # Anderson-Bjorck: scale down the value at an end kept twice running.
+        up = gx < 0  # root above x
+        with np.errstate(divide="ignore", invalid="ignore"):
+            m = 1 - gx / np.where(up, g_lo, g_hi)
+        m = np.where(m > 0, m, 0.5)
+        g_hi = np.where(up & (side == 1), m * g_hi, g_hi)
+        g_lo = np.where(~up & (side == -1), m * g_lo, g_lo)
+        lo, g_lo = np.where(up, x, lo), np.where(up, gx, g_lo)
+        hi, g_hi = np.where(up, hi, x), np.where(up, g_hi, gx)
+        new_side = np.where(up, 1, -1)
+        repeats = np.where(new_side == side, repeats + 1, 1)
+        side = new_side
+
+        done = (np.abs(gx) <= FTOL) | (hi - lo <= xtol)
+        kh[active[done]] = x[done]
+        keep = ~done
+        active, design, check = active[keep], design[keep], check[keep]
+        lo, hi, g_lo, g_hi, x = lo[keep], hi[keep], g_lo[keep], g_hi[keep], x[keep]
+        side, repeats = side[keep], repeats[keep]
+
+    kh[active] = x  # not converged within maxiter: best estimate
+    kh = kh.reshape(2, n)
+    return YieldAcceleration(kh[0], kh[1], evaluations)
@@ -0,0 +1,116 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import calculations as calc
+import batch
+
+# Sensitivity of the stability results to every numeric WallInputs field.
+# All perturbed designs (two per field) go through the batch engine in one
+# call for every load case, and the derivatives are central differences
+# (forward differences for a field at zero, since the inputs are physically
+# non-negative and several terms switch on at zero, e.g. the shear key).
+#
+# With linked geometry (default), B stays equal to toe + t_stem_bottom + heel:
+# moving the toe, heel or stem moves B, and moving B moves the heel.
+
+NUMERIC_FIELDS = tuple(n for n in batch.FIELD_NAMES if n not in batch.BOOL_FIELDS)
+OUTPUTS = ("fs_slide", "fs_ot", "q_max", "eccentricity")
+
+# The FS outputs govern at their minimum over cases, the others at their maximum.
+GOVERNS_AT_MIN = ("fs_slide", "fs_ot")
+
+REL_STEP = 1e-4
+
+def governing_index(output: str, values: np.ndarray) -> int:
+    # Index of the governing case among per-case values of one output.
+    if output == "eccentricity":
+        values = np.abs(values)
+    return int(np.argmin(values) if output in GOVERNS_AT_MIN else np.argmax(values))
+
+@dataclass
+class Sensitivity:
+    fields: Tuple[str, ...]
+    cases: Tuple[str, ...]
+    values: np.ndarray               # input value per field
+    base: Dict[str, np.ndarray]      # output -> (n_cases,)
+    gradient: Dict[str, np.ndarray]  # output -> (n_cases, n_fields), d output / d field
+
+    def governing_case(self, output: str) -> str:
+        return self.cases[governing_index(output, self.base[output])]
+
+    def of(self, output: str, case: str = None) -> Dict[str, float]:
+        # {field: derivative} for one output, governing case by default.
+        case = self.governing_case(output) if case is None else case
+        row = self.gradient[output][self.cases.index(case)]
+        return dict(zip(self.fields, row.tolist()))
+
+def _perturbed(inp: calc.WallInputs, fields: Sequence[str], x: np.ndarray, linked: bool) -> batch.WallInputsBatch:
+    # One design per entry of x: design k has fields[k] set to x[k] (and B or
+    # heel adjusted when linked), everything else at the input value.
+    n = len(fields)
+    cols = {name: np.full(x.shape, float(getattr(inp, name))) for name in NUMERIC_FIELDS}
+    k = np.arange(x.size) % n
+    for j, name in enumerate(fields):
+        rows = k == j
+        cols[name][rows] = x[rows]
+    if linked:
+        moves_B = np.isin(np.array(fields)[k], ("toe", "heel", "t_stem_bottom"))
+        cols["B"] = np.where(moves_B, cols["toe"] + cols["t_stem_bottom"] + cols["heel"], cols["B"])
+        moves_heel = np.array(fields)[k] == "B"
+        cols["heel"] = np.where(moves_heel, cols["B"] - cols["toe"] - cols["t_stem_bottom"], cols["heel"])
+    for name in batch.BOOL_FIELDS:
+        cols[name] = getattr(inp, name)
+    return batch.WallInputsBatch(**cols)
+
+def sensitivities(inp: calc.WallInputs, fields: Sequence[str] = NUMERIC_FIELDS,
+                  cases: Sequence[str] = calc.LOAD_CASES, outputs: Sequence[str] = OUTPUTS,
+                  rel_step: float = REL_STEP, linked: bool = True) -> Sensitivity:
+    fields = tuple(fields)
+    x0 = np.array([float(getattr(inp, f)) for f in fields])
+    h = rel_step * np.maximum(np.abs(x0), 1e-2)
+    lo = np.where(x0 - h < 0, x0, x0 - h)
+    hi = x0 + h
+
+    b = _perturbed(inp, fields, np.concatenate([lo, hi]), linked)
+    arrays = batch.stability_arrays_by_case(b, cases)
+    base = batch.stability_arrays_by_case(batch.WallInputsBatch.from_inputs([inp]), cases)
+
+    n = len(fields)
+    gradient = {o: (arrays[o][:, n:] - arrays[o][:, :n]) / (hi - lo) for o in outputs}
+    return Sensitivity(fields, tuple(cases), x0, {o: base[o][:, 0] for o in outputs}, gradient)
+
+def gradient(inp: calc.WallInputs, output: str = "fs_slide", case: str = None,
+             fields: Sequence[str] = NUMERIC_FIELDS, **kwargs) -> np.ndarray:
+    # Gradient vector of one output (governing case by default), for optimisers.
+    sens = sensitivities(inp, fields, outputs=(output,), **kwargs)
+    case = sens.governing_case(output) if case is None else case
+    return sens.gradient[output][sens.cases.index(case)]
+
+@dataclass
+class TornadoBar:
+    field: str
+    low: float   # output with the field at (1 - rel) x
+    high: float  # output with the field at (1 + rel) x
+
+    @property
+    def swing(self) -> float:
+        return abs(self.high - self.low)
+
+def tornado(inp: calc.WallInputs, output: str = "fs_slide", case: str = None, rel: float = 0.10,
+            fields: Sequence[str] = NUMERIC_FIELDS, linked: bool = True, top: int = 12) -> Tuple[str, float, List[TornadoBar]]:
+    # Output with each field moved -rel / +rel (one batch call), largest
+    # swing first. Fields at zero have no relative swing and are left out.
+    fields = tuple(f for f in fields if getattr(inp, f) != 0)
+    base = batch.stability_arrays_by_case(batch.WallInputsBatch.from_inputs([inp]))[output][:, 0]
+    i = governing_index(output, base) if case is None else calc.LOAD_CASES.index(case)
+    case = calc.LOAD_CASES[i]
+
+    x0 = np.array([float(getattr(inp, f)) for f in fields])
+    b = _perturbed(inp, fields, np.concatenate([x0 * (1 - rel), x0 * (1 + rel)]), linked)
+    y = batch.stability_arrays_by_case(b, (case,))[output][0]
+
+    n = len(fields)
+    bars = [TornadoBar(f, float(y[j]), float(y[n + j])) for j, f in enumerate(fields)]
+    bars.sort(key=lambda t: t.swing, reverse=True)
+    return case, float(base[i]), bars[:top]
@@ -0,0 +1,403 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import calculations as calc
+import batch
+import combinations
+import instrumentation as instr
+import records
+
+# Local HTTP/JSON design service:
+#   python service.py --port 8765 [--combinations table.csv] [--base base.json]
+#
+#   POST /design   a WallInputs record (JSON object) or a list of them;
+#                  returns stability per load case and reinforcement for each
+#   GET  /health   liveness, queue depth and totals (JSON)
+#   GET  /metrics  request / batch counters and latencies (Prometheus text,
+#                  plus the instrumentation timers when profiling is on)
+#
+# Designs from concurrent requests are gathered into micro-batches: the
+# oldest waiting design opens a window of `window` seconds (cut short at
+# max_batch designs), then the whole batch goes through the batch engine in
+# one call on a worker thread while the event loop keeps reading requests.
+# Designs that queue up during a batch are therefore already past their
+# window and go straight into the next one.
+#
+# Plain asyncio streams speaking HTTP/1.1 with keep-alive (no chunked bodies).
+# Binds to localhost by default: it is meant for tools on the same machine.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+WINDOW = 0.002   # s
+MAX_BATCH = 2048
+MAX_BODY = 16 * 2**20  # bytes
+
+STABILITY_FIELDS = batch.RESULT_FIELDS + ("status",)
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+def design_batch(inputs: Sequence[calc.WallInputs], cases: Sequence = calc.LOAD_CASES,
+                 criterion: str = "weight", max_layers: int = 2) -> List[Dict]:
+    # JSON-ready design of every input through the batch engine: stability
+    # for every case (LC-B is added for the toe if missing) and reinforcement.
+    b = batch.WallInputsBatch.from_inputs(inputs)
+    names = [calc.combination(c).name for c in cases]
+    run = tuple(cases) if "LC-B" in names else tuple(cases) + ("LC-B",)
+    results = batch.calculate_stability_all(b, run)
+    columns = {name: [getattr(results[name], f).reshape(-1).tolist() for f in STABILITY_FIELDS] for name in names}
+    reinf = batch.reinforcement_rows(
+        batch.reinforcement_arrays(b, results["LC-B"].q_max, criterion, max_layers), max_layers)
+
+    out = []
+    for i, members in enumerate(reinf):
+        stability = {name: dict(zip(STABILITY_FIELDS, (col[i] for col in cols))) for name, cols in columns.items()}
+        out.append({
+            "stability": stability,
+            "reinforcement": {
+                m: {"M_uls": r["M_uls"], "As_req": r["As_req"], "Bar": r["Bar"],
+                    "diameter": r["Arrangement"].diameter, "spacing": r["Arrangement"].spacing,
+                    "layers": r["Arrangement"].layers, "area": r["Arrangement"].area}
+                for m, r in members.items()
+            },
+            "all_pass": all(s["status"] == "PASS" for s in stability.values()),
+        })
+    return out
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, str, Dict[str, str], bytes]]:
+    # (method, path, version, headers, body), or None once the client is done.
+    # The head is read in one go up to its blank line.
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if exc.partial.strip():
+            raise _HTTPError(400, "Incomplete request head") from None
+        return None
+    except asyncio.LimitOverrunError:
+        raise _HTTPError(400, "Request head too large") from None
+    request_line, *lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, version = request_line.split()
+    except ValueError:
+        raise _HTTPError(400, "Malformed request line") from None
+    headers = {}
+    for line in lines:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise _HTTPError(400, "Chunked request bodies are not supported")
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise _HTTPError(400, "Bad Content-Length")
+    if length > MAX_BODY:
+        raise _HTTPError(413, f"Body over {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, version.upper(), headers, body
+
+def _response(status: int, body: bytes, content_type: str, keep_alive: bool) -> bytes:
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+def _json(status: int, payload) -> Tuple[int, bytes, str]:
+    return status, json.dumps(payload).encode(), "application/json"
+
+class DesignService:
+    def __init__(self, cases: Sequence = calc.LOAD_CASES, criterion: str = "weight", max_layers: int = 2,
+                 base: Optional[calc.WallInputs] = None, window: float = WINDOW, max_batch: int = MAX_BATCH):
+        self.cases = tuple(cases)
+        self.criterion = criterion
+        self.max_layers = max_layers
+        self.base = base
+        self.window = window
+        self.max_batch = max_batch
+        self.started = time.time()
+        self.stats = {
+            "requests": 0, "errors": 0, "designs": 0, "batches": 0, "batch_max": 0,
+            "request_seconds": 0.0, "batch_seconds": 0.0,
+        }
+        self._pending: List[Tuple[calc.WallInputs, asyncio.Future]] = []
+        self._first_at = 0.0  # loop time the oldest pending design arrived
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="design-batch")
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    # --- Lifecycle (on the event loop) ---
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> int:
+        # Returns the bound port (pass port=0 for any free one).
+        self._wakeup, self._full = asyncio.Event(), asyncio.Event()
+        self._batcher = asyncio.create_task(self._run_batches())
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections would hold wait_closed() open.
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+        for _, fut in self._pending:
+            fut.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
+
+    # --- Micro-batching ---
+
+    async def design(self, inputs: Sequence[calc.WallInputs]) -> List[Dict]:
+        # Queue the designs and wait for their batch.
+        loop = asyncio.get_running_loop()
+        if not self._pending:
+            self._first_at = loop.time()
+        futures = []
+        for inp in inputs:
+            fut = loop.create_future()
+            self._pending.append((inp, fut))
+            futures.append(fut)
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await asyncio.gather(*futures)
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            wait = self._first_at + self.window - loop.time()
+            if wait > 0 and len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            taken, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            self._full.clear()
+            if self._pending:
+                self._first_at = loop.time() - self.window  # waited long enough already
+            else:
+                self._wakeup.clear()
+            if not taken:
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, design_batch, [inp for inp, _ in taken],
+                    self.cases, self.criterion, self.max_layers)
+            except Exception as exc:  # fail every request of the batch, keep serving
+                for _, fut in taken:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
+            dt = time.perf_counter() - t0
+            instr.record("service.batch", dt)
+            stats = self.stats
+            stats["batches"] += 1
+            stats["designs"] += len(taken)
+            stats["batch_max"] = max(stats["batch_max"], len(taken))
+            stats["batch_seconds"] += dt
+            for (_, fut), result in zip(taken, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    # --- HTTP ---
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except _HTTPError as exc:
+                    self.stats["errors"] += 1
+                    writer.write(_response(exc.status, json.dumps({"error": str(exc)}).encode(), "application/json", False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+                t0 = time.perf_counter()
+                status, payload, content_type = await self._route(method, path.split("?", 1)[0], body)
+                self.stats["requests"] += 1
+                self.stats["request_seconds"] += time.perf_counter() - t0
+                if status >= 400:
+                    self.stats["errors"] += 1
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                writer.write(_response(status, payload, content_type, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, bytes, str]:
+        if path == "/design":
+            if method != "POST":
+                return _json(405, {"error": "Use POST"})
+            return await self._post_design(body)
+        if path in ("/health", "/metrics"):
+            if method != "GET":
+                return _json(405, {"error": "Use GET"})
+            if path == "/health":
+                return _json(200, self.health())
+            return 200, self.metrics().encode(), "text/plain; version=0.0.4"
+        return _json(404, {"error": f"No such endpoint: {path}"})
+
+    async def _post_design(self, body: bytes) -> Tuple[int, bytes, str]:
+        try:
+            payload = json.loads(body)
+        except ValueError as exc:
+            return _json(400, {"error": f"Invalid JSON: {exc}"})
+        many = isinstance(payload, list)
+        recs = payload if many else [payload]
+        try:
+            if not all(isinstance(r, dict) for r in recs):
+                raise ValueError("Expected a WallInputs object or a list of them")
+            inputs = [records.inputs_from_record(r, self.base) for r in recs]
+        except (TypeError, ValueError) as exc:
+            return _json(400, {"error": str(exc)})
+        try:
+            results = await self.design(inputs)
+        except Exception as exc:
+            return _json(500, {"error": f"{type(exc).__name__}: {exc}"})
+        return _json(200, results if many else results[0])
+
+    # --- Health / metrics ---
+
+    def health(self) -> Dict:
+        s = self.stats
+        return {
+            "status": "ok",
+            "uptime_s": time.time() - self.started,
+            "pending": len(self._pending),
+            "cases": [calc.combination(c).name for c in self.cases],
+            **{k: s[k] for k in ("requests", "errors", "designs", "batches", "batch_max")},
+            "mean_batch": s["designs"] / s["batches"] if s["batches"] else 0.0,
+        }
+
+    def metrics(self) -> str:
+        s = self.stats
+        out = []
+        for name, kind, value in (
+            ("requests_total", "counter", s["requests"]),
+            ("errors_total", "counter", s["errors"]),
+            ("designs_total", "counter", s["designs"]),
+            ("batches_total", "counter", s["batches"]),
+            ("batch_size_max", "gauge", s["batch_max"]),
+            ("pending", "gauge", len(self._pending)),
+            ("request_seconds_sum", "counter", s["request_seconds"]),
+            ("batch_seconds_sum", "counter", s["batch_seconds"]),
+            ("uptime_seconds", "gauge", time.time() - self.started),
+        ):
+            out.append(f"# TYPE wall_service_{name} {kind}")
+            out.append(f"wall_service_{name} {value}")
+        text = "\n".join(out) + "\n"
+        return text + instr.export_prometheus() if instr.is_enabled() else text
+
+class RunningService:
+    # A DesignService on its own event loop in a background thread, for
+    # embedding in other tools and for tests:
+    #   with RunningService(port=0) as svc: ... http://127.0.0.1:{svc.port}/design
+    def __init__(self, host: str = DEFAULT_HOST, port: int = 0, **options):
+        self.host = host
+        self.service = DesignService(**options)
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        failed = []
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.port = self.loop.run_until_complete(self.service.start(host, port))
+            except Exception as exc:
+                failed.append(exc)
+                ready.set()
+                return
+            ready.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="design-service", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failed:
+            raise failed[0]
+
+    def stop(self):
+        if self.loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.service.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON design service for counterfort walls.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--window-ms", type=float, default=WINDOW * 1e3, help="Micro-batch window")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="Designs per batch at most")
+    parser.add_argument("--combinations", help="CSV or JSONL load-combination table (default LC-A, LC-B, LC-C)")
+    parser.add_argument("--base", help="JSON file with default WallInputs values for fields a request leaves out")
+    parser.add_argument("--criterion", choices=calc.BAR_CRITERIA, default="weight")
+    args = parser.parse_args(argv)
+
+    cases = calc.LOAD_CASES
+    if args.combinations:
+        cases = combinations.read_combinations(args.combinations)
+    base = None
+    if args.base:
+        with open(args.base) as f:
+            base = records.inputs_from_record(json.load(f))
+
+    async def serve():
+        service = DesignService(cases, args.criterion, base=base, window=args.window_ms / 1e3,
+                                max_batch=args.max_batch)
+        port = await service.start(args.host, args.port)
+        print(f"Serving on http://{args.host}:{port} (POST /design, GET /health, GET /metrics)", flush=True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+import instrumentation as instr
+
+# Process-wide cache shared by every Streamlit session (and any thread).
+# Entries are evicted least-recently-used once the estimated total size
+# passes max_bytes, and expire ttl seconds after they were stored. Keys are
+# tuples whose first item is a namespace ("design", "figure", "pdf", ...),
+# which the stats are also broken down by. get_or_compute() lets only one
+# thread build a missing entry; others asking for the same key wait for it.
+# Cached values are shared: treat them as read-only.
+#
+# Limits come from WALL_CACHE_MB (default 256) and WALL_CACHE_TTL seconds
+# (default 3600, 0 = no expiry).
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get("WALL_CACHE_MB", "256")) * 2**20)
+DEFAULT_TTL = float(os.environ.get("WALL_CACHE_TTL", "3600"))
+
+_MISSING = object()
+
+def sizeof(value, _seen=None) -> int:
+    # Rough deep size in bytes: containers, dataclasses (dict or slots),
+    # NumPy arrays, and Plotly figures (via their JSON-able dict).
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    # NumPy is not imported here: if nothing has loaded it, no value is an array.
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (value.nbytes if value.base is None else 0)
+    if hasattr(value, "to_plotly_json"):
+        return sizeof(value.to_plotly_json(), _seen)
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, bytearray, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, dict):
+        return size + sum(sizeof(k, _seen) + sizeof(v, _seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(sizeof(v, _seen) for v in value)
+    if hasattr(value, "__dict__"):
+        size += sizeof(vars(value), _seen)
+    for name in getattr(type(value), "__slots__", ()):
+        size += sizeof(getattr(value, name, None), _seen)
+    return size
+
+class _Entry:
+    __slots__ = ("value", "size", "expires")
+
+    def __init__(self, value, size, expires):
+        self.value = value
+        self.size = size
+        self.expires = expires
+
+class SharedCache:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, threading.Event] = {}
+        self._bytes = 0
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    # --- Internals (call with the lock held) ---
+
+    def _count(self, key, what: str):
+        ns = key[0] if isinstance(key, tuple) and key else "-"
+        counts = self._counts.setdefault(ns, {"hits": 0, "misses": 0, "evictions": 0, "expired": 0})
+        counts[what] += 1
+        instr.count(f"shared_cache.{ns}.{what}")
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry.expires is not None and entry.expires <= self._clock():
+            self._drop(key)
+            self._count(key, "expired")
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def _store(self, key, value, size: int):
+        if key in self._entries:
+            self._drop(key)
+        if size > self.max_bytes:
+            return
+        expires = self._clock() + self.ttl if self.ttl else None
+        self._entries[key] = _Entry(value, size, expires)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old, _ = next(iter(self._entries.items()))
+            self._drop(old)
+            self._count(old, "evictions")
+
+    # --- API ---
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            self._count(key, "misses" if value is _MISSING else "hits")
+        return default if value is _MISSING else value
+
+    def put(self, key, value, size: Optional[int] = None):
+        size = sizeof(value) if size is None else size
+        with self._lock:
+            self._store(key, value, size)
+
+    def get_or_compute(self, key, compute: Callable[[], object], size: Optional[int] = None):
+        # Cached value, or compute() once across threads and cache it.
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self._count(key, "hits")
+                    return value
+                waiting = self._inflight.get(key)
+                if waiting is None:
+                    self._count(key, "misses")
+                    self._inflight[key] = threading.Event()
+                    break
+            # Another thread is building it: wait, then look again (it may
+            # have failed or been too large to keep, in which case we build).
+            waiting.wait()
+
+        try:
+            value = compute()
+            self.put(key, value, size)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._counts.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        # Entries, bytes and hit rate overall and per namespace.
+        with self._lock:
+            per_ns = {ns: dict(c) for ns, c in self._counts.items()}
+            sizes: Dict[str, list] = {}
+            for key, entry in self._entries.items():
+                ns = key[0] if isinstance(key, tuple) and key else "-"
+                s = sizes.setdefault(ns, [0, 0])
+                s[0] += 1
+                s[1] += entry.size
+            out = {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes, "ttl": self.ttl}
+        for ns, c in per_ns.items():
+            c["entries"], c["bytes"] = sizes.get(ns, (0, 0))
+            lookups = c["hits"] + c["misses"]
+            c["hit_rate"] = c["hits"] / lookups if lookups else 0.0
+        hits = sum(c["hits"] for c in per_ns.values())
+        lookups = hits + sum(c["misses"] for c in per_ns.values())
+        out["hits"] = hits
+        out["misses"] = lookups - hits
+        out["hit_rate"] = hits / lookups if lookups else 0.0
+        out["namespaces"] = per_ns
+        return out
+
+# The process-wide instance used by the app.
+CACHE = SharedCache()
@@ -0,0 +1,91 @@
+import numpy as np
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List
+
+import calculations as calc
+import batch
+
+# Stem designed strip by strip up its height.
+# calculate_reinforcement checks one section: bottom thickness, pressure at
+# full depth. Here the stem (top of base to top of wall) is cut into N
+# horizontal strips; at every strip edge the tapered thickness and the
+# lateral pressure at that depth give the span moment between counterforts,
+# d, z and As in one array expression. Each strip takes the larger As of its
+# two edges.
+#
+# Curtailment keeps the bars chosen for the most heavily loaded strip
+# (diameter and layers) and, further up, only opens the spacing: every
+# strip takes the lightest / cheapest spacing of those bars. Runs of strips
+# with the same spacing form the curtailment zones.
+
+DEFAULT_STRIPS = 200
+
+@dataclass
+class StemZone:
+    y_bottom: float  # m above top of base
+    y_top: float
+    As_req: float    # governing (largest) As in the zone, mm2/m
+    bars: calc.BarArrangement
+
+@dataclass
+class StemDesign:
+    # Edge arrays have n + 1 entries (bottom to top), strip arrays have n.
+    y: np.ndarray          # edge height above top of base (m)
+    thickness: np.ndarray  # m
+    p_lat: np.ndarray      # kPa
+    M_uls: np.ndarray      # kNm/m
+    d: np.ndarray          # mm
+    z: np.ndarray          # mm
+    As_edge: np.ndarray    # mm2/m, including the minimum
+    As_req: np.ndarray     # per strip
+    table: calc.BarTable   # spacings of the curtailed bars
+    bar_index: np.ndarray  # per strip, into table.arrangements
+    zones: List[StemZone]
+
+@lru_cache(maxsize=None)
+def spacing_table(diameter: int, layers: int):
+    # BarTable of one bar size (all spacings) and its array form.
+    table = calc.BarTable(a for a in calc.BAR_TABLES[layers].arrangements
+                          if a.diameter == diameter and a.layers == layers)
+    return table, batch.bar_table_arrays(table)
+
+def design_stem(inp: calc.WallInputs, n: int = DEFAULT_STRIPS, criterion: str = "weight",
+                max_layers: int = 2) -> StemDesign:
+    if n < 1:
+        raise ValueError("Need at least one stem strip")
+    h_s = inp.H - inp.t_base
+    y = np.linspace(0.0, h_s, n + 1)
+    depth = h_s - y
+
+    # Same loading and section assumptions as calculate_reinforcement, per level.
+    ka = calc.calculate_ka(inp.phi_soil)
+    thickness = inp.t_stem_bottom + (inp.t_stem_top - inp.t_stem_bottom) * (y / h_s if h_s > 0 else 0.0)
+    p_lat = (ka * (inp.gamma_sat - 9.81) * depth) + (9.81 * depth) + (ka * inp.surcharge)
+
+    coeff = 0.10 if inp.stem_continuous else 0.125
+    M_uls = coeff * p_lat * (inp.s_cf ** 2) * calc.ULS_FACTOR
+
+    d = thickness * 1000 - inp.cover - 8
+    d = np.where(d <= 0, 100.0, d)
+    z = 0.95 * d
+    As = (M_uls * 1e6) / (0.95 * inp.fy * z)
+    As_min = 0.0013 * 1000 * (thickness * 1000)
+    As_edge = np.maximum(As, As_min)
+
+    As_req = np.maximum(As_edge[:-1], As_edge[1:])
+    governing = calc.select_bars(float(As_req.max()), criterion, max_layers)
+    table, arrays = spacing_table(governing.diameter, governing.layers)
+    bar_index = batch.select_from_table(arrays, As_req, criterion)["index"]
+    return StemDesign(y, thickness, p_lat, M_uls, d, z, As_edge, As_req, table, bar_index,
+                      curtailment_zones(y, As_req, bar_index, table))
+
+def curtailment_zones(y: np.ndarray, As_req: np.ndarray, bar_index: np.ndarray, table: calc.BarTable) -> List[StemZone]:
+    # Consecutive strips with the same arrangement merged, bottom zone first.
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bar_index)) + 1))
+    ends = np.append(starts[1:], bar_index.size)
+    As_max = np.maximum.reduceat(As_req, starts)
+    return [
+        StemZone(float(y[a]), float(y[b]), float(As), table.arrangements[int(bar_index[a])])
+        for a, b, As in zip(starts, ends, As_max)
+    ]
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import operator
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import fields
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import calculations as calc
+import instrumentation as instr
+from shared_cache import SharedCache
+
+# Persistent result store (SQLite).
+# Each design (stability for every load case + reinforcement) is saved under
+# a content hash of its inputs and bar-selection options, so any session or
+# batch run on the same file reuses it. H, B, phi_soil, overall status and
+# the minimum FS are stored as indexed columns for queries such as "all
+# passing walls with 5 <= H <= 7". Bulk writes go in one transaction.
+#
+# The database path is $WALL_STORE, or wall_results.sqlite next to this file.
+
+DEFAULT_PATH = os.environ.get(
+    "WALL_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "wall_results.sqlite"))
+
+# Bump when the calculations change, so stale results are not served.
+MODEL_VERSION = 1
+
+# In-memory front of the database, unless a shared cache is passed in.
+MEMO_BYTES = 32 * 2**20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS designs (
+    hash TEXT PRIMARY KEY,
+    H REAL NOT NULL,
+    B REAL NOT NULL,
+    phi_soil REAL NOT NULL,
+    status TEXT NOT NULL,
+    min_fs REAL NOT NULL,
+    inputs TEXT NOT NULL,
+    stability TEXT NOT NULL,
+    reinforcement TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS designs_H ON designs (H);
+CREATE INDEX IF NOT EXISTS designs_B ON designs (B);
+CREATE INDEX IF NOT EXISTS designs_phi ON designs (phi_soil);
+CREATE INDEX IF NOT EXISTS designs_status_H ON designs (status, H);
+CREATE INDEX IF NOT EXISTS designs_min_fs ON designs (min_fs);
+"""
+
+_INPUT_NAMES = tuple(f.name for f in fields(calc.WallInputs))
+
+# Results are serialised as plain value lists in dataclass field order.
+_result_values = operator.attrgetter(*(f.name for f in fields(calc.StabilityResult)))
+_bar_values = operator.attrgetter(*(f.name for f in fields(calc.BarArrangement)))
+
+# Field names and model version are part of every hash.
+_HASH_PREFIX = json.dumps([MODEL_VERSION, _INPUT_NAMES]).encode()
+
+Design = Tuple[Dict[str, calc.StabilityResult], Dict]
+
+def content_hash(inp: calc.WallInputs, criterion: str = "weight", max_layers: int = 2) -> str:
+    # Canonical JSON (field order, repr floats) of everything the result depends on.
+    payload = json.dumps([calc.inputs_key(inp), criterion, max_layers])
+    return hashlib.sha256(_HASH_PREFIX + payload.encode()).hexdigest()
+
+def overall_status(stability: Dict[str, calc.StabilityResult]) -> str:
+    return "PASS" if all(r.status == "PASS" for r in stability.values()) else "FAIL"
+
+def min_fs(stability: Dict[str, calc.StabilityResult]) -> float:
+    return min(min(r.fs_slide, r.fs_ot) for r in stability.values())
+
+def _dump_stability(stability: Dict[str, calc.StabilityResult]) -> str:
+    return json.dumps({case: _result_values(r) for case, r in stability.items()})
+
+def _load_stability(text: str) -> Dict[str, calc.StabilityResult]:
+    return {case: calc.StabilityResult(*values) for case, values in json.loads(text).items()}
+
+def _dump_reinforcement(reinf: Dict) -> str:
+    out = {}
+    for member, values in reinf.items():
+        values = dict(values)
+        if "Arrangement" in values:
+            values["Arrangement"] = _bar_values(values["Arrangement"])
+        out[member] = values
+    return json.dumps(out)
+
+def _load_reinforcement(text: str) -> Dict:
+    reinf = json.loads(text)
+    for values in reinf.values():
+        if "Arrangement" in values:
+            values["Arrangement"] = calc.BarArrangement(*values["Arrangement"])
+    return reinf
+
+def compute_design(inp: calc.WallInputs, criterion: str = "weight", max_layers: int = 2) -> Design:
+    stability = {c: calc.calculate_stability(inp, c) for c in calc.LOAD_CASES}
+    reinf = calc.calculate_reinforcement(inp, res_B=stability["LC-B"], criterion=criterion, max_layers=max_layers)
+    return stability, reinf
+
+class ResultStore:
+    # One SQLite connection shared by the threads of a process (guarded by a
+    # lock), with an in-memory SharedCache in front of it (keys ("design",
+    # hash)). Separate processes open their own ResultStore on the same
+    # file; WAL mode lets them read while another writes.
+
+    def __init__(self, path: str = DEFAULT_PATH, memo: SharedCache = None, timeout: float = 30.0):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._memo = SharedCache(MEMO_BYTES, ttl=0) if memo is None else memo
+        self.stats = {"memory_hits": 0, "store_hits": 0, "computed": 0, "written": 0}
+        with self._lock, self._conn:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM designs").fetchone()[0]
+
+    # --- Lookups ---
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Design]:
+        # Stored designs for the keys that exist (memo first, then one query per 500 keys).
+        found = {}
+        missing = []
+        for k in keys:
+            design = self._memo.get(("design", k))
+            if design is None:
+                missing.append(k)
+            else:
+                found[k] = design
+        with self._lock:
+            self.stats["memory_hits"] += len(found)
+            for start in range(0, len(missing), 500):
+                part = missing[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, stability, reinforcement FROM designs WHERE hash IN ({','.join('?' * len(part))})",
+                    part).fetchall()
+                for k, stability, reinf in rows:
+                    design = (_load_stability(stability), _load_reinforcement(reinf))
+                    self._memo.put(("design", k), design)
+                    found[k] = design
+                    self.stats["store_hits"] += 1
+        return found
+
+    def get(self, inp: calc.WallInputs, criterion: str = "weight", max_layers: int = 2) -> Optional[Design]:
+        key = content_hash(inp, criterion, max_layers)
+        return self.get_many([key]).get(key)
+
+    # --- Writes ---
+
+    def put_many(self, items: Iterable[Tuple[calc.WallInputs, Dict[str, calc.StabilityResult], Dict]],
+                 criterion: str = "weight", max_layers: int = 2, keys: Sequence[str] = None) -> int:
+        # Insert (or replace) many designs in a single transaction. `keys`
+        # may pass the content hashes if the caller already has them.
+        now = time.time()
+        rows, designs = [], []
+        for i, (inp, stability, reinf) in enumerate(items):
+            key = content_hash(inp, criterion, max_layers) if keys is None else keys[i]
+            designs.append((key, (stability, reinf)))
+            rows.append((
+                key, inp.H, inp.B, inp.phi_soil, overall_status(stability), min_fs(stability),
+                json.dumps(dict(zip(_INPUT_NAMES, calc.inputs_key(inp)))),
+                _dump_stability(stability), _dump_reinforcement(reinf), now,
+            ))
+        with instr.timer("store.write"), self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO designs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.stats["written"] += len(rows)
+        for key, design in designs:
+            self._memo.put(("design", key), design)
+        return len(rows)
+
+    def put(self, inp: calc.WallInputs, stability: Dict[str, calc.StabilityResult], reinf: Dict,
+            criterion: str = "weight", max_layers: int = 2):
+        self.put_many([(inp, stability, reinf)], criterion, max_layers)
+
+    def design(self, inp: calc.WallInputs, criterion: str = "weight", max_layers: int = 2) -> Design:
+        # Stored result if there is one, otherwise compute and store it.
+        found = self.get(inp, criterion, max_layers)
+        if found is not None:
+            return found
+        stability, reinf = compute_design(inp, criterion, max_layers)
+        with self._lock:
+            self.stats["computed"] += 1
+        self.put(inp, stability, reinf, criterion, max_layers)
+        return stability, reinf
+
+    # --- Queries ---
+
+    def query(self, H: Tuple[float, float] = None, B: Tuple[float, float] = None,
+              phi_soil: Tuple[float, float] = None, passing: Optional[bool] = None,
+              min_fs_at_least: float = None, limit: int = None) -> List[Dict]:
+        # Rows matching every given filter (ranges are inclusive), as dicts
+        # with the indexed columns and the WallInputs.
+        where, args = [], []
+        for column, bounds in (("H", H), ("B", B), ("phi_soil", phi_soil)):
+            if bounds is not None:
+                where.append(f"{column} BETWEEN ? AND ?")
+                args += list(bounds)
+        if passing is not None:
+            where.append("status = ?")
+            args.append("PASS" if passing else "FAIL")
+        if min_fs_at_least is not None:
+            where.append("min_fs >= ?")
+            args.append(min_fs_at_least)
+        sql = "SELECT hash, H, B, phi_soil, status, min_fs, inputs, created FROM designs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY H, B"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [
+            {"hash": h, "H": H_, "B": B_, "phi_soil": phi, "status": status, "min_fs": fs,
+             "inputs": calc.WallInputs(**json.loads(inputs)), "created": created}
+            for h, H_, B_, phi, status, fs, inputs, created in rows
+        ]
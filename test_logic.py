@@ -1,7 +1,36 @@
 import calculations as calc
 import visualization as viz
 import reporting
+import batch
+import optimizer
+import reliability
+import chainage
+import records
+import cli
+import stem
+import sensitivity
+import seismic
+import combinations
+import store
+import service
+import columnar
+import design_space
+import kernels
+import shared_cache
+import socket
+import threading
+import tempfile
+import zipfile
+import bench
+import instrumentation as instr
+import csv
+import io
+import json
 import os
+import random
+import subprocess
+import sys
+import numpy as np
 
 def test_logic():
     print("Testing Wall Calculation Logic...")
@@ -42,5 +71,764 @@ def test_logic():
     
     print("All tests passed.")
 
+def _default_inputs(**overrides):
+    values = dict(
+        H=6.0, B=4.0, toe=1.0, heel=2.5, t_base=0.5,
+        t_stem_top=0.3, t_stem_bottom=0.5,
+        s_cf=2.5, t_cf=0.4, d_key=0.5, w_key=0.5, L_wall=20.0,
+        surcharge=10.0, crane_load=0.0, crane_dist=2.0,
+        gamma_w=9.81, gamma_c=24.0, phi_soil=30.0,
+        gamma_soil=18.0, gamma_sat=20.0, mu_rock=0.5,
+        anchor_cap=0.0, anchor_inclination=15.0,
+        fy=460.0, fcu=30.0, cover=50.0,
+        uplift_full_base=True, stem_continuous=False
+    )
+    values.update(overrides)
+    return calc.WallInputs(**values)
+
+def _random_inputs(rng, n):
+    rows = []
+    for _ in range(n):
+        toe = rng.uniform(0.0, 2.0)
+        heel = rng.uniform(0.5, 5.0)
+        t_stem_bottom = rng.uniform(0.3, 0.8)
+        rows.append(_default_inputs(
+            H=rng.uniform(2.0, 10.0), B=toe + t_stem_bottom + heel, toe=toe, heel=heel,
+            t_base=rng.uniform(0.3, 1.0), t_stem_top=rng.uniform(0.2, 0.3), t_stem_bottom=t_stem_bottom,
+            s_cf=rng.uniform(2.0, 4.0), d_key=rng.choice([0.0, rng.uniform(0.1, 1.0)]),
+            surcharge=rng.uniform(0.0, 30.0), crane_load=rng.choice([0.0, rng.uniform(10, 200)]),
+            phi_soil=rng.uniform(25.0, 40.0), mu_rock=rng.uniform(0.3, 0.7),
+            anchor_cap=rng.choice([0.0, rng.uniform(10, 200)]),
+            uplift_full_base=rng.random() < 0.5,
+        ))
+    return rows
+
+def test_batch_matches_scalar():
+    rng = random.Random(1)
+    rows = _random_inputs(rng, 300)
+    results = batch.calculate_stability_all(batch.WallInputsBatch.from_inputs(rows))
+
+    for case, res_batch in results.items():
+        for i, inp in enumerate(rows):
+            ref = calc.calculate_stability(inp, case)
+            got = res_batch.row(i)
+            for name in batch.RESULT_FIELDS:
+                a, b = getattr(ref, name), getattr(got, name)
+                assert abs(a - b) <= 1e-9 * max(1.0, abs(a)), (case, i, name, a, b)
+            assert got.status == ref.status
+            assert got.debug_info == ref.debug_info
+
+def test_seismic_fields_keep_positional_inputs():
+    # kh / kv come after the pre-existing fields, so positional calls still
+    # set the toggles.
+    from dataclasses import fields
+    static = [f.name for f in fields(calc.WallInputs)][:-2]
+    assert static[-2:] == ["uplift_full_base", "stem_continuous"]
+    inp = calc.WallInputs(*(getattr(_default_inputs(), n) for n in static[:-2]), False, True)
+    assert inp.uplift_full_base is False and inp.stem_continuous is True and inp.kh == inp.kv == 0.0
+
+def test_seismic_case_and_yield_acceleration():
+    import math
+    from dataclasses import replace
+    assert abs(calc.calculate_kae(30.0, 0.0) - calc.calculate_ka(30.0)) < 1e-12
+    assert abs(calc.calculate_kae(30.0, math.atan(0.2)) - 0.4733) < 1e-3  # M-O, delta = 0
+
+    # No acceleration: LC-E is LC-B checked against the seismic limits
+    inp = _default_inputs(H=4.0)
+    static, quiet = calc.calculate_stability(inp, "LC-B"), calc.calculate_stability(inp, calc.SEISMIC_CASE)
+    assert (quiet.fs_slide, quiet.fs_ot, quiet.q_max) == (static.fs_slide, static.fs_ot, static.q_max)
+    shaken = calc.calculate_stability(replace(inp, kh=0.15, kv=0.05), calc.SEISMIC_CASE)
+    assert shaken.fs_slide < quiet.fs_slide and shaken.P_AE > 0 and shaken.F_inertia > 0 and shaken.Pw_dyn > 0
+    assert "Seismic:" in shaken.debug_info and "Seismic:" not in quiet.debug_info
+
+    rng = random.Random(8)
+    rows = [replace(r, kh=rng.uniform(0.0, 0.4), kv=rng.uniform(-0.1, 0.1)) for r in _random_inputs(rng, 200)]
+    res = batch.calculate_stability_batch(batch.WallInputsBatch.from_inputs(rows), calc.SEISMIC_CASE)
+    for i, r in enumerate(rows):
+        ref, got = calc.calculate_stability(r, calc.SEISMIC_CASE), res.row(i)
+        for name in batch.RESULT_FIELDS + ("P_AE", "F_inertia", "Pw_dyn"):
+            a, b = getattr(ref, name), getattr(got, name)
+            assert abs(a - b) <= 1e-9 * max(1.0, abs(a)), (i, name, a, b)
+        assert got.status == ref.status
+
+    # Yield acceleration: FS at the limit there, above it just below
+    rows = _random_inputs(random.Random(9), 300)
+    ky = seismic.yield_acceleration(batch.WallInputsBatch.from_inputs(rows), kv_ratio=0.3)
+    assert ky.evaluations < 20
+    checked = 0
+    for r, k_s, k_o in zip(rows, ky.kh_slide, ky.kh_ot):
+        for k, name, limit in ((k_s, "fs_slide", 1.1), (k_o, "fs_ot", 1.5)):
+            at_zero = getattr(calc.calculate_stability(r, calc.SEISMIC_CASE), name)
+            if k == 0:
+                assert at_zero < limit
+            elif k < math.inf:
+                at = calc.calculate_stability(replace(r, kh=float(k), kv=0.3 * float(k)), calc.SEISMIC_CASE)
+                before = calc.calculate_stability(replace(r, kh=float(k) - 1e-4, kv=0.3 * (float(k) - 1e-4)), calc.SEISMIC_CASE)
+                assert abs(getattr(at, name) - limit) < 1e-6 and getattr(before, name) > limit
+                checked += 1
+    assert checked > 300
+
+def test_load_combination_table():
+    from dataclasses import replace
+    # The standard cases are table rows; an unknown name is an error (the
+    # baseline checked any other name as a dry wall)
+    assert calc.fs_limits("LC-E") == calc.SEISMIC_FS_LIMITS and calc.fs_limits("LC-A") == calc.FS_LIMITS
+    assert calc.combination("LC-B").eccentricity_label == "B/6"
+    b = batch.WallInputsBatch.from_inputs([_default_inputs()])
+    for check in (lambda: calc.calculate_stability(_default_inputs(), "LC-Z"),
+                  lambda: calc.calculate_stability(_default_inputs(), "lc-b"),
+                  lambda: batch.calculate_stability_batch(b, "LC-Z"),
+                  lambda: batch.calculate_stability_all(b, ["LC-A", "LC-Z"])):
+        try:
+            check()
+            assert False, "unknown case accepted"
+        except ValueError as exc:
+            assert "Unknown load case" in str(exc)
+
+    text = (
+        "name,canal_level,backfill_level,surcharge_factor,crane_factor,anchor_factor,seismic_factor,"
+        "fs_slide_min,fs_ot_min,e_max,q_allow,description\n"
+        "CRANE-OFF,1,1,1,0,1,0,1.5,2.0,1/6,,No crane\n"
+        "ANCHORS-LOST,1,0.5,1.2,1,0,0,1.3,1.5,1/4,150,\n"
+        "QUAKE,1,1,0.5,0,1,1,1.1,1.5,1/3,inf,\n"
+        "LC-C\n"
+    )
+    table = combinations.read_combinations(io.StringIO(text), "csv")
+    assert [c.name for c in table] == ["CRANE-OFF", "ANCHORS-LOST", "QUAKE", "LC-C"]
+    assert table[1].e_max == 0.25 and table[1].q_allow == 150 and table[3] == calc.combination("LC-C")
+    buf = io.StringIO()
+    combinations.write_combinations(table, buf)
+    assert combinations.read_combinations(io.StringIO(buf.getvalue()), "csv") == table
+
+    # One batched pass over every row matches the scalar path, statuses included
+    rng = random.Random(21)
+    rows = [replace(r, kh=rng.uniform(0.0, 0.3), kv=rng.uniform(-0.05, 0.05)) for r in _random_inputs(rng, 150)]
+    check = combinations.check_combinations(batch.WallInputsBatch.from_inputs(rows), table)
+    assert check.status.shape == (4, 150)
+    for j, c in enumerate(table):
+        for i, r in enumerate(rows):
+            ref = calc.calculate_stability(r, c)
+            for name, got in (("fs_slide", check.fs_slide), ("fs_ot", check.fs_ot), ("q_max", check.q_max)):
+                a = getattr(ref, name)
+                assert abs(a - got[j, i]) <= 1e-9 * max(1.0, abs(a)), (c.name, i, name)
+            assert check.status[j, i] == ref.status and ref.case_name == c.name
+    assert any("(Bearing)" in s for s in check.status[1]) and any("B/4" in s for s in check.status[1])
+    assert (check.passed == np.all(check.status == "PASS", axis=0)).all()
+    i = int(np.argmax(check.utilisation.max(axis=0)))
+    assert check.governing[i] == table[int(np.argmax(check.utilisation[:, i]))].name
+    assert check.rows()[i]["QUAKE_status"] == check.status[2, i]
+
+    # Multipliers: crane off is LC-B with no crane
+    r = rows[0]
+    assert calc.calculate_stability(r, table[0]).fs_ot == calc.calculate_stability(replace(r, crane_load=0.0), "LC-B").fs_ot
+
+    # Standard names in a table reproduce the named cases
+    b = batch.WallInputsBatch.from_inputs(rows[:20])
+    named = batch.calculate_stability_all(b, calc.LOAD_CASES + (calc.SEISMIC_CASE,))
+    for c in calc.STANDARD_COMBINATIONS:
+        assert (batch.calculate_stability_all(b, (c,))[c.name].fs_slide == named[c.name].fs_slide).all()
+
+    # CLI: one column block per combination
+    from dataclasses import asdict
+    out = io.StringIO()
+    cli.run(iter([asdict(r) for r in rows[:5]]), records.RecordWriter(out), chunk_size=2, table=table)
+    first = json.loads(out.getvalue().splitlines()[0])
+    assert first["CRANE-OFF_status"] == check.status[0, 0] and first["governing_combination"] == check.governing[0]
+
+def test_stability_result_is_compact_with_lazy_debug():
+    res = calc.calculate_stability(_default_inputs(), "LC-B")
+    assert not hasattr(res, "__dict__")
+    assert res.Pw_back > 0 and res.F_key > 0 and res.head_max == 6.0
+    assert res.debug_info.startswith(f"Pa1={res.Pa_1:.1f}")
+    assert f"Uplift={res.uplift:.1f}" in res.debug_info
+
+    rows = batch.calculate_stability_batch(batch.WallInputsBatch.from_inputs(_random_inputs(random.Random(2), 20)), "LC-A")
+    assert rows.to_results() == [rows.row(i) for i in range(len(rows))]
+
+def test_bar_table_picks_optimal_arrangement():
+    rng = random.Random(4)
+    As = [rng.uniform(50.0, 25000.0) for _ in range(300)]
+    for criterion in calc.BAR_CRITERIA:
+        for layers, table in calc.BAR_TABLES.items():
+            picked = batch.select_bars(As, criterion, layers)
+            for k, a in enumerate(As):
+                got = calc.select_bars(a, criterion, layers)
+                ok = [t for t in table.arrangements if t.area >= a]
+                if ok:
+                    assert got.area >= a and getattr(got, criterion) == min(getattr(t, criterion) for t in ok)
+                else:
+                    assert got.area == max(table.areas)
+                assert got.layers <= layers
+                assert table.arrangements[picked["index"][k]] == got
+
+    assert calc.suggest_bar(700.0) == 12 and calc.suggest_bar(1e6) == 32
+
+    rows = _random_inputs(rng, 200)
+    b = batch.WallInputsBatch.from_inputs(rows)
+    q_max_B = batch.calculate_stability_batch(b, "LC-B").q_max
+    got = batch.reinforcement_rows(batch.reinforcement_arrays(b, q_max_B, "cost"))
+    for inp, g in zip(rows, got):
+        ref = calc.calculate_reinforcement(inp, criterion="cost")
+        for member in ("Stem", "Heel", "Toe"):
+            assert g[member]["Bar"] == ref[member]["Bar"]
+            assert g[member]["Arrangement"] == ref[member]["Arrangement"]
+            assert abs(g[member]["M_uls"] - ref[member]["M_uls"]) <= 1e-9 * max(1.0, abs(ref[member]["M_uls"]))
+
+def test_stem_strips_curtail_along_height():
+    inp = _default_inputs(H=9.0, t_stem_top=0.25, t_stem_bottom=0.6, surcharge=20.0, s_cf=4.0)
+    ref = calc.calculate_reinforcement(inp)["Stem"]
+    design = stem.design_stem(inp, n=1000)
+
+    assert design.As_req.shape == (1000,) and design.y.shape == (1001,)
+    assert abs(design.As_edge[0] - ref["As_req"]) <= 1e-9 * ref["As_req"]
+    assert design.zones[0].bars == ref["Arrangement"]
+
+    zones = design.zones
+    assert len(zones) > 1
+    assert zones[0].y_bottom == 0.0 and abs(zones[-1].y_top - (inp.H - inp.t_base)) < 1e-12
+    for lower, upper in zip(zones, zones[1:]):
+        assert lower.y_top == upper.y_bottom
+        assert upper.bars.spacing > lower.bars.spacing
+    for z in zones:
+        assert z.bars.area >= z.As_req
+        assert (z.bars.diameter, z.bars.layers) == (zones[0].bars.diameter, zones[0].bars.layers)
+
+def test_optimizer_returns_feasible_minimum():
+    base = _default_inputs(H=4.0)
+    ranges = {"toe": (0.0, 1.5, 0.1), "heel": (2.0, 8.0, 0.1), "t_base": (0.3, 0.6, 0.1), "d_key": (0.0, 0.5, 0.5), "s_cf": (2.5, 2.5, 0.5)}
+    opt = optimizer.optimize_geometry(base, q_allow=300.0, ranges=ranges)
+
+    assert opt is not None
+    inp = opt.inputs
+    assert abs(inp.B - (inp.toe + inp.t_stem_bottom + inp.heel)) < 1e-9
+    for res in opt.results.values():
+        assert res.fs_slide >= 1.5 and res.fs_ot >= 2.0
+        assert abs(res.eccentricity) <= inp.B / 6.0 and res.q_max <= 300.0
+
+    # Every lighter candidate on the grid must fail somewhere
+    cand = optimizer.candidate_grid(base, ranges)
+    volume = optimizer.concrete_volume(cand)
+    ok = volume < opt.volume - 1e-9
+    for case in calc.LOAD_CASES:
+        res = batch.calculate_stability_batch(cand, case)
+        ok &= optimizer.feasible(res, cand.B, 300.0)
+    assert not ok.any()
+
+def test_optimizer_default_ranges_size_the_default_wall():
+    opt = optimizer.optimize_geometry(_default_inputs())
+    assert opt is not None
+    assert set(opt.results) == {"LC-C", "LC-B", "LC-A"}
+    assert all(res.status == "PASS" for res in opt.results.values())
+
+def test_optimizer_uses_each_case_limits():
+    base = _default_inputs(H=4.0)
+    ranges = {"toe": (0.0, 1.5, 0.1), "heel": (2.0, 8.0, 0.1), "t_base": (0.3, 0.6, 0.1), "d_key": (0.0, 0.5, 0.5), "s_cf": (2.5, 2.5, 0.5)}
+    strict = calc.LoadCombination("LC-A strict", canal_level=1.0, e_max=1 / 25)
+    loose = optimizer.optimize_geometry(base, ranges=ranges, cases=("LC-A",))
+    opt = optimizer.optimize_geometry(base, ranges=ranges, cases=(strict,))
+    assert opt is not None and opt.volume > loose.volume
+    res = opt.results["LC-A strict"]
+    assert res.status == "PASS"
+    assert abs(res.eccentricity) <= opt.inputs.B / 25
+
+def test_solver_finds_smallest_dimension():
+    base = _default_inputs(H=4.0)
+    checks = ("fs_slide", "fs_ot", "eccentricity", "bearing")
+
+    def worst(inp):
+        return min(float(optimizer.margin(calc.calculate_stability(inp, c), inp.B, checks)) for c in calc.LOAD_CASES)
+
+    for name in ("B", "heel"):
+        sol = optimizer.solve_dimension(base, name, checks, xtol=1e-3)
+        assert sol is not None and sol.margin >= 0
+        assert abs(sol.inputs.B - (sol.inputs.toe + sol.inputs.t_stem_bottom + sol.inputs.heel)) < 1e-12
+        assert worst(sol.inputs) >= 0
+        assert worst(optimizer.with_dimension(base, name, sol.value - 1e-3)) < 0
+        assert sol.evaluations + sol.grid_points <= 40
+
+    assert optimizer.solve_dimension(base, "d_key", ("fs_slide",)) is None
+
+def test_sensitivities_match_scalar_differences():
+    from dataclasses import replace
+    inp = _default_inputs(anchor_cap=50.0)
+    sens = sensitivity.sensitivities(inp)
+
+    for case in calc.LOAD_CASES:
+        for name in ("phi_soil", "mu_rock", "anchor_cap", "surcharge", "H"):
+            h = 1e-5 * max(abs(getattr(inp, name)), 1.0)
+            up = calc.calculate_stability(replace(inp, **{name: getattr(inp, name) + h}), case)
+            down = calc.calculate_stability(replace(inp, **{name: getattr(inp, name) - h}), case)
+            for out in ("fs_slide", "q_max"):
+                ref = (getattr(up, out) - getattr(down, out)) / (2 * h)
+                got = sens.of(out, case)[name]
+                assert abs(got - ref) <= 1e-3 * max(1.0, abs(ref)), (case, name, out, got, ref)
+
+    # Linked geometry: a longer heel also lengthens the base
+    heel = sens.of("fs_slide")["heel"]
+    h = 1e-4
+    longer = replace(inp, heel=inp.heel + h, B=inp.B + h)
+    case = sens.governing_case("fs_slide")
+    ref = (calc.calculate_stability(longer, case).fs_slide - calc.calculate_stability(inp, case).fs_slide) / h
+    assert abs(heel - ref) <= 1e-3 * abs(ref)
+    assert list(sensitivity.gradient(inp, "fs_slide")) == list(sens.gradient["fs_slide"][sens.cases.index(case)])
+
+    case, base, bars = sensitivity.tornado(inp, "fs_slide", top=30)
+    assert case == sens.governing_case("fs_slide")
+    assert abs(base - calc.calculate_stability(inp, case).fs_slide) < 1e-9
+    assert [b.swing for b in bars] == sorted((b.swing for b in bars), reverse=True)
+    assert "crane_load" not in [b.field for b in bars]
+
+def test_cache_shares_results():
+    calc.clear_cache()
+    inputs = _default_inputs()
+    first = calc.cached_stability_all(inputs)
+    reinf = calc.cached_reinforcement(_default_inputs())
+
+    stats = calc.cache_stats()
+    assert stats["stability"]["misses"] == 3
+    assert stats["stability"]["hits"] == 1  # LC-B reused by reinforcement
+    assert calc.cached_stability_all(_default_inputs())["LC-A"] is first["LC-A"]
+    assert calc.cached_reinforcement(inputs) is reinf
+    assert calc.cache_stats()["reinforcement"]["hits"] == 1
+
+    changed = calc.cached_stability(_default_inputs(H=6.5), "LC-A")
+    assert changed is not first["LC-A"]
+    assert reinf == calc.calculate_reinforcement(inputs)
+
+def test_envelope_covers_fixed_cases():
+    inputs = _default_inputs(uplift_full_base=False)
+    env = batch.water_level_envelope(inputs, 41, 41)
+
+    corners = {"LC-A": (-1, 0), "LC-B": (-1, -1), "LC-C": (0, -1)}
+    for case, (i, j) in corners.items():
+        ref = calc.calculate_stability(inputs, case)
+        assert abs(env.fs_slide[i, j] - ref.fs_slide) < 1e-9
+        assert abs(env.q_max[i, j] - ref.q_max) < 1e-9
+        assert env.governing["sliding"]["value"] <= ref.fs_slide
+        assert env.governing["overturning"]["value"] <= ref.fs_ot
+
+def test_monte_carlo_stops_early_and_is_reproducible():
+    inputs = _default_inputs()
+    kwargs = dict(max_samples=200_000, chunk_size=10_000, seed=7, rel_tol=0.05)
+    serial = list(reliability.run_monte_carlo(inputs, workers=0, **kwargs))
+    pooled = list(reliability.run_monte_carlo(inputs, workers=2, **kwargs))
+
+    assert serial[-1].converged and serial[-1].n_samples < 200_000
+    assert [p.n_failures for p in serial] == [p.n_failures for p in pooled]
+    assert serial[-1].ci_low <= serial[-1].pf <= serial[-1].ci_high
+
+    safe = reliability.estimate_pf(_default_inputs(H=4.0, B=7.0, heel=5.5, uplift_full_base=False),
+                                   max_samples=20_000, chunk_size=10_000, workers=0, seed=7)
+    assert safe.pf < 0.01
+
+def test_chainage_bays_envelope_and_dedup():
+    base = _default_inputs(s_cf=2.5)
+    profile = io.StringIO("\n".join(json.dumps(r) for r in [
+        {"chainage": 0, "H": 6.0},
+        {"chainage": 10, "H": 6.0},
+        {"chainage": 20, "H": 7.0, "surcharge": 20.0},
+        {"chainage": 31},
+    ]))
+    segs = list(chainage.design_segments(chainage.read_stations(profile, base=base, fmt="jsonl")))
+
+    assert [s.ch_start for s in segs][:3] == [0.0, 2.5, 5.0]
+    assert segs[-1].ch_end == 31.0 and abs(segs[-1].inputs.L_wall - 1.0) < 1e-9
+    assert [s.reused for s in segs[:4]] == [False, True, True, True]
+    # 10-12.5 takes the larger end of the ramp
+    assert abs(segs[4].inputs.H - 6.25) < 1e-9 and abs(segs[4].inputs.surcharge - 12.5) < 1e-9
+    for seg in segs:
+        assert seg.stability["LC-A"].fs_slide == calc.calculate_stability(seg.inputs, "LC-A").fs_slide
+
+    rec = chainage.segment_record(segs[0])
+    assert rec["LC-B_status"] == segs[0].stability["LC-B"].status and "stem_As_req" in rec
+
+def test_cli_runner_keeps_order_across_workers():
+    from dataclasses import asdict
+    recs = [asdict(r) for r in _random_inputs(random.Random(5), 40)]
+    recs.insert(3, {"H": 5.0})  # incomplete record
+    recs.insert(5, dict(recs[4], H=None))  # JSON null
+    recs.insert(6, [6.0, 4.0])  # not an object
+    outputs = []
+    for workers in (0, 2):
+        buf = io.StringIO()
+        n = cli.run(iter(recs), records.RecordWriter(buf), workers=workers, chunk_size=7)
+        assert n == len(recs)
+        outputs.append(buf.getvalue())
+    assert outputs[0] == outputs[1]
+
+    rows = [json.loads(line) for line in outputs[0].splitlines()]
+    assert [r["row"] for r in rows] == list(range(len(recs)))
+    assert rows[3]["error"]
+    assert rows[5]["error"] == "Bad value for H: None" and "LC-A_fs_slide" not in rows[5]
+    assert rows[6]["error"] == "Expected a WallInputs object, got list"
+    ref = calc.calculate_stability(calc.WallInputs(**recs[10]), "LC-C")
+    assert rows[10]["LC-C_fs_slide"] == ref.fs_slide
+
+    buf = io.StringIO()
+    cli.run(iter(recs[:10]), records.RecordWriter(buf), chunk_size=4, with_seismic=True)
+    rows = [json.loads(line) for line in buf.getvalue().splitlines()]
+    ky = seismic.yield_acceleration(batch.WallInputsBatch.from_inputs([calc.WallInputs(**recs[0])]))
+    assert rows[0]["kh_yield_slide"] == (None if ky.kh_slide[0] == float("inf") else ky.kh_slide[0])
+    assert "kh_yield_ot" not in rows[3]
+
+    # CSV: the header covers every result column even when row 0 is an error
+    buf = io.StringIO()
+    cli.run(iter([{"H": 5.0}] + recs[7:13]), records.RecordWriter(buf, "csv"), chunk_size=4,
+            table=combinations.EXAMPLE_TABLE[:2])
+    rows = list(csv.DictReader(io.StringIO(buf.getvalue())))
+    assert list(rows[0]) == cli.output_fields(table=combinations.EXAMPLE_TABLE[:2])
+    assert rows[0]["error"] and rows[0]["LC-B_fs_slide"] == ""
+    assert float(rows[1]["LC-C_fs_slide"]) == calc.calculate_stability(calc.WallInputs(**recs[7]), "LC-C").fs_slide
+    assert rows[6]["stem_bar"] and rows[6]["LC-A_status"] and rows[6]["governing_combination"]
+    assert all(r["error"] == "" for r in rows[1:])
+
+def test_design_service_micro_batches_requests():
+    import http.client
+    from concurrent.futures import ThreadPoolExecutor
+    from dataclasses import asdict
+    rows = _random_inputs(random.Random(22), 120)
+
+    def post(conn, payload):
+        conn.request("POST", "/design", json.dumps(payload), {"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read())
+
+    def client(part):
+        # One keep-alive connection per client thread
+        conn = http.client.HTTPConnection("127.0.0.1", svc.port, timeout=30)
+        out = [post(conn, asdict(r)) for r in part]
+        conn.close()
+        return out
+
+    with service.RunningService(window=0.01) as svc:
+        with ThreadPoolExecutor(12) as pool:
+            replies = [reply for part in pool.map(client, [rows[k::12] for k in range(12)]) for reply in part]
+        order = [r for k in range(12) for r in rows[k::12]]
+        for inp, (status, got) in zip(order, replies):
+            assert status == 200
+            for case in calc.LOAD_CASES:
+                ref = calc.calculate_stability(inp, case)
+                for name in ("fs_slide", "fs_ot", "q_max"):
+                    a = getattr(ref, name)
+                    assert abs(got["stability"][case][name] - a) <= 1e-9 * max(1.0, abs(a))
+                assert got["stability"][case]["status"] == ref.status
+            ref = calc.calculate_reinforcement(inp)
+            assert got["reinforcement"]["Heel"]["Bar"] == ref["Heel"]["Bar"]
+
+        conn = http.client.HTTPConnection("127.0.0.1", svc.port, timeout=30)
+        status, many = post(conn, [asdict(r) for r in rows[:3]])
+        assert status == 200 and len(many) == 3 and many[1] == replies[order.index(rows[1])][1]
+        assert post(conn, {"H": 5.0})[0] == 400  # incomplete record
+        conn.request("POST", "/design", "{not json")
+        resp = conn.getresponse()
+        assert resp.status == 400 and "Invalid JSON" in json.loads(resp.read())["error"]
+        conn.request("GET", "/design")
+        resp = conn.getresponse()
+        assert resp.status == 405 and resp.read()
+        conn.request("GET", "/health")
+        health = json.loads(conn.getresponse().read())
+        assert health["status"] == "ok" and health["designs"] == 123
+        assert health["batches"] < 120  # concurrent requests shared batches
+        conn.request("GET", "/metrics")
+        resp = conn.getresponse()
+        assert resp.status == 200 and "wall_service_requests_total" in resp.read().decode()
+        conn.request("GET", "/nope")
+        resp = conn.getresponse()
+        assert resp.status == 404 and resp.read()
+
+        for length in ("abc", "-5"):
+            with socket.create_connection(("127.0.0.1", svc.port), timeout=30) as sock:
+                sock.sendall(f"POST /design HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode())
+                assert sock.recv(4096).startswith(b"HTTP/1.1 400 ")
+
+def test_columnar_sweep_streams_and_reloads():
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    base = _default_inputs(H=4.0)
+    ranges = {"H": np.linspace(3.0, 7.0, 40), "heel": np.linspace(1.0, 4.0, 30)}
+    cases = ("LC-A", "LC-B", calc.LoadCombination("DRAWDOWN", canal_level=0.25, backfill_level=1.0, q_allow=120.0))
+    grid = list(columnar.grid_batches(base, chunk_size=300, **ranges))
+    assert [len(b) for b in grid] == [300] * 4 and (grid[0].B == grid[0].toe + grid[0].t_stem_bottom + grid[0].heel).all()
+    whole = batch.WallInputsBatch(**{n: np.concatenate([getattr(b, n) for b in grid]) for n in batch.FIELD_NAMES})
+    ref = batch.calculate_stability_all(whole, cases)
+
+    tmp = tempfile.mkdtemp()
+    for name in ("sweep.parquet", "sweep.arrow"):
+        path = os.path.join(tmp, name)
+        assert columnar.write_sweep(path, iter(grid), cases=cases, reinforcement=True, row_group_size=500) == 1200
+        assert columnar.sweep_rows(path) == 1200
+        table = columnar.read_sweep(path)
+        assert table.schema.field("H").type == pa.float64() and table.schema.field("uplift_full_base").type == pa.bool_()
+        assert table["design"].to_pylist() == list(range(1200))
+        assert (table["heel"].to_numpy() == whole.heel).all()
+        for case, res in ref.items():
+            assert (table[f"{case}_fs_slide"].to_numpy() == res.fs_slide).all()
+            assert (table[f"{case}_q_max"].to_numpy() == res.q_max).all()
+            assert table[f"{case}_status"].to_pylist() == res.status.tolist()
+        assert any("(Bearing)" in s for s in set(table["DRAWDOWN_status"].to_pylist()))
+        passed = np.all([res.status == "PASS" for res in ref.values()], axis=0)
+        assert (table["all_pass"].to_numpy() == passed).all()
+        q_max_B = batch.calculate_stability_batch(whole, "LC-B").q_max
+        assert (table["heel_As_req"].to_numpy() == batch.reinforcement_arrays(whole, q_max_B)["Heel"]["As_req"]).all()
+
+        # Projection and filtering
+        allocated = pa.total_allocated_bytes()
+        cut = columnar.read_sweep(path, ["H", "LC-A_fs_slide"], (pc.field("H") > 6.0) & (pc.field("LC-B_fs_ot") > 1.4))
+        assert cut.column_names == ["H", "LC-A_fs_slide"]
+        assert cut.num_rows == int(((whole.H > 6.0) & (ref["LC-B"].fs_ot > 1.4)).sum()) > 0
+        if name.endswith(".arrow"):
+            columnar.read_sweep(path)  # memory-mapped: nothing copied
+            assert pa.total_allocated_bytes() - allocated < 200_000
+        sizes = [len(r) for r in columnar.iter_sweep(path, ["design"], batch_size=500)]
+        assert sum(sizes) == 1200 and max(sizes) <= 500
+    assert pq.ParquetFile(os.path.join(tmp, "sweep.parquet")).metadata.num_row_groups == 3
+
+def test_design_space_refines_only_near_the_boundary():
+    base = _default_inputs()
+    heel, H = np.linspace(1.0, 6.0, 97), np.linspace(3.0, 9.0, 61)  # lattices end off their step
+    space = design_space.evaluate_grid(base, "heel", heel, "H", H, q_allow=300.0, coarse=8)
+    full = design_space.evaluate_grid(base, "heel", heel, "H", H, q_allow=300.0, coarse=1)
+    assert space.shape == (61, 97) and full.evaluated.all()
+    assert full.passed.any() and not full.passed.all()
+    assert (space.passed == full.passed).all()
+    assert space.evaluations < 0.3 * full.evaluations
+    for name in ("fs_slide", "fs_ot", "q_max"):
+        assert (getattr(space, name)[space.evaluated] == getattr(full, name)[space.evaluated]).all()
+
+    # One node against the scalar path (B follows the heel)
+    j, i = 40, 70
+    inp = calc.WallInputs(**{**base.__dict__, "heel": heel[i], "H": H[j],
+                             "B": base.toe + base.t_stem_bottom + heel[i]})
+    results = [calc.calculate_stability(inp, c) for c in calc.LOAD_CASES]
+    assert np.isclose(full.fs_slide[j, i], min(r.fs_slide for r in results), rtol=1e-12)
+    assert np.isclose(full.q_max[j, i], max(r.q_max for r in results), rtol=1e-12)
+    assert full.passed[j, i] == (all(r.status == "PASS" for r in results) and full.q_max[j, i] <= 300.0)
+
+    # B x heel moves the toe; negative toes are invalid, not failures to draw
+    bh = design_space.evaluate_grid(base, "B", np.linspace(2.0, 6.0, 41), "heel", np.linspace(1.0, 5.0, 41))
+    toe = bh.x[None, :] - base.t_stem_bottom - bh.y[:, None]
+    assert (np.isnan(bh.fs_slide) == (toe < 0)).all() and not bh.passed[toe < 0].any()
+
+    # Blocks keep their worst value and pass only if every node passes
+    small = full.downsample(20)
+    assert small.shape == (16, 20)
+    assert small.fs_slide[3, 2] == full.fs_slide[12:16, 10:15].min()
+    assert small.q_max[3, 2] == full.q_max[12:16, 10:15].max()
+    assert (small.passed == [[full.passed[r:r + 4, c:c + 5].all() for c in range(0, 97, 5)]
+                             for r in range(0, 61, 4)]).all()
+    assert np.isclose(small.x[-1], heel[95:].mean())
+    assert full.downsample(100) is full
+
+    fig = viz.draw_design_space(full, max_points=20)
+    assert len(fig.data) == 6 and np.shape(fig.data[0].z) == (16, 20)
+
+def test_result_store_persists_and_queries():
+    path = os.path.join(tempfile.mkdtemp(), "results.sqlite")
+    walls = [_default_inputs(H=h, heel=heel, B=1.5 + heel) for h in (4.0, 5.5, 6.5, 8.0) for heel in (2.5, 6.5)]
+
+    with store.ResultStore(path) as db:
+        first = db.design(walls[0])
+        assert db.stats["computed"] == 1 and db.design(walls[0]) == first
+        assert db.stats["memory_hits"] == 1
+        db.put_many((w, *store.compute_design(w)) for w in walls[1:])
+        assert len(db) == len(walls)
+
+    assert store.content_hash(walls[0]) == store.content_hash(_default_inputs(H=4.0, heel=2.5, B=4.0))
+    assert store.content_hash(walls[0]) != store.content_hash(walls[0], criterion="cost")
+
+    with store.ResultStore(path) as db:
+        stability, reinf = db.design(walls[0])
+        assert db.stats == {"memory_hits": 0, "store_hits": 1, "computed": 0, "written": 0}
+        assert stability == first[0] and reinf == first[1]
+        assert stability["LC-B"].debug_info == first[0]["LC-B"].debug_info
+
+        rows = db.query(H=(5.0, 7.0))
+        assert sorted(r["H"] for r in rows) == [5.5, 5.5, 6.5, 6.5]
+        passing = db.query(H=(5.0, 7.0), passing=True)
+        assert all(r["status"] == "PASS" for r in passing)
+        for r in passing:
+            assert all(res.status == "PASS" for res in store.compute_design(r["inputs"])[0].values())
+        assert len(passing) < len(rows)
+
+    # Batch runner: second run over the same records is served from the store
+    from dataclasses import asdict
+    recs = [asdict(r) for r in _random_inputs(random.Random(6), 30)]
+    outputs = []
+    for _ in range(2):
+        buf = io.StringIO()
+        cli.run(iter(recs), records.RecordWriter(buf), chunk_size=8, store_path=path)
+        outputs.append(buf.getvalue())
+    assert outputs[0] == outputs[1]
+    assert cli._open_store(path).stats["store_hits"] + cli._open_store(path).stats["memory_hits"] == len(recs)
+
+def test_shared_cache_bounds_expires_and_single_flights():
+    now = [0.0]
+    cache = shared_cache.SharedCache(max_bytes=1000, ttl=60, clock=lambda: now[0])
+    for i in range(3):
+        cache.put(("pdf", i), b"", size=400)
+    assert cache.get(("pdf", 0)) is None and cache.get(("pdf", 1)) == b""
+    cache.put(("pdf", 3), b"", size=400)  # evicts 2, the least recently used
+    assert cache.get(("pdf", 2)) is None and len(cache) == 2
+    cache.put(("pdf", "big"), b"", size=2000)  # larger than the cache: not kept
+    assert cache.get(("pdf", "big")) is None
+
+    now[0] = 61.0
+    assert cache.get(("pdf", 1)) is None and len(cache) == 1
+    stats = cache.stats()
+    assert stats["namespaces"]["pdf"]["evictions"] == 2 and stats["namespaces"]["pdf"]["expired"] == 1
+    assert stats["hits"] == 1 and stats["hit_rate"] == 1 / 5
+
+    # Concurrent misses on one key run compute() once
+    cache = shared_cache.SharedCache(ttl=0)
+    calls = []
+    release = threading.Event()
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return viz.draw_wall_3d(_default_inputs(), 2)
+    threads = [threading.Thread(target=cache.get_or_compute, args=(("figure", 1), compute)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and len(cache) == 1
+    assert cache.stats()["namespaces"]["figure"]["bytes"] > 1000
+    assert shared_cache.sizeof(b"x" * 5000) >= 5000
+
+def test_reports_render_in_memory_and_in_bulk():
+    inputs = _default_inputs()
+    results = {c: calc.calculate_stability(inputs, c) for c in calc.LOAD_CASES}
+    pdf = reporting.render_pdf_report(inputs, results, calc.calculate_reinforcement(inputs))
+    assert pdf.startswith(b"%PDF")
+
+    designs = [(f"wall_{i:03d}", _default_inputs(H=4.0 + 0.1 * i)) for i in range(6)]
+    for workers in (0, 2):
+        with zipfile.ZipFile(io.BytesIO(reporting.generate_reports_archive(designs, workers=workers))) as zf:
+            assert zf.namelist() == [f"{name}.pdf" for name, _ in designs]
+            assert zf.read("wall_000.pdf").startswith(b"%PDF")
+
+def test_wall_mesh_is_merged_and_bounded():
+    inputs = _default_inputs()
+    small = viz.draw_wall_3d(inputs, 3)
+    cf = [t for t in small.data if t.name == "Counterfort"]
+    assert len(small.data) == 4 and len(cf) == 1
+    assert len(cf[0].x) == 4 * 6 and len(cf[0].i) == 4 * 8
+    assert max(cf[0].i.max(), cf[0].j.max(), cf[0].k.max()) == len(cf[0].x) - 1
+
+    big = viz.draw_wall_3d(inputs, 5000)
+    cf = [t for t in big.data if t.name == "Counterfort"][0]
+    assert len(cf.x) <= 6 * (viz.MAX_DETAIL_COUNTERFORTS + 1)
+    assert max(cf.z) == 5000 * inputs.s_cf + inputs.t_cf / 2
+    assert big.layout.title.text.endswith("60 of 5001 counterforts shown, fewer away from the centre")
+
+    # Full detail around the view centre, thinning towards the ends
+    for focus in (None, 0, 1200, 5000):
+        idx = viz.counterfort_positions(5000, focus=focus)
+        centre = 2500 if focus is None else focus
+        assert idx[0] == 0 and idx[-1] == 5000 and idx.size == viz.MAX_DETAIL_COUNTERFORTS
+        near = idx[np.abs(idx - centre) <= 10]
+        assert np.array_equal(near, np.arange(near[0], near[-1] + 1)) and near.size >= 11
+        assert np.all(np.diff(np.diff(idx[idx <= centre])) <= 0)
+        assert np.all(np.diff(np.diff(idx[idx >= centre])) >= 0)
+
+def test_benchmarks_run_and_flag_regressions():
+    for name, make in bench.BENCHMARKS.items():
+        make()()
+    baseline = {"a": 1.0, "b": 1.0}
+    assert bench.compare({"a": 1.2, "b": 1.3, "c": 9.0}, baseline, 0.25) == ["b"]
+    assert set(bench.load_baseline()) == set(bench.BENCHMARKS)
+
+def test_instrumentation_records_phases_only_when_enabled():
+    instr.reset()
+    inputs = _default_inputs()
+    calc.calculate_stability(inputs, "LC-A")
+    assert instr.snapshot()["timers"] == {}
+
+    instr.enable(True)
+    try:
+        run = instr.begin_run()
+        calc.calculate_stability(inputs, "LC-B")
+        calc.calculate_reinforcement(inputs)
+        viz.draw_wall_3d(inputs, 2)
+        instr.end_run()
+    finally:
+        instr.enable(False)
+
+    names = set(instr.snapshot()["timers"])
+    for phase in ("stability.vertical", "stability.uplift", "stability.horizontal", "stability.bearing",
+                  "reinforcement.stem", "reinforcement.toe", "viz.mesh"):
+        assert phase in names
+    assert {r["phase"] for r in run.rows()} == names
+    assert instr.snapshot()["timers"]["stability.uplift"]["count"] == 2
+    assert "wall_stability_uplift_seconds_count 2" in instr.export_prometheus()
+    assert all(json.loads(line)["type"] == "timer" for line in instr.export_json().splitlines())
+
+    # A profiled run (one app session) times its own thread only, until end_run.
+    instr.reset()
+    run = instr.begin_run(profile=True)
+    other = threading.Thread(target=calc.calculate_stability, args=(inputs, "LC-A"))
+    other.start()
+    other.join()
+    assert instr.snapshot()["timers"] == {}
+    calc.calculate_stability(inputs, "LC-A")
+    instr.end_run()
+    assert {r["phase"] for r in run.rows()} == set(instr.snapshot()["timers"])
+    assert instr.snapshot()["timers"]["stability.uplift"]["count"] == 1
+    calc.calculate_stability(inputs, "LC-A")
+    assert not instr.is_enabled()
+    assert instr.snapshot()["timers"]["stability.uplift"]["count"] == 1
+    instr.reset()
+
+def test_scalar_kernels_match_the_interpreted_path():
+    # One implementation: without Numba the kernels are the calculations
+    # functions themselves; compiled, x**2 may round differently by an ulp.
+    rng = random.Random(11)
+    rows = _random_inputs(rng, 300) + [_default_inputs(kh=0.15, kv=0.05), _default_inputs(uplift_full_base=False),
+                                      _default_inputs(H=0.4, t_base=0.5, stem_continuous=True)]
+    cases = calc.STANDARD_COMBINATIONS + combinations.EXAMPLE_TABLE[3:9]
+    saved = kernels.ENABLED
+    try:
+        kernels.enable(False)
+        ref = [([calc.calculate_stability(r, c) for c in cases], calc.calculate_reinforcement(r, criterion="cost"))
+               for r in rows]
+        assert all(getattr(kernels, name) is getattr(calc, name) for name in kernels.KERNELS)
+        # Profiling runs the same kernels phase by phase: same results
+        instr.begin_run(profile=True)
+        try:
+            phased = [([calc.calculate_stability(r, c) for c in cases],
+                       calc.calculate_reinforcement(r, criterion="cost")) for r in rows[:20]]
+        finally:
+            instr.end_run()
+            instr.reset()
+        assert phased == ref[:20]
+        kernels.enable(True)
+        assert kernels.ENABLED == kernels.AVAILABLE
+        got = [([calc.calculate_stability(r, c) for c in cases], calc.calculate_reinforcement(r, criterion="cost"))
+               for r in rows]
+    finally:
+        kernels.enable(saved)
+
+    rtol = 1e-12 if kernels.AVAILABLE else 0.0
+    for (ref_s, ref_r), (got_s, got_r) in zip(ref, got):
+        for a, b in zip(ref_s, got_s):
+            assert a.case_name == b.case_name and a.status == b.status
+            for name in calc.STABILITY_OUTPUTS:
+                assert np.isclose(getattr(a, name), getattr(b, name), rtol=rtol, atol=0.0), name
+        for member in ("Stem", "Heel", "Toe"):
+            assert ref_r[member]["Bar"] == got_r[member]["Bar"]
+            assert np.isclose(ref_r[member]["As_req"], got_r[member]["As_req"], rtol=rtol, atol=0.0)
+
+    # Numba is imported on the first design call, not with calculations
+    probe = "import sys, calculations; assert 'numba' not in sys.modules"
+    subprocess.run([sys.executable, "-c", probe], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    assert calc.combination_status(calc.COMBINATIONS["LC-A"], 1.0, 1.0, 1.0, 3.0, 10.0) == \
+        "FAIL (Overturning) (Eccentricity > B/6)"
+    assert calc.combination_status(combinations.EXAMPLE_TABLE[3], 2.0, 1.0, 0.0, 3.0, 10.0) == "FAIL (Overturning)"
+    assert calc.combination_status(calc.LoadCombination("X", e_max=0.25, q_allow=50), 1.0, 3.0, 1.0, 3.0, 60.0) == \
+        "FAIL (Sliding) (Eccentricity > B/4) (Bearing)"
+
 if __name__ == "__main__":
     test_logic()
@@ -1,50 +1,180 @@
+import math
+import numpy as np
 import plotly.graph_objects as go
 
-def draw_wall_3d(inputs, repeat=1):
+import instrumentation as instr
+
+# Triangles of an 8-vertex hexahedron (vertex order as in _box_vertices)
+BOX_I = np.array([7, 0, 0, 0, 4, 4, 6, 6, 4, 0, 3, 2])
+BOX_J = np.array([3, 4, 1, 2, 5, 6, 5, 2, 0, 1, 6, 3])
+BOX_K = np.array([0, 7, 2, 3, 6, 7, 1, 1, 5, 5, 7, 6])
+
+# Triangles of a 6-vertex triangular prism: ends, stem face, base face, sloped face
+PRISM_FACES = np.array([
+    [0, 1, 2], [3, 5, 4],
+    [0, 1, 4], [0, 4, 3],
+    [1, 2, 5], [1, 5, 4],
+    [0, 2, 5], [0, 5, 3],
+])
+
+# Most counterforts drawn; half of them go to the bays nearest the view
+# centre, the rest thin out towards the wall ends
+MAX_DETAIL_COUNTERFORTS = 60
+
+def _box_vertices(x0, x1, y0, y1, z0, z1):
+    x = [x0, x0, x1, x1, x0, x0, x1, x1]
+    y = [y0, y1, y1, y0, y0, y1, y1, y0]
+    z = [z0, z0, z0, z0, z1, z1, z1, z1]
+    return np.array([x, y, z], dtype=float)
+
+def _mesh(verts, i, j, k, color, name, showlegend=True):
+    return go.Mesh3d(x=verts[0], y=verts[1], z=verts[2], i=i, j=j, k=k,
+                     color=color, opacity=1.0, name=name, showlegend=showlegend)
+
+def counterfort_positions(repeat, max_detail=MAX_DETAIL_COUNTERFORTS, focus=None):
+    # Bay indices of the counterforts to draw. Up to `max_detail` are all
+    # shown. Beyond that the max_detail // 2 bays around `focus` (default
+    # the middle of the wall, where plotly's default camera looks) keep
+    # every counterfort, and the rest of the budget is spread over each
+    # side at geometrically growing spacing out to the wall ends, so detail
+    # falls off with distance and the figure size stays roughly constant
+    # however long the wall is.
+    n = repeat + 1
+    if n <= max_detail:
+        return np.arange(n)
+    focus = n // 2 if focus is None else min(max(int(focus), 0), n - 1)
+    near = max_detail // 2
+    lo = max(0, min(focus - near // 2, n - near))
+    hi = lo + near - 1
+    far = max_detail - near
+    # A side with nothing beyond the window leaves its share to the other
+    left = lo - _growing_offsets(lo, far if hi == n - 1 else far // 2)
+    right = hi + _growing_offsets(n - 1 - hi, far if lo == 0 else far // 2)
+    return np.unique(np.concatenate([left, np.arange(lo, hi + 1), right]))
+
+def _growing_offsets(span, count):
+    # `count` distinct offsets from 1 to `span` (its last one), spaced
+    # geometrically; rounding never merges neighbours.
+    if span <= 0:
+        return np.zeros(0, dtype=int)
+    k = np.arange(count)
+    steps = np.rint(np.geomspace(1, span, count)).astype(int)
+    return np.unique(np.minimum(np.maximum.accumulate(steps - k) + k, span))
+
+def counterfort_mesh(z_centers, back_x, B, H, t_base, t_cf):
+    # All counterforts as one vertex/face set.
+    z_centers = np.asarray(z_centers, dtype=float)
+    n = z_centers.size
+    z0 = z_centers - t_cf / 2
+    z1 = z_centers + t_cf / 2
+
+    x = np.tile([back_x, back_x, B, back_x, back_x, B], n)
+    y = np.tile([H, t_base, t_base, H, t_base, t_base], n)
+    z = np.column_stack([z0, z0, z0, z1, z1, z1]).reshape(-1)
+
+    faces = (PRISM_FACES[None, :, :] + 6 * np.arange(n)[:, None, None]).reshape(-1, 3)
+    return np.array([x, y, z]), faces
+
+def draw_wall_3d(inputs, repeat=1, max_detail=MAX_DETAIL_COUNTERFORTS, focus=None):
     H = inputs.H
     B = inputs.B
     Toe = inputs.toe
-    Heel = inputs.heel
     t_stem_b = inputs.t_stem_bottom
     t_stem_t = inputs.t_stem_top
     t_base = inputs.t_base
     s_cf = inputs.s_cf
     t_cf = inputs.t_cf
-    
+    L = repeat * s_cf
+
+    lap = instr.lap_timer("viz")
     fig = go.Figure()
-    
-    def add_box(x0, x1, y0, y1, z0, z1, color, name, showlegend=False):
-        x = [x0, x0, x1, x1, x0, x0, x1, x1]
-        y = [y0, y1, y1, y0, y0, y1, y1, y0]
-        z = [z0, z0, z0, z0, z1, z1, z1, z1]
-        return go.Mesh3d(x=x, y=y, z=z, i=[7,0,0,0,4,4,6,6,4,0,3,2], j=[3,4,1,2,5,6,5,2,0,1,6,3], k=[0,7,2,3,6,7,1,1,5,5,7,6], color=color, opacity=1.0, name=name, alphahull=0, showlegend=showlegend)
-
-    fig.add_trace(add_box(0, B, 0, t_base, 0, repeat*s_cf, 'gray', 'Base', True))
-    
+
+    fig.add_trace(_mesh(_box_vertices(0, B, 0, t_base, 0, L), BOX_I, BOX_J, BOX_K, 'gray', 'Base'))
+
     back_x = Toe + t_stem_b
     front_x_bot = Toe
     front_x_top = back_x - t_stem_t
-    
-    xs = [front_x_bot, front_x_top, back_x, back_x, front_x_bot, front_x_top, back_x, back_x]
-    ys = [t_base, H, H, t_base, t_base, H, H, t_base]
-    zs = [0, 0, 0, 0, repeat*s_cf, repeat*s_cf, repeat*s_cf, repeat*s_cf]
-    
-    fig.add_trace(go.Mesh3d(x=xs, y=ys, z=zs, i=[7,0,0,0,4,4,6,6,4,0,3,2], j=[3,4,1,2,5,6,5,2,0,1,6,3], k=[0,7,2,3,6,7,1,1,5,5,7,6], color='lightgray', name='Stem', showlegend=True))
-    
-    def add_cf(z_center, idx):
-        z_start = z_center - t_cf/2
-        z_end = z_center + t_cf/2
-        x_cf = [back_x, back_x, B, back_x, back_x, B]
-        y_cf = [H, t_base, t_base, H, t_base, t_base]
-        z_cf = [z_start, z_start, z_start, z_end, z_end, z_end]
-        return go.Mesh3d(x=x_cf, y=y_cf, z=z_cf, color='darkgray', name='Counterfort', alphahull=0, showlegend=(idx==0))
-        
-    for i in range(repeat + 1):
-        fig.add_trace(add_cf(i * s_cf, i))
-    
+
+    stem = np.array([
+        [front_x_bot, front_x_top, back_x, back_x, front_x_bot, front_x_top, back_x, back_x],
+        [t_base, H, H, t_base, t_base, H, H, t_base],
+        [0, 0, 0, 0, L, L, L, L],
+    ], dtype=float)
+    fig.add_trace(_mesh(stem, BOX_I, BOX_J, BOX_K, 'lightgray', 'Stem'))
+
+    idx = counterfort_positions(repeat, max_detail, focus)
+    verts, faces = counterfort_mesh(idx * s_cf, back_x, B, H, t_base, t_cf)
+    lap("mesh")
+    fig.add_trace(_mesh(verts, faces[:, 0], faces[:, 1], faces[:, 2], 'darkgray', 'Counterfort'))
+
     if inputs.d_key > 0:
-        k_x = Toe + t_stem_b/2 
-        fig.add_trace(add_box(k_x - inputs.w_key/2, k_x + inputs.w_key/2, -inputs.d_key, 0, 0, repeat*s_cf, 'brown', 'Key', True))
+        k_x = Toe + t_stem_b/2
+        key = _box_vertices(k_x - inputs.w_key/2, k_x + inputs.w_key/2, -inputs.d_key, 0, 0, L)
+        fig.add_trace(_mesh(key, BOX_I, BOX_J, BOX_K, 'brown', 'Key'))
+
+    title = f"3D Wall Sketch ({repeat} Bays)"
+    if idx.size < repeat + 1:
+        title += f" - {idx.size} of {repeat + 1} counterforts shown, fewer away from the centre"
+    fig.update_layout(scene=dict(aspectmode='data'), title=title, height=600)
+    lap("figure")
+    return fig
+
+def draw_tornado(bars, base_value, title="Sensitivity", rel=0.10):
+    # Horizontal bars from the base value to the output at -rel / +rel of
+    # each input; `bars` largest swing first (sensitivity.tornado).
+    bars = list(reversed(bars))  # plotly draws the first category at the bottom
+    names = [b.field for b in bars]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=names, x=[b.low - base_value for b in bars], base=base_value,
+        orientation='h', name=f"-{rel:.0%}", marker_color='indianred'))
+    fig.add_trace(go.Bar(
+        y=names, x=[b.high - base_value for b in bars], base=base_value,
+        orientation='h', name=f"+{rel:.0%}", marker_color='steelblue'))
+    fig.add_vline(x=base_value, line_dash='dash', line_color='black')
+    fig.update_layout(barmode='overlay', title=title, height=120 + 28 * len(bars))
+    return fig
+
+def draw_design_space(space, max_points=300):
+    # Governing FS sliding, FS overturning and q_max over the two axes of a
+    # design_space.DesignSpace, each coloured around its limit, with the
+    # pass/fail boundary drawn on all three. Large grids are block-downsampled
+    # to max_points per axis first: each heatmap is sent as one float32 z
+    # matrix (the boundary as int8) and rasterised in the browser, so the
+    # figure size, not the grid, sets how smoothly it pans and zooms.
+    from plotly.subplots import make_subplots
+
+    lap = instr.lap_timer("viz")
+    full_shape = space.shape
+    space = space.downsample(max_points)
+    lap("downsample")
+    fs_slide_min, fs_ot_min = space.limits
+    panels = [
+        ("FS Sliding", space.fs_slide, fs_slide_min, "RdYlGn"),
+        ("FS Overturning", space.fs_ot, fs_ot_min, "RdYlGn"),
+        ("q_max (kPa)", space.q_max, space.q_allow if math.isfinite(space.q_allow) else None, "RdYlGn_r"),
+    ]
+    fig = make_subplots(rows=1, cols=3, shared_yaxes=True, horizontal_spacing=0.06,
+                        subplot_titles=[p[0] for p in panels])
+    boundary = space.passed.astype(np.int8)
+    for col, (name, z, limit, scale) in enumerate(panels, start=1):
+        fig.add_trace(go.Heatmap(
+            x=space.x, y=space.y, z=z.astype(np.float32), colorscale=scale, zmid=limit, name=name,
+            colorbar=dict(x=col / 3 - 0.02, thickness=10, len=0.9),
+            hovertemplate=f"{space.x_name}=%{{x:.3f}}<br>{space.y_name}=%{{y:.3f}}<br>{name}=%{{z:.3f}}<extra></extra>",
+        ), row=1, col=col)
+        fig.add_trace(go.Contour(
+            x=space.x, y=space.y, z=boundary, showscale=False, hoverinfo="skip",
+            contours=dict(start=0.5, end=0.5, coloring="lines"), line=dict(color="black", width=2),
+            name="Pass / fail", showlegend=col == 1,
+        ), row=1, col=col)
+        fig.update_xaxes(title_text=space.x_name, row=1, col=col)
+    fig.update_yaxes(title_text=space.y_name, row=1, col=1)
 
-    fig.update_layout(scene=dict(aspectmode='data'), title=f"3D Wall Sketch ({repeat} Bays)", height=600)
+    title = f"Design Space: {space.x_name} x {space.y_name} ({full_shape[1]} x {full_shape[0]} grid"
+    if space.shape != full_shape:
+        title += f", shown at {space.shape[1]} x {space.shape[0]}"
+    fig.update_layout(title=title + ")", height=480, uirevision=(space.x_name, space.y_name),
+                      legend=dict(orientation="h", y=-0.2))
+    lap("figure")
     return fig